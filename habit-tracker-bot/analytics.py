@@ -0,0 +1,260 @@
+"""
+Векторизованная аналитика по всем пользователям (NumPy).
+
+Истории загружаются в булеву матрицу привычки × дни за отчётный период,
+и все показатели считаются операциями над матрицей, а не циклами
+по пользователям и привычкам. Данные читаются из хранилища бота
+(любой движок) пачками через iter_users.
+
+Запуск недельного отчёта для администратора:
+    python analytics.py --days 7
+    python analytics.py --days 365 --source habits.db
+"""
+import json
+import asyncio
+import argparse
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+import numpy as np
+
+import config
+from history import habit_history
+from storage import create_storage
+from utils import WEEKDAYS
+
+
+class HistoryMatrix:
+    """
+    Отметки за days дней, заканчивающихся end, в виде матрицы.
+
+    Строка матрицы — привычка: done[r, d] — привычка r отмечена в день d.
+    Привычки пользователя u занимают строки offsets[u]:offsets[u + 1],
+    row_users[r] — номер пользователя строки r. Так матрица не дополняется
+    до наибольшего числа привычек, и пустых строк в ней нет.
+    """
+
+    def __init__(self, user_ids: List[int], names: List[str], offsets: np.ndarray,
+                 done: np.ndarray, end: date):
+        self.user_ids = user_ids
+        self.names = names
+        self.offsets = offsets
+        self.row_users = np.repeat(np.arange(len(user_ids)), np.diff(offsets))
+        self.done = done
+        self.end = end
+        self.days = done.shape[1]
+        self.first = end - timedelta(days=self.days - 1)
+
+    @classmethod
+    def from_users(cls, users: Iterable[Tuple[Any, Dict[str, Any]]], days: int,
+                   end: Optional[date] = None) -> "HistoryMatrix":
+        """
+        Матрица из пар (user_id, user_data) в формате хранилища.
+        Окно каждой истории вырезается целым числом (mask_between), а все
+        окна распаковываются в биты одним вызовом NumPy.
+        """
+        end = end or date.today()
+        first = end.toordinal() - days + 1
+        row_bytes = (days + 7) // 8
+        user_ids, names, windows, counts = [], [], [], []
+        for user_id, user_data in users:
+            habits = user_data.get("habits", [])
+            user_ids.append(int(user_id))
+            counts.append(len(habits))
+            for habit in habits:
+                names.append(habit["name"])
+                mask = habit_history(habit).mask_between(first, end.toordinal())
+                windows.append(mask.to_bytes(row_bytes, "little"))
+
+        packed = np.frombuffer(b"".join(windows), dtype=np.uint8).reshape(len(windows), row_bytes)
+        done = np.unpackbits(packed, axis=1, bitorder="little")[:, :days].astype(bool)
+        offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        return cls(user_ids, names, offsets, done, end)
+
+    def completions(self) -> np.ndarray:
+        """Число отметок за период по каждой привычке."""
+        return self.done.sum(axis=1)
+
+    def rates(self) -> np.ndarray:
+        """Доля выполненных дней по каждой привычке."""
+        return self.completions() / self.days
+
+    def current_streaks(self) -> np.ndarray:
+        """
+        Текущая серия каждой привычки, как в боте (utils.current_streak):
+        серия, которая заканчивается последним днём периода или днём раньше
+        (сегодня ещё можно отметить). В отличие от бота, серия не длиннее периода.
+        """
+        # Последний день считаем отмеченным, а если он не отмечен — вычитаем его
+        backwards = self.done[:, ::-1].copy()
+        backwards[:, 0] = True
+        runs = np.where(backwards.all(axis=1), self.days, np.argmin(backwards, axis=1))
+        return runs - ~self.done[:, -1]
+
+    def longest_streaks(self) -> np.ndarray:
+        """Самая длинная серия внутри периода по каждой привычке."""
+        running = np.cumsum(self.done, axis=1, dtype=np.int32)
+        # Значение счётчика в последнем дне без отметки — база для текущей серии
+        base = np.maximum.accumulate(np.where(self.done, 0, running), axis=1)
+        return (running - base).max(axis=1, initial=0)
+
+    def weekday_completions(self) -> np.ndarray:
+        """Отметки по дням недели: привычки × 7 (0 — понедельник)."""
+        weekdays = (np.arange(self.days) + self.first.weekday()) % 7
+        one_hot = np.eye(7, dtype=np.int32)[weekdays]
+        return self.done.astype(np.int32) @ one_hot
+
+    def weekday_days(self) -> np.ndarray:
+        """Сколько раз каждый день недели встречается в периоде."""
+        weekdays = (np.arange(self.days) + self.first.weekday()) % 7
+        return np.bincount(weekdays, minlength=7)
+
+    def user_report(self, u: int) -> Dict[str, Any]:
+        """Те же числа, что печатает /stats, для пользователя с номером u."""
+        lo, hi = int(self.offsets[u]), int(self.offsets[u + 1])
+        completions = self.completions()[lo:hi]
+        habits = sorted(
+            (
+                {
+                    "name": self.names[lo + h],
+                    "completions": int(completions[h]),
+                    "percentage": completions[h] / self.days * 100
+                }
+                for h in range(hi - lo)
+            ),
+            key=lambda stat: stat["percentage"], reverse=True
+        )
+        return {
+            "user_id": self.user_ids[u],
+            "days": self.days,
+            "total_completions": int(completions.sum()),
+            "possible": self.days * (hi - lo),
+            "habits": habits,
+            "best": habits[0] if habits else None,
+            "worst": habits[-1] if len(habits) > 1 else None
+        }
+
+
+class FleetReport:
+    """
+    Сводка по всем пользователям, собираемая по пачкам (add), чтобы
+    матрица не занимала память на всех пользователей сразу.
+    """
+
+    def __init__(self, days: int = 7, end: Optional[date] = None, top: int = 10):
+        self.days = days
+        self.end = end or date.today()
+        self.top = top
+        self.totals = {"users": 0, "habits": 0, "completions": 0}
+        self.weekday_done = np.zeros(7, dtype=np.int64)
+        self.weekday_possible = np.zeros(7, dtype=np.int64)
+        self.streak_hist = np.zeros(days + 1, dtype=np.int64)
+        self.longest_hist = np.zeros(days + 1, dtype=np.int64)
+        self.rate_hist = np.zeros(11, dtype=np.int64)
+        self.ranked: List[Tuple[float, int, str]] = []
+
+    def add(self, users: List[Tuple[Any, Dict[str, Any]]]):
+        """Учёт пачки пар (user_id, user_data)."""
+        if not users:
+            return
+        days, top = self.days, self.top
+        matrix = HistoryMatrix.from_users(users, days, self.end)
+        completions = matrix.completions()
+        rates = completions / days
+        habit_count = len(matrix.names)
+
+        self.totals["users"] += len(users)
+        self.totals["habits"] += habit_count
+        self.totals["completions"] += int(completions.sum())
+
+        self.weekday_done += matrix.weekday_completions().sum(axis=0)
+        self.weekday_possible += matrix.weekday_days() * habit_count
+        self.streak_hist += np.bincount(matrix.current_streaks(), minlength=days + 1)
+        self.longest_hist += np.bincount(matrix.longest_streaks(), minlength=days + 1)
+        self.rate_hist += np.bincount(np.floor(rates * 10).astype(int), minlength=11)
+
+        # Кандидаты в лучшие и худшие привычки: по top с каждого края пачки
+        order = np.argsort(rates, kind="stable")
+        for row in np.unique(np.concatenate([order[:top], order[-top:]])):
+            self.ranked.append((float(rates[row]), matrix.user_ids[matrix.row_users[row]],
+                                matrix.names[row]))
+
+    def result(self) -> Dict[str, Any]:
+        ranked = sorted(self.ranked, key=lambda item: item[0])
+        possible = self.totals["habits"] * self.days
+        return {
+            "days": self.days,
+            "end": self.end.isoformat(),
+            **self.totals,
+            "completion_rate": self.totals["completions"] / possible if possible else 0.0,
+            "weekday_rates": {
+                WEEKDAYS[w]: (float(self.weekday_done[w] / self.weekday_possible[w])
+                              if self.weekday_possible[w] else 0.0)
+                for w in range(7)
+            },
+            # Текущие серии — как в боте: отметка в последний день или днём раньше
+            "current_streaks": self.streak_hist.tolist(),
+            "longest_streaks": self.longest_hist.tolist(),
+            # rate_buckets[i] — привычки с долей выполнения в [i*10%, (i+1)*10%), последний — 100%
+            "rate_buckets": self.rate_hist.tolist(),
+            "best_habits": [
+                {"rate": rate, "user_id": user_id, "name": name}
+                for rate, user_id, name in reversed(ranked[-self.top:])
+            ],
+            "worst_habits": [
+                {"rate": rate, "user_id": user_id, "name": name}
+                for rate, user_id, name in ranked[:self.top]
+            ]
+        }
+
+
+def fleet_report(users: Iterable[Tuple[Any, Dict[str, Any]]], days: int = 7,
+                 end: Optional[date] = None, chunk_size: int = 10000,
+                 top: int = 10) -> Dict[str, Any]:
+    """Сводка по парам (user_id, user_data), пачками по chunk_size."""
+    report = FleetReport(days, end, top)
+    users = iter(users)
+    while True:
+        chunk = [pair for _, pair in zip(range(chunk_size), users)]
+        if not chunk:
+            break
+        report.add(chunk)
+    return report.result()
+
+
+async def storage_report(days: int = 7, chunk_size: int = 10000,
+                         top: int = 10) -> Dict[str, Any]:
+    """
+    Сводка по данным бота: пользователи читаются через iter_users того
+    хранилища, которое выбрано в настройках (JSON, шарды, журнал, SQLite).
+    """
+    storage = create_storage()
+    report = FleetReport(days, top=top)
+    chunk = []
+    try:
+        async for pair in storage.iter_users():
+            chunk.append(pair)
+            if len(chunk) >= chunk_size:
+                report.add(chunk)
+                chunk = []
+        report.add(chunk)
+    finally:
+        await storage.close()
+    return report.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводный отчёт по всем пользователям")
+    parser.add_argument("--source", default=config.DATA_FILE,
+                        help="файл данных (DATA_FILE; движок — STORAGE_ENGINE)")
+    parser.add_argument("--days", type=int, default=7, help="длина периода в днях")
+    parser.add_argument("--top", type=int, default=10, help="сколько лучших и худших привычек показать")
+    args = parser.parse_args()
+
+    config.DATA_FILE = args.source
+    report = asyncio.run(storage_report(args.days, top=args.top))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Генерация синтетических данных в формате habits.json для бенчмарков."""
+import os
+import json
+import base64
+import random
+from datetime import date, timedelta
+from typing import Dict, Any, Iterator, Tuple
+
+
+def _history_bits(rng: random.Random, days: int) -> int:
+    """
+    Отметки за days дней числом (бит i — день start + i). Доля выполнения
+    у привычек разная (25–87%), часть привычек заброшена: хвост без отметок.
+    """
+    bits = rng.getrandbits(days)
+    tier = rng.random()
+    if tier < 0.15:
+        bits &= rng.getrandbits(days)                  # ~25%
+    elif tier < 0.55:
+        bits |= rng.getrandbits(days)                  # ~75%
+    elif tier < 0.8:
+        bits |= rng.getrandbits(days) | rng.getrandbits(days)  # ~87%
+    if rng.random() < 0.2:
+        # Привычку бросили: после случайного дня отметок нет
+        bits &= (1 << rng.randrange(days)) - 1
+    return bits
+
+
+def generate_user(rng: random.Random, habits: int, days: int, today: date,
+                  uniform: bool = False) -> Dict[str, Any]:
+    """
+    Пользователь в текущем формате хранения (история — битовая карта).
+    Привычек от 1 до habits, каждая создана в свой день за последние days
+    дней, поэтому истории разной длины — до нескольких лет.
+    uniform=True — ровно habits привычек с историей за все days дней
+    (нагрузочный тест отмечает привычки по номерам).
+    """
+    user_created = today - timedelta(days=days - 1)
+    user_habits = []
+    count = habits if uniform else rng.randint(1, habits)
+    for habit_id in range(1, count + 1):
+        length = days if uniform else rng.randint(1, days)
+        created = today - timedelta(days=length - 1)
+        bits = _history_bits(rng, length)
+        user_habits.append({
+            "id": habit_id,
+            "name": f"Привычка {habit_id}",
+            "created": created.isoformat(),
+            "history": {
+                "start": created.isoformat(),
+                "bits": base64.b64encode(bits.to_bytes((length + 7) // 8, "little")).decode("ascii")
+            },
+            "streak": 0,
+            "longest_streak": 0,
+            "last_day": None
+        })
+    return {
+        "habits": user_habits,
+        "timezone": "Europe/Moscow",
+        "created": user_created.isoformat()
+    }
+
+
+def iter_dataset(users: int, habits: int = 5, days: int = 3 * 365, seed: int = 42,
+                 uniform: bool = False) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Пользователи набора по одному: (ключ-строка, как в habits.json; запись)."""
+    rng = random.Random(seed)
+    today = date.today()
+    for n in range(users):
+        yield str(100000 + n), generate_user(rng, habits, days, today, uniform)
+
+
+def generate_dataset(users: int, habits: int = 5, days: int = 3 * 365, seed: int = 42,
+                     uniform: bool = False) -> Dict[str, Any]:
+    """Весь набор в памяти (для небольших наборов)."""
+    return dict(iter_dataset(users, habits, days, seed, uniform))
+
+
+def write_dataset(path: str, users: int, habits: int = 5, days: int = 3 * 365,
+                  seed: int = 42, uniform: bool = False) -> int:
+    """
+    Запись habits.json на users пользователей по одному, без сборки всех
+    данных в памяти (годится и для миллиона пользователей).
+    Возвращает размер файла в байтах.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("{")
+        for n, (user_key, user_data) in enumerate(iter_dataset(users, habits, days, seed, uniform)):
+            record = json.dumps(user_data, ensure_ascii=False, separators=(",", ":"))
+            f.write(f'{"," if n else ""}\n"{user_key}":{record}')
+        f.write("\n}")
+    # f.write считает символы, а названия привычек — кириллица
+    return os.path.getsize(path)
@@ -0,0 +1,92 @@
+"""
+Задержка цикла событий при чтении и записи habits.json.
+
+Пока хранилище читает и пишет файл, фоновая задача каждую миллисекунду
+засекает, насколько позже срока она проснулась. Сравниваются разбор и
+сериализация прямо в цикле событий (как было) и через JSONOffloader.
+
+Запуск из каталога бота:
+    python -m benchmarks.event_loop_lag --users 20000
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+
+import config
+from serialization import JSONOffloader
+from storage import AsyncJSONStorage
+from benchmarks.dataset import generate_dataset
+
+# Порог больше любого файла: всё выполняется в цикле событий
+INLINE_KB = 1 << 30
+
+
+async def measure_lag(operation, rounds: int) -> dict:
+    """Максимальная и средняя задержка пробуждения во время operation()."""
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        interval = 0.001
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - started - interval)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await operation()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await task
+    return {
+        "max_lag_ms": max(lags) * 1000,
+        "avg_lag_ms": sum(lags) / len(lags) * 1000,
+        "op_ms": elapsed / rounds * 1000
+    }
+
+
+async def run(users: int, rounds: int, compact: bool):
+    data = generate_dataset(users)
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = AsyncJSONStorage()
+        storage._file_path = os.path.join(tmp, "habits.json")
+        storage._json = JSONOffloader(INLINE_KB, 0, compact)
+        await storage._write_file(data)
+        size_kb = os.path.getsize(storage._file_path) // 1024
+        print(f"Пользователей: {users}, файл: {size_kb} КБ\n")
+
+        modes = [
+            ("в цикле событий", JSONOffloader(INLINE_KB, 0, compact)),
+            ("пул потоков", JSONOffloader(config.JSON_THREAD_KB, 0, compact)),
+            ("процесс для записи", JSONOffloader(config.JSON_THREAD_KB, 1, compact)),
+        ]
+        print(f"{'режим':<20} {'операция':<8} {'макс. лаг, мс':>14} "
+              f"{'ср. лаг, мс':>12} {'время, мс':>10}")
+        for name, offloader in modes:
+            storage._json = offloader
+            for op_name, operation in (("чтение", storage._read_file),
+                                       ("запись", lambda: storage._write_file(data))):
+                result = await measure_lag(operation, rounds)
+                print(f"{name:<20} {op_name:<8} {result['max_lag_ms']:>14.1f} "
+                      f"{result['avg_lag_ms']:>12.2f} {result['op_ms']:>10.1f}")
+            offloader.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка цикла событий при работе с JSON")
+    parser.add_argument("--users", type=int, default=20000, help="число пользователей")
+    parser.add_argument("--rounds", type=int, default=5, help="повторов каждой операции")
+    parser.add_argument("--compact", action="store_true", help="писать JSON без отступов")
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.rounds, args.compact))
+
+
+if __name__ == "__main__":
+    main()
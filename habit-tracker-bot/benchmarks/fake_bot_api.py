@@ -0,0 +1,579 @@
+"""
+Локальный поддельный сервер Telegram Bot API для сквозных нагрузочных тестов.
+
+Реализует методы, которыми пользуются habit_bot.py и Basket/echo-bot.py:
+getMe, getUpdates (с долгим опросом), sendMessage, editMessageText,
+answerCallbackQuery, setWebhook, deleteWebhook и getWebhookInfo. В отличие от
+RecordingRequest из load_test, бот ходит сюда по настоящему HTTP через свой
+httpx-клиент, поэтому в замер входят сериализация запросов, пул соединений,
+лимиты OutboundQueue и обработка RetryAfter.
+
+Возможности:
+- задержка ответа --latency (+ случайная добавка до --jitter) в миллисекундах;
+- лимиты Telegram: не больше --global-rate сообщений в секунду всего и
+  --chat-rate в один чат, сверх них — ответ 429 с parameters.retry_after;
+  --flood-probability добавляет случайные 429 с --retry-after секундами;
+- генератор обновлений: --users пользователей по сценарию --script (команды
+  трекера привычек или эхо-сообщения) с темпом --rate обновлений в секунду,
+  всего --updates (0 — без ограничения). Если бот вызвал setWebhook,
+  обновления отправляются POST-запросами на его адрес, иначе отдаются через getUpdates;
+- статистика: GET /stats (JSON) и строка в консоли раз в --report секунд,
+  в том числе время от выдачи обновления боту до ответа на него (ответом
+  считается sendMessage в тот же чат или answerCallbackQuery, по порядку).
+
+Запуск:
+    python -m benchmarks.fake_bot_api --port 8081 --users 1000 --rate 200
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot BOT_TOKEN=1:fake python habit_bot.py
+"""
+import os
+import json
+import time
+import math
+import random
+import asyncio
+import argparse
+from collections import Counter, deque
+from itertools import count
+from typing import Dict, Any, Deque, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+os.environ.setdefault("BOT_TOKEN", "123456:benchmark")
+
+import httpx
+
+from benchmarks.load_test import BOT_USER, FIRST_USER_ID, UpdateFactory, user_script
+from benchmarks.metrics import latency_summary
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict",
+           411: "Length Required", 429: "Too Many Requests"}
+# Сколько последних замеров «обновление → ответ» хранится для перцентилей
+REPLY_SAMPLES = 100000
+
+
+class ApiError(Exception):
+    """Ответ Bot API с ok=false."""
+
+    def __init__(self, code: int, description: str, retry_after: Optional[int] = None):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.retry_after = retry_after
+
+    def payload(self) -> Dict[str, Any]:
+        payload = {"ok": False, "error_code": self.code, "description": self.description}
+        if self.retry_after is not None:
+            payload["parameters"] = {"retry_after": self.retry_after}
+        return payload
+
+
+class _Bucket:
+    """Корзина токенов: rate в секунду, запас до burst."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """0, если токен взят, иначе сколько секунд ждать следующего."""
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class FloodControl:
+    """Лимиты отправки сообщений как у Telegram (0 — без лимита)."""
+
+    def __init__(self, global_rate: float, chat_rate: float, probability: float = 0.0,
+                 retry_after: int = 1):
+        self._global = _Bucket(global_rate, global_rate) if global_rate else None
+        self._chat_rate = chat_rate
+        self._chats: Dict[int, _Bucket] = {}
+        self._probability = probability
+        self._retry_after = retry_after
+
+    def check(self, chat_id: int):
+        """ApiError 429, если сообщение в chat_id сейчас превышает лимит."""
+        if self._probability and random.random() < self._probability:
+            raise ApiError(429, f"Too Many Requests: retry after {self._retry_after}",
+                           self._retry_after)
+        now = time.monotonic()
+        if self._chat_rate:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                bucket = self._chats[chat_id] = _Bucket(self._chat_rate, 1)
+            wait = bucket.take(now)
+            if wait:
+                self._reject(wait)
+        if self._global is not None:
+            wait = self._global.take(now)
+            if wait:
+                self._reject(wait)
+
+    @staticmethod
+    def _reject(wait: float):
+        # Telegram сообщает retry_after целыми секундами
+        retry_after = max(1, math.ceil(wait))
+        raise ApiError(429, f"Too Many Requests: retry after {retry_after}", retry_after)
+
+
+class FakeBotAPI:
+    """HTTP/1.1-сервер с keep-alive поверх asyncio-потоков."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 flood: Optional[FloodControl] = None, webhook_connections: int = 40):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood = flood or FloodControl(0, 0)
+        self._webhook_connections = webhook_connections
+
+        self._updates: Deque[Dict[str, Any]] = deque()
+        self._new_updates = asyncio.Event()
+        self._message_ids = count(1)
+        self.webhook_url = ""
+        self.webhook_secret: Optional[str] = None
+        self._webhook_queue: Optional[asyncio.Queue] = None
+        self._webhook_tasks: List[asyncio.Task] = []
+        self._webhook_client: Optional[httpx.AsyncClient] = None
+
+        # Обновления, выданные боту и ещё без ответа: чат -> времена выдачи
+        self._awaiting: Dict[int, Deque[float]] = {}
+        self._callback_chats: Dict[str, int] = {}
+        self.reply_samples: Deque[float] = deque(maxlen=REPLY_SAMPLES)
+
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self._closing = False
+        self.connections = 0
+        self.requests = 0
+        self.generated = 0
+        self.delivered = 0
+        self.webhook_failures = 0
+        self.started = time.monotonic()
+
+    # --- обновления ---
+
+    def push_update(self, update: Dict[str, Any]):
+        """Новое обновление для бота (из генератора или теста)."""
+        self.generated += 1
+        query = update.get("callback_query")
+        if query:
+            self._callback_chats[query["id"]] = query["message"]["chat"]["id"]
+        if self._webhook_queue is not None:
+            self._webhook_queue.put_nowait(update)
+        else:
+            self._updates.append(update)
+            self._new_updates.set()
+
+    def _mark_delivered(self, updates: List[Dict[str, Any]]):
+        now = time.monotonic()
+        for update in updates:
+            chat_id = self._update_chat(update)
+            if chat_id is not None:
+                self._awaiting.setdefault(chat_id, deque()).append(now)
+        self.delivered += len(updates)
+
+    @staticmethod
+    def _update_chat(update: Dict[str, Any]) -> Optional[int]:
+        message = update.get("message") or update.get("callback_query", {}).get("message")
+        return message["chat"]["id"] if message else None
+
+    def _mark_replied(self, chat_id: Optional[int]):
+        waiting = self._awaiting.get(chat_id)
+        if not waiting:
+            # Сообщение не в ответ на обновление (например, напоминание)
+            return
+        self.reply_samples.append(time.monotonic() - waiting.popleft())
+        if not waiting:
+            del self._awaiting[chat_id]
+
+    # --- методы Bot API ---
+
+    async def get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if self._webhook_queue is not None:
+            raise ApiError(409, "Conflict: can't use getUpdates method while webhook is active; "
+                                "use deleteWebhook to delete the webhook first")
+        offset = _int(params.get("offset")) or 0
+        limit = min(100, _int(params.get("limit")) or 100)
+        timeout = float(params.get("timeout") or 0)
+        # offset подтверждает все обновления до него
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout and not self._closing:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        updates = [self._updates[n] for n in range(min(limit, len(self._updates)))]
+        self._mark_delivered(updates)
+        return updates
+
+    def _message(self, chat_id: int, text: str, message_id: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text
+        }
+
+    def send_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = _required_int(params, "chat_id")
+        text = params.get("text")
+        if not text:
+            raise ApiError(400, "Bad Request: message text is empty")
+        self.flood.check(chat_id)
+        self._mark_replied(chat_id)
+        return self._message(chat_id, text)
+
+    def edit_message_text(self, params: Dict[str, Any]) -> Any:
+        text = params.get("text")
+        if not text:
+            raise ApiError(400, "Bad Request: message text is empty")
+        if params.get("inline_message_id"):
+            return True
+        chat_id = _required_int(params, "chat_id")
+        message_id = _required_int(params, "message_id")
+        self.flood.check(chat_id)
+        # Правка идёт после answerCallbackQuery того же обновления: не отдельный ответ
+        return self._message(chat_id, text, message_id)
+
+    def answer_callback_query(self, params: Dict[str, Any]) -> bool:
+        query_id = params.get("callback_query_id")
+        if not query_id:
+            raise ApiError(400, "Bad Request: query is too old and response timeout expired "
+                                "or query ID is invalid")
+        self._mark_replied(self._callback_chats.pop(query_id, None))
+        return True
+
+    async def set_webhook(self, params: Dict[str, Any]) -> bool:
+        url = params.get("url") or ""
+        if not url:
+            await self._stop_webhook()
+            return True
+        if urlsplit(url).scheme not in ("http", "https"):
+            raise ApiError(400, "Bad Request: bad webhook: invalid URL")
+        self.webhook_url = url
+        self.webhook_secret = params.get("secret_token") or None
+        if self._webhook_queue is None:
+            self._webhook_queue = asyncio.Queue()
+            # Обновления, не забранные через getUpdates, уходят на webhook
+            while self._updates:
+                self._webhook_queue.put_nowait(self._updates.popleft())
+            connections = _int(params.get("max_connections")) or self._webhook_connections
+            self._webhook_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=connections), timeout=60)
+            self._webhook_tasks = [asyncio.create_task(self._deliver_webhook())
+                                   for _ in range(connections)]
+        if _flag(params.get("drop_pending_updates")):
+            self._drop_pending()
+        return True
+
+    async def delete_webhook(self, params: Dict[str, Any]) -> bool:
+        await self._stop_webhook()
+        if _flag(params.get("drop_pending_updates")):
+            self._drop_pending()
+        return True
+
+    def get_webhook_info(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        pending = self._webhook_queue.qsize() if self._webhook_queue else len(self._updates)
+        return {"url": self.webhook_url, "has_custom_certificate": False,
+                "pending_update_count": pending}
+
+    def _drop_pending(self):
+        self._updates.clear()
+        if self._webhook_queue is not None:
+            while not self._webhook_queue.empty():
+                self._webhook_queue.get_nowait()
+
+    async def _stop_webhook(self):
+        if self._webhook_queue is None:
+            return
+        for task in self._webhook_tasks:
+            task.cancel()
+        await asyncio.gather(*self._webhook_tasks, return_exceptions=True)
+        # Недоставленные обновления снова доступны через getUpdates
+        while not self._webhook_queue.empty():
+            self._updates.append(self._webhook_queue.get_nowait())
+        self._webhook_queue = None
+        self._webhook_tasks = []
+        await self._webhook_client.aclose()
+        self._webhook_client = None
+        self.webhook_url = ""
+        self.webhook_secret = None
+
+    async def _deliver_webhook(self):
+        headers = {"Content-Type": "application/json"}
+        if self.webhook_secret:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook_secret
+        while True:
+            update = await self._webhook_queue.get()
+            self._mark_delivered([update])
+            try:
+                response = await self._webhook_client.post(self.webhook_url, json=update,
+                                                           headers=headers)
+                if response.status_code == 200:
+                    continue
+            except httpx.HTTPError:
+                pass
+            # Как Telegram: неудачная доставка повторяется позже
+            self.webhook_failures += 1
+            waiting = self._awaiting.get(self._update_chat(update))
+            if waiting:
+                waiting.pop()
+            await asyncio.sleep(1)
+            self._webhook_queue.put_nowait(update)
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Any:
+        handlers = {
+            "getMe": lambda p: BOT_USER,
+            "getUpdates": self.get_updates,
+            "sendMessage": self.send_message,
+            "editMessageText": self.edit_message_text,
+            "answerCallbackQuery": self.answer_callback_query,
+            "setWebhook": self.set_webhook,
+            "deleteWebhook": self.delete_webhook,
+            "getWebhookInfo": self.get_webhook_info
+        }
+        handler = handlers.get(method)
+        if handler is None:
+            raise ApiError(404, "Not Found")
+        if self.latency or self.jitter:
+            await asyncio.sleep((self.latency + random.uniform(0, self.jitter)) / 1000)
+        result = handler(params)
+        return await result if asyncio.iscoroutine(result) else result
+
+    # --- HTTP ---
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                http_method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if headers.get("transfer-encoding"):
+                    status, payload = 411, ApiError(411, "Length Required").payload()
+                    await self._respond(writer, status, payload, keep_alive=False)
+                    break
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                status, payload = await self._dispatch(http_method, target, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            del self._connections[writer]
+            writer.close()
+
+    async def _dispatch(self, http_method: str, target: str, headers: Dict[str, str],
+                        body: bytes) -> Tuple[int, Dict[str, Any]]:
+        url = urlsplit(target)
+        if url.path == "/stats":
+            return 200, self.stats()
+        # /bot<token>/<method>
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            return 404, ApiError(404, "Not Found").payload()
+        method = parts[1]
+        self.calls[method] += 1
+        try:
+            params = dict(parse_qsl(url.query))
+            params.update(_parse_body(headers.get("content-type", ""), body))
+            return 200, {"ok": True, "result": await self.call(method, params)}
+        except ApiError as e:
+            self.errors[f"{method}:{e.code}"] += 1
+            return e.code, e.payload()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any],
+                       keep_alive: bool):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def close(self):
+        await self._stop_webhook()
+        # Соединения закрываются до остановки цикла: ждущие getUpdates
+        # получают ответ сразу, остальные — конец потока
+        self._closing = True
+        self._new_updates.set()
+        handlers = list(self._connections.values())
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            "uptime_s": elapsed,
+            "connections": self.connections,
+            "requests": self.requests,
+            "calls": dict(self.calls),
+            "errors": dict(self.errors),
+            "updates_generated": self.generated,
+            "updates_delivered": self.delivered,
+            "updates_pending": len(self._updates) + (
+                self._webhook_queue.qsize() if self._webhook_queue else 0),
+            "webhook": self.webhook_url,
+            "webhook_failures": self.webhook_failures,
+            "replies": len(self.reply_samples),
+            "reply_latency": latency_summary(self.reply_samples)
+        }
+
+
+def _parse_body(content_type: str, body: bytes) -> Dict[str, Any]:
+    """Параметры запроса: httpx-клиент PTB шлёт form-urlencoded, другие клиенты — JSON."""
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        return dict(parse_qsl(body.decode(), keep_blank_values=True))
+    raise ApiError(400, f"Bad Request: unsupported content type {content_type!r}")
+
+
+def _int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _required_int(params: Dict[str, Any], name: str) -> int:
+    value = _int(params.get(name))
+    if value is None:
+        raise ApiError(400, f"Bad Request: {name} is empty or invalid")
+    return value
+
+
+def _flag(value: Any) -> bool:
+    return value in (True, "true", "True", "1")
+
+
+def habit_script(factory: UpdateFactory, user_id: int) -> Iterator[Dict[str, Any]]:
+    """Бесконечный сценарий трекера привычек (как в load_test)."""
+    for _, update in user_script(factory, user_id, habits=3, rounds=10 ** 9, add_habits=True):
+        yield update
+
+
+def echo_script(factory: UpdateFactory, user_id: int) -> Iterator[Dict[str, Any]]:
+    """Сценарий эхо-бота: /start, /help и обычные сообщения."""
+    yield factory.command(user_id, "/start")
+    yield factory.command(user_id, "/help")
+    for number in count(1):
+        yield factory.text(user_id, f"Сообщение {number}")
+
+
+SCRIPTS = {"habits": habit_script, "echo": echo_script}
+
+
+async def generate_updates(server: FakeBotAPI, users: int, rate: float, total: int,
+                           script: str):
+    """Обновления пользователей по кругу с темпом rate в секунду (total=0 — бесконечно)."""
+    factory = UpdateFactory()
+    scripts = [SCRIPTS[script](factory, FIRST_USER_ID + n) for n in range(users)]
+    tick = 0.01
+    started = time.monotonic()
+    sent = 0
+    while not total or sent < total:
+        due = int((time.monotonic() - started) * rate) - sent
+        if total:
+            due = min(due, total - sent)
+        for _ in range(due):
+            server.push_update(next(scripts[sent % users]))
+            sent += 1
+        await asyncio.sleep(tick)
+
+
+def print_stats(stats: Dict[str, Any]):
+    reply = stats["reply_latency"]
+    print(f"[{stats['uptime_s']:7.1f} с] обновлений {stats['updates_delivered']}/"
+          f"{stats['updates_generated']} (в очереди {stats['updates_pending']}), "
+          f"ответов {stats['replies']}: p50 {reply['p50_ms']:.1f} / p99 {reply['p99_ms']:.1f} мс, "
+          f"запросов {stats['requests']} по {stats['connections']} соединениям, "
+          f"ошибок {sum(stats['errors'].values())}")
+
+
+async def serve(args: argparse.Namespace):
+    flood = FloodControl(args.global_rate, args.chat_rate, args.flood_probability,
+                         args.retry_after)
+    server = FakeBotAPI(args.latency, args.jitter, flood)
+    http = await asyncio.start_server(server.handle_connection, args.host, args.port)
+    print(f"Поддельный Bot API: http://{args.host}:{args.port}/bot "
+          f"(TELEGRAM_API_URL для бота)")
+
+    tasks = []
+    if args.users and args.rate:
+        tasks.append(asyncio.create_task(
+            generate_updates(server, args.users, args.rate, args.updates, args.script)))
+    try:
+        while True:
+            await asyncio.sleep(args.report)
+            print_stats(server.stats())
+    finally:
+        for task in tasks:
+            task.cancel()
+        # wait_closed ждёт завершения соединений, поэтому они закрываются раньше
+        http.close()
+        await server.close()
+        await http.wait_closed()
+        stats = server.stats()
+        print_stats(stats)
+        if args.json_path:
+            with open(args.json_path, 'w', encoding='utf-8') as f:
+                json.dump(stats, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поддельный Telegram Bot API для нагрузочных тестов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0, help="задержка ответа, мс")
+    parser.add_argument("--jitter", type=float, default=0, help="случайная добавка к задержке, мс")
+    parser.add_argument("--global-rate", type=float, default=30,
+                        help="сообщений в секунду всего (0 — без лимита)")
+    parser.add_argument("--chat-rate", type=float, default=1,
+                        help="сообщений в секунду в один чат (0 — без лимита)")
+    parser.add_argument("--flood-probability", type=float, default=0,
+                        help="доля запросов со случайным ответом 429")
+    parser.add_argument("--retry-after", type=int, default=1,
+                        help="retry_after случайных ответов 429, с")
+    parser.add_argument("--users", type=int, default=0, help="пользователей в генераторе обновлений")
+    parser.add_argument("--rate", type=float, default=100, help="обновлений в секунду")
+    parser.add_argument("--updates", type=int, default=0, help="всего обновлений (0 — без ограничения)")
+    parser.add_argument("--script", default="habits", choices=sorted(SCRIPTS))
+    parser.add_argument("--report", type=float, default=5, help="период вывода статистики, с")
+    parser.add_argument("--json", dest="json_path", help="записать итоговую статистику в JSON-файл")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
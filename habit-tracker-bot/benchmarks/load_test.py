@@ -0,0 +1,267 @@
+"""
+Нагрузочный тест обработчиков HabitTrackerBot.
+
+Для синтетических пользователей строятся обновления Telegram (/start,
+/add_habit, /check, /list_habits, /stats и кнопка «отметить всё») и
+прогоняются через настоящий Application с обработчиками бота. Вместо
+HTTP-клиента Bot API подставлен RecordingRequest: он отвечает сразу и
+только считает исходящие вызовы, поэтому измеряются обработчики и хранилище.
+
+Обновления одного пользователя идут по порядку, разных — параллельно
+(не больше --concurrency одновременно), как в PerUserUpdateProcessor.
+
+Запуск из каталога бота:
+    python -m benchmarks.load_test --users 1000 --rounds 5
+    python -m benchmarks.load_test --users 5000 --engine sqlite --json report.json
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+os.environ.setdefault("BOT_TOKEN", "123456:benchmark")
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+import config
+from benchmarks.dataset import write_dataset
+from benchmarks.metrics import latency_summary
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "HabitBot", "username": "habit_bench_bot"}
+FIRST_USER_ID = 100000
+
+
+class RecordingRequest(BaseRequest):
+    """Поддельный Bot API: мгновенные успешные ответы и счётчик вызовов."""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _result(self, endpoint: str, params: Dict[str, Any]) -> Any:
+        if endpoint == "getMe":
+            return BOT_USER
+        if endpoint in ("sendMessage", "editMessageText"):
+            self._message_id += 1
+            return {
+                "message_id": params.get("message_id", self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": params["chat_id"], "type": "private"},
+                "text": params.get("text", "")
+            }
+        return True
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[endpoint] += 1
+        payload = {"ok": True, "result": self._result(endpoint, params)}
+        return 200, json.dumps(payload).encode()
+
+
+class UpdateFactory:
+    """Синтетические обновления Telegram в виде словарей Bot API."""
+
+    def __init__(self):
+        self._update_id = 0
+
+    def _next_id(self) -> int:
+        self._update_id += 1
+        return self._update_id
+
+    @staticmethod
+    def _user(user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def text(self, user_id: int, text: str) -> Dict[str, Any]:
+        update_id = self._next_id()
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": self._user(user_id),
+                "text": text
+            }
+        }
+
+    def command(self, user_id: int, text: str) -> Dict[str, Any]:
+        update = self.text(user_id, text)
+        update["message"]["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+        ]
+        return update
+
+    def callback(self, user_id: int, data: str) -> Dict[str, Any]:
+        update_id = self._next_id()
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": BOT_USER,
+                    "text": "📋 Ваши привычки"
+                }
+            }
+        }
+
+
+def user_script(factory: UpdateFactory, user_id: int, habits: int, rounds: int,
+                add_habits: bool) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Обновления одного пользователя: (название обработчика, обновление)."""
+    yield "start", factory.command(user_id, "/start")
+    if add_habits:
+        for number in range(1, habits + 1):
+            yield "add_habit", factory.command(user_id, f"/add_habit Привычка {number}")
+    for round_number in range(rounds):
+        yield "check", factory.command(user_id, f"/check {round_number % habits + 1}")
+        yield "list_habits", factory.command(user_id, "/list_habits")
+        yield "check_all", factory.callback(user_id, "check_all")
+        yield "stats", factory.command(user_id, "/stats 30")
+
+
+def configure_storage(workdir: str, engine: str):
+    """Отдельные файлы данных бенчмарка (до создания хранилища)."""
+    config.DATA_FILE = os.path.join(workdir, "habits.db" if engine == "sqlite" else "habits.json")
+    config.STORAGE_ENGINE = "json" if engine == "sqlite" else engine
+    config.SHARDS_DIR = os.path.join(workdir, "habits_shards")
+    config.REMINDERS_FILE = os.path.join(workdir, "reminders.json")
+
+
+async def run(users: int, habits: int, rounds: int, days: int, concurrency: int,
+              engine: str, rate_limit: bool) -> Dict[str, Any]:
+    from delivery import OutboundQueue
+    from habit_bot import HabitTrackerBot
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_storage(workdir, engine)
+        if days and engine != "sqlite":
+            # Пользователи с историей за days дней: /stats и отметки работают с реальным объёмом
+            write_dataset(config.DATA_FILE, users, habits, days, uniform=True)
+
+        bot = HabitTrackerBot()
+        if not rate_limit:
+            # Лимиты Telegram не относятся к скорости обработчиков
+            bot.outbound = OutboundQueue(global_rate=1e9, chat_rate=1e9)
+        request = RecordingRequest()
+        application = bot.build_application(receive_updates=False, request=request)
+        await application.initialize()
+
+        factory = UpdateFactory()
+        scripts = [
+            list(user_script(factory, FIRST_USER_ID + n, habits, rounds,
+                             add_habits=not days or engine == "sqlite"))
+            for n in range(users)
+        ]
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        errors: Counter = Counter()
+
+        async def process_error(update, context):
+            errors[type(context.error).__name__] += 1
+        application.add_error_handler(process_error)
+
+        limit = asyncio.Semaphore(concurrency)
+
+        async def play(script):
+            async with limit:
+                for handler, data in script:
+                    update = Update.de_json(data, application.bot)
+                    started = time.perf_counter()
+                    await application.process_update(update)
+                    latencies[handler].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(play(script) for script in scripts))
+        elapsed = time.perf_counter() - started
+
+        await application.shutdown()
+        await bot.storage.close()
+        data_bytes = os.path.getsize(config.DATA_FILE) if os.path.isfile(config.DATA_FILE) else None
+
+    total = sum(len(samples) for samples in latencies.values())
+    checkins = len(latencies["check"]) + len(latencies["check_all"])
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            "users": users, "habits": habits, "rounds": rounds, "days": days,
+            "concurrency": concurrency, "engine": engine, "rate_limit": rate_limit
+        },
+        "elapsed_s": elapsed,
+        "updates": total,
+        "updates_per_s": total / elapsed if elapsed else 0.0,
+        "checkins_per_s": checkins / elapsed if elapsed else 0.0,
+        "handlers": {handler: latency_summary(samples) for handler, samples in latencies.items()},
+        "bot_api_calls": dict(request.calls),
+        "errors": dict(errors),
+        "data_file_bytes": data_bytes
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    params = report["params"]
+    print(f"Пользователей: {params['users']}, привычек: {params['habits']}, "
+          f"раундов: {params['rounds']}, хранилище: {params['engine']}, "
+          f"параллельно: {params['concurrency']}")
+    print(f"Обновлений: {report['updates']} за {report['elapsed_s']:.1f} с — "
+          f"{report['updates_per_s']:.0f} обновл./с, {report['checkins_per_s']:.0f} отметок/с\n")
+    print(f"{'обработчик':<12} {'число':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'макс, мс':>9}")
+    for handler, stats in report["handlers"].items():
+        print(f"{handler:<12} {stats['count']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+              f"{stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}")
+    print(f"\nВызовы Bot API: {report['bot_api_calls']}")
+    if report["errors"]:
+        print(f"Ошибки обработчиков: {report['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument("--users", type=int, default=1000, help="число пользователей")
+    parser.add_argument("--habits", type=int, default=3, help="привычек у пользователя")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="повторов цикла /check, /list_habits, «отметить всё», /stats")
+    parser.add_argument("--days", type=int, default=365,
+                        help="дней истории у пользователей заранее (0 — новые пользователи)")
+    parser.add_argument("--concurrency", type=int, default=64,
+                        help="сколько пользователей обрабатывается одновременно")
+    parser.add_argument("--engine", default="json",
+                        choices=["json", "sharded", "journal", "shared", "sqlite"])
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="оставить лимиты отправки Telegram (OutboundQueue)")
+    parser.add_argument("--json", dest="json_path", help="записать отчёт в JSON-файл")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.users, args.habits, args.rounds, args.days,
+                             args.concurrency, args.engine, args.rate_limit))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
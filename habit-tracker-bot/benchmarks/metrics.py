@@ -0,0 +1,24 @@
+"""Сводка задержек для бенчмарков."""
+from typing import Dict, Iterable
+
+
+def percentile(sorted_samples, q: float) -> float:
+    """Перцентиль q (0..1) уже отсортированной выборки (ближайший ранг)."""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(q * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+def latency_summary(samples: Iterable[float]) -> Dict[str, float]:
+    """Число замеров и avg/p50/p95/p99/max в миллисекундах по замерам в секундах."""
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        "count": count,
+        "avg_ms": sum(ordered) / count * 1000 if count else 0.0,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000 if count else 0.0
+    }
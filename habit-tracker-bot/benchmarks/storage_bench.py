@@ -0,0 +1,271 @@
+"""
+Микробенчмарки хранилищ на синтетических habits.json.
+
+Для каждого размера (по умолчанию 1k, 10k, 100k и 1M пользователей с
+историями до трёх лет) набор данных генерируется один раз, затем для
+каждого движка хранилища в отдельном процессе измеряются:
+
+- подготовка (перенос данных в формат движка), её пиковый RSS и размер
+  данных на диске;
+- get_user_data «холодный» (первое чтение пользователя) и «тёплый» (из кеша);
+- save_user_data под нагрузкой: N параллельных транзакций с отметкой привычки;
+- пиковый RSS процесса замеров (подготовка идёт в другом процессе).
+
+Результаты пишутся в JSON (--output), чтобы сравнивать их между версиями.
+Каждое измерение ограничено --budget секундами: на больших наборах медленные
+движки успевают меньше замеров (их число есть в отчёте), но не часами.
+
+Запуск из каталога бота:
+    python -m benchmarks.storage_bench --sizes 1000,10000 --output bench.json
+    python -m benchmarks.storage_bench --engines sqlite,sharded --sizes 1000000
+"""
+import os
+import sys
+import time
+import json
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+from typing import Dict, Any, List
+
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+
+from benchmarks.dataset import write_dataset
+from benchmarks.metrics import latency_summary
+
+ENGINES = ("json", "sharded", "journal", "shared", "sqlite")
+FIRST_USER_ID = 100000
+
+
+def _data_bytes(workdir: str) -> int:
+    """Объём всех файлов данных движка (файл, шарды, журнал, база)."""
+    total = 0
+    for root, _, files in os.walk(workdir):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files
+                     if name != "source.json")
+    return total
+
+
+def _prepare(engine: str, source: str) -> float:
+    """Перенос набора данных в формат движка. Возвращает время в секундах."""
+    import config
+    from sharded_storage import migrate_json_to_shards
+    from sqlite_storage import migrate_json_to_sqlite
+
+    started = time.perf_counter()
+    if engine == "sharded":
+        migrate_json_to_shards(source, config.SHARDS_DIR, config.SHARD_COUNT)
+    elif engine == "sqlite":
+        migrate_json_to_sqlite(source, config.DATA_FILE)
+    else:
+        shutil.copyfile(source, config.DATA_FILE)
+    return time.perf_counter() - started
+
+
+async def _timed_lookups(storage, user_ids: List[int], budget: float) -> List[float]:
+    samples = []
+    deadline = time.perf_counter() + budget
+    for user_id in user_ids:
+        started = time.perf_counter()
+        await storage.get_user_data(user_id)
+        samples.append(time.perf_counter() - started)
+        if time.perf_counter() > deadline:
+            break
+    return samples
+
+
+async def _timed_saves(storage, user_ids: List[int], concurrency: int,
+                       budget: float) -> Dict[str, Any]:
+    """concurrency параллельных транзакций: чтение, отметка привычки, сохранение."""
+    from utils import record_checkin
+    from timezones import clock
+
+    samples = []
+    queue = list(user_ids)
+    deadline = time.perf_counter() + budget
+
+    async def worker():
+        while queue and time.perf_counter() < deadline:
+            user_id = queue.pop()
+            async with storage.user_transaction(user_id) as user_data:
+                for habit in user_data.get("habits", []):
+                    record_checkin(habit, clock.today(user_data.get("timezone")))
+                started = time.perf_counter()
+                await storage.save_user_data(user_id, user_data)
+                samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    # При групповой записи изменения ещё в буфере: сброс входит в общее время
+    await storage.flush()
+    elapsed = time.perf_counter() - started
+    return {
+        **latency_summary(samples),
+        "concurrency": concurrency,
+        "saves_per_s": len(samples) / elapsed if elapsed else 0.0
+    }
+
+
+async def _measure(engine: str, users: int, samples: int, concurrency: List[int],
+                   budget: float) -> Dict[str, Any]:
+    from storage import create_storage
+
+    storage = create_storage()
+    rng = random.Random(7)
+    # Разные пользователи для чтения и для каждого уровня записи
+    picked = rng.sample(range(users), min(users, samples * (1 + len(concurrency))))
+    lookup_ids = [FIRST_USER_ID + n for n in picked[:samples]]
+
+    result = {
+        "get_cold": latency_summary(await _timed_lookups(storage, lookup_ids, budget)),
+        "get_warm": latency_summary(await _timed_lookups(storage, lookup_ids, budget)),
+        "save": []
+    }
+    for level, clients in enumerate(concurrency, start=1):
+        save_ids = [FIRST_USER_ID + n for n in picked[level * samples:(level + 1) * samples]]
+        result["save"].append(await _timed_saves(storage, save_ids, clients, budget))
+    result["cache"] = storage.cache_stats()
+    await storage.close()
+    return result
+
+
+def _peak_rss_kb() -> int:
+    # ru_maxrss в Linux — килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _prepare_case(engine: str, source: str) -> Dict[str, Any]:
+    """
+    Подготовка данных движка (выполняется в отдельном процессе): миграция
+    читает весь набор в память, и её пик не должен попадать в RSS замеров.
+    """
+    from benchmarks.load_test import configure_storage
+
+    casedir = os.path.join(os.path.dirname(source), engine)
+    os.makedirs(casedir)
+    configure_storage(casedir, engine)
+    prepare_s = _prepare(engine, source)
+    return {"prepare_s": prepare_s, "prepare_peak_rss_kb": _peak_rss_kb()}
+
+
+def _run_case(engine: str, users: int, source: str, samples: int,
+              concurrency: List[int], budget: float, resident: bool) -> Dict[str, Any]:
+    """Замеры одного движка на подготовленных данных (в отдельном процессе)."""
+    import config
+    from benchmarks.load_test import configure_storage
+
+    casedir = os.path.join(os.path.dirname(source), engine)
+    configure_storage(casedir, engine)
+    config.RESIDENT_DATASET = resident
+
+    result = asyncio.run(_measure(engine, users, samples, concurrency, budget))
+    data_bytes = _data_bytes(casedir)
+    shutil.rmtree(casedir)
+    return {
+        "engine": engine,
+        "users": users,
+        "data_bytes": data_bytes,
+        **result,
+        "peak_rss_kb": _peak_rss_kb()
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(sizes: List[int], engines: List[str], habits: int, days: int, samples: int,
+        concurrency: List[int], budget: float, resident: bool) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for users in sizes:
+            source = os.path.join(workdir, "source.json")
+            started = time.perf_counter()
+            source_bytes = write_dataset(source, users, habits, days)
+            print(f"Набор {users} пользователей: {source_bytes / 2 ** 20:.1f} МБ "
+                  f"за {time.perf_counter() - started:.1f} с")
+            for engine in engines:
+                # Свои процессы на подготовку и на замеры: чистые кеши, синглтон
+                # хранилища и пиковый RSS только фазы замеров
+                with context.Pool(1) as pool:
+                    prepared = pool.apply(_prepare_case, (engine, source))
+                with context.Pool(1) as pool:
+                    case = pool.apply(_run_case, (engine, users, source, samples,
+                                                  concurrency, budget, resident))
+                case.update(prepared, source_bytes=source_bytes)
+                results.append(case)
+                print_case(case)
+            os.remove(source)
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": {
+            "sizes": sizes, "engines": engines, "habits": habits, "days": days,
+            "samples": samples, "concurrency": concurrency, "budget_s": budget,
+            "resident": resident
+        },
+        "results": results
+    }
+
+
+def print_case(case: Dict[str, Any]):
+    cold, warm = case["get_cold"], case["get_warm"]
+    print(f"  {case['engine']:<8} данные {case['data_bytes'] / 2 ** 20:8.1f} МБ, "
+          f"RSS {case['peak_rss_kb'] / 1024:7.0f} МБ "
+          f"(подготовка {case['prepare_peak_rss_kb'] / 1024:.0f} МБ), "
+          f"get холодный p50 {cold['p50_ms']:.2f} / p99 {cold['p99_ms']:.2f} мс "
+          f"({cold['count']}), тёплый p50 {warm['p50_ms']:.3f} мс")
+    for save in case["save"]:
+        print(f"           save x{save['concurrency']:<3} p50 {save['p50_ms']:.2f} / "
+              f"p99 {save['p99_ms']:.2f} мс, {save['saves_per_s']:.0f} записей/с ({save['count']})")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк хранилищ на синтетических данных")
+    parser.add_argument("--sizes", type=_int_list, default=[1000, 10000, 100000, 1000000],
+                        help="размеры наборов через запятую")
+    parser.add_argument("--engines", default=",".join(ENGINES),
+                        help=f"движки через запятую ({', '.join(ENGINES)})")
+    parser.add_argument("--habits", type=int, default=5, help="наибольшее число привычек")
+    parser.add_argument("--days", type=int, default=3 * 365, help="наибольшая длина истории")
+    parser.add_argument("--samples", type=int, default=200, help="замеров на операцию")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 16, 64],
+                        help="уровни параллельности записи через запятую")
+    parser.add_argument("--budget", type=float, default=30, help="секунд на одно измерение")
+    parser.add_argument("--resident", action="store_true", help="RESIDENT_DATASET=1")
+    parser.add_argument("--output", default="storage_bench.json", help="файл отчёта JSON")
+    args = parser.parse_args()
+
+    engines = [engine for engine in args.engines.split(",") if engine]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"неизвестные движки: {', '.join(sorted(unknown))}")
+
+    report = run(args.sizes, engines, args.habits, args.days, args.samples,
+                 args.concurrency, args.budget, args.resident)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nОтчёт: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import json
+from typing import Dict, Any
+
+from cachetools import LRUCache, LFUCache, TTLCache
+
+from history import encode_default
+
+CACHE_POLICIES = ("lru", "lfu", "ttl")
+
+
+def record_size(user_data: Dict[str, Any]) -> int:
+    """Примерный объём записи пользователя в памяти (по длине её JSON)."""
+    return len(json.dumps(user_data, ensure_ascii=False, default=encode_default))
+
+
+class _StatsMixin:
+    """
+    Счётчики попаданий, промахов и вытеснений поверх кеша cachetools.
+    Запись, которая больше всего кеша, не кешируется (вместо ValueError).
+    """
+
+    def _init_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def lookup(self, key):
+        """Чтение из кеша с учётом в статистике (None — промах)."""
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        try:
+            super().__setitem__(key, value)
+        except ValueError:
+            # Запись не помещается в кеш целиком; старая версия больше не верна
+            self.pop(key, None)
+            self.rejected += 1
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "bytes": self.currsize,
+            "max_bytes": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "rejected": self.rejected
+        }
+
+
+class StatsLRUCache(_StatsMixin, LRUCache):
+    pass
+
+
+class StatsLFUCache(_StatsMixin, LFUCache):
+    pass
+
+
+class StatsTTLCache(_StatsMixin, TTLCache):
+    pass
+
+
+def make_cache(policy: str, max_bytes: int, ttl: int):
+    """
+    Кеш записей пользователей с вытеснением по объёму (record_size),
+    а не по числу записей. policy: "lru", "lfu" или "ttl" (LRU + срок жизни).
+    """
+    if policy == "lru":
+        cache = StatsLRUCache(maxsize=max_bytes, getsizeof=record_size)
+    elif policy == "lfu":
+        cache = StatsLFUCache(maxsize=max_bytes, getsizeof=record_size)
+    elif policy == "ttl":
+        cache = StatsTTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=record_size)
+    else:
+        raise ValueError(f"Неизвестная политика кеша: {policy} (ожидается одна из {CACHE_POLICIES})")
+    cache._init_stats()
+    return cache
@@ -7,5 +7,110 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise ValueError("Не задан BOT_TOKEN в переменных окружения .env")
 
-# Путь к файлу данных
-DATA_FILE = "habits.json"
\ No newline at end of file
+# Путь к файлу данных; расширение .db/.sqlite/.sqlite3 включает хранилище SQLite
+DATA_FILE = os.getenv("DATA_FILE", "habits.json")
+
+# Движок хранилища: "json" (один файл), "sharded" (файл на группу пользователей),
+# "journal" (снимок DATA_FILE + журнал изменений DATA_FILE.wal) или "shared"
+# (один файл, с которым одновременно работают несколько процессов бота)
+STORAGE_ENGINE = os.getenv("STORAGE_ENGINE", "json")
+
+# Каталог и число шардов для движка "sharded"
+SHARDS_DIR = os.getenv("SHARDS_DIR", "habits_shards")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "256"))
+
+# Кеш записей пользователей: политика "lru", "lfu" или "ttl" (LRU со сроком
+# жизни CACHE_TTL секунд), объём — CACHE_MAX_KB килобайт JSON-представления
+CACHE_POLICY = os.getenv("CACHE_POLICY", "ttl")
+CACHE_MAX_KB = int(os.getenv("CACHE_MAX_KB", "16384"))
+CACHE_TTL = int(os.getenv("CACHE_TTL", "30"))
+
+# Резидентный режим: habits.json читается один раз и хранится в памяти;
+# если данные в памяти занимают больше RESIDENT_MAX_MB, бот возвращается к чтению с диска
+RESIDENT_DATASET = os.getenv("RESIDENT_DATASET", "0") == "1"
+RESIDENT_MAX_MB = int(os.getenv("RESIDENT_MAX_MB", "512"))
+# Во сколько раз словари Python больше JSON тех же данных: объём в памяти
+# оценивается как размер JSON записей * RESIDENT_MEMORY_FACTOR (по tracemalloc
+# на наборах benchmarks/dataset.py — от 3 до 5 раз, меньше для длинных историй)
+RESIDENT_MEMORY_FACTOR = float(os.getenv("RESIDENT_MEMORY_FACTOR", "5"))
+
+# JSON-файлы меньше JSON_THREAD_KB разбираются и пишутся прямо в цикле событий,
+# крупнее — в пуле потоков, от JSON_PROCESS_KB (0 — никогда) — в отдельном процессе.
+# Процесс почти убирает средний лаг записи, но передача данных в него даёт
+# одну длинную паузу (см. python -m benchmarks.event_loop_lag).
+# JSON_COMPACT=1 пишет файлы без отступов: меньше и быстрее
+JSON_THREAD_KB = int(os.getenv("JSON_THREAD_KB", "64"))
+JSON_PROCESS_KB = int(os.getenv("JSON_PROCESS_KB", "0"))
+JSON_COMPACT = os.getenv("JSON_COMPACT", "0") == "1"
+
+# Число блокировок для транзакций пользователей (пользователи делят их по хешу user_id)
+USER_LOCK_STRIPES = int(os.getenv("USER_LOCK_STRIPES", "1024"))
+
+# Групповая запись: сохранения копятся GROUP_COMMIT_WINDOW_MS миллисекунд
+# (0 — выключено) или до GROUP_COMMIT_MAX_USERS пользователей и пишутся разом
+GROUP_COMMIT_WINDOW_MS = int(os.getenv("GROUP_COMMIT_WINDOW_MS", "0"))
+GROUP_COMMIT_MAX_USERS = int(os.getenv("GROUP_COMMIT_MAX_USERS", "500"))
+
+# Журнал сворачивается в снимок, когда вырастает до JOURNAL_COMPACT_BYTES
+# или раз в JOURNAL_COMPACT_INTERVAL секунд
+JOURNAL_COMPACT_BYTES = int(os.getenv("JOURNAL_COMPACT_BYTES", str(4 * 1024 * 1024)))
+JOURNAL_COMPACT_INTERVAL = int(os.getenv("JOURNAL_COMPACT_INTERVAL", "300"))
+# fsync после каждой записи в журнал (надёжнее, но медленнее)
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "1") == "1"
+
+# Число соединений (и потоков) для хранилища SQLite
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+
+# Ежедневные напоминания: время по умолчанию (местное, "HH:MM"), файл с расписанием
+# (рядом пишется REMINDERS_FILE.progress) и рассылка пачками по REMINDER_BATCH_SIZE
+# пользователей с паузой REMINDER_BATCH_INTERVAL секунд (лимиты Telegram ~30 сообщений/с)
+REMINDER_TIME = os.getenv("REMINDER_TIME", "09:00")
+REMINDERS_FILE = os.getenv("REMINDERS_FILE", "reminders.json")
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "30"))
+REMINDER_BATCH_INTERVAL = float(os.getenv("REMINDER_BATCH_INTERVAL", "1.0"))
+# STORAGE_ENGINE=shared: напоминания рассылает один процесс — владелец блокировки
+# REMINDERS_FILE.lock. Раз в REMINDER_RESYNC_SECONDS владелец сверяет расписание
+# с хранилищем (туда пишут /remind и /timezone из всех процессов), а остальные
+# проверяют, не освободилась ли блокировка (владелец остановился или упал)
+REMINDER_RESYNC_SECONDS = float(os.getenv("REMINDER_RESYNC_SECONDS", "300"))
+
+# Исходящие сообщения: не больше OUTBOUND_GLOBAL_RATE запросов в секунду всего
+# и OUTBOUND_CHAT_RATE в один чат; в каждой очереди (ответы, рассылки) до
+# OUTBOUND_MAX_PENDING сообщений, сетевые ошибки повторяются OUTBOUND_MAX_RETRIES раз
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_MAX_PENDING = int(os.getenv("OUTBOUND_MAX_PENDING", "10000"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+# Раз в STATS_LOG_INTERVAL секунд бот печатает строку со статистикой обработки
+# обновлений и отправки (очереди, ошибки, задержка доставки); 0 — не печатать
+STATS_LOG_INTERVAL = float(os.getenv("STATS_LOG_INTERVAL", "300"))
+
+# Сколько обновлений обрабатывается одновременно (обновления одного
+# пользователя — всегда по порядку); 1 — строго последовательная обработка
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+
+# Адрес Bot API (к нему добавляется токен): свой сервер telegram-bot-api или
+# поддельный для нагрузочных тестов (python -m benchmarks.fake_bot_api)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+
+# Режим webhook: если задан WEBHOOK_URL (внешний https-адрес, например за
+# nginx), бот поднимает HTTP-сервер на WEBHOOK_LISTEN:WEBHOOK_PORT и принимает
+# обновления по пути WEBHOOK_PATH; иначе работает через getUpdates (polling).
+# WEBHOOK_SECRET проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+
+# Число процессов-обработчиков. При WORKERS > 1 главный процесс только принимает
+# обновления и раздаёт их по user_id % WORKERS; у каждого обработчика свои файлы
+# данных и напоминаний (habits.w0.json, ...; разделить существующие данные:
+# python migrate.py workers) и своя доля OUTBOUND_GLOBAL_RATE
+WORKERS = int(os.getenv("WORKERS", "1"))
+# Сколько обновлений может ждать в очереди одного обработчика
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "10000"))
+# Сколько секунд диспетчер ждёт места в заполненной очереди обработчика,
+# прежде чем отбросить обновление с ошибкой
+WORKER_PUT_TIMEOUT = float(os.getenv("WORKER_PUT_TIMEOUT", "30"))
@@ -0,0 +1,60 @@
+from datetime import date
+from typing import Dict, Any, Optional, Tuple
+
+from history import habit_history
+from timezones import DEFAULT_TIMEZONE, DayClock, clock as default_clock
+
+
+class DailyCompletionIndex:
+    """
+    Сколько привычек пользователь ещё не отметил за свой местный сегодняшний день.
+
+    На пользователя хранится кортеж (пояс, номер дня, всего привычек, отмечено).
+    Запись обновляется при каждой отметке; после местной полуночи номер дня
+    перестаёт совпадать с today() пояса, и запись читается как «ничего не
+    отмечено» — сброс в полночь не требует прохода по пользователям.
+
+    Рассылка напоминаний берёт отсюда status() и не читает
+    хранилище для пользователей без привычек или уже всё выполнивших.
+    Неизвестный пользователь (например, после перезапуска) — None: его данные
+    читаются один раз и попадают в индекс через track().
+    """
+
+    def __init__(self, day_clock: Optional[DayClock] = None):
+        self._clock = day_clock or default_clock
+        self._entries: Dict[int, Tuple[str, int, int, int]] = {}
+
+    def track(self, user_id: int, user_data: Dict[str, Any]):
+        """Пересчёт записи по данным пользователя (после добавления привычек, смены пояса)."""
+        timezone = user_data.get("timezone") or DEFAULT_TIMEZONE
+        today = self._clock.today(timezone)
+        habits = user_data.get("habits", [])
+        done = sum(1 for habit in habits if today in habit_history(habit))
+        self._entries[user_id] = (timezone, today.toordinal(), len(habits), done)
+
+    def checked(self, user_id: int, user_data: Dict[str, Any], today: date):
+        """Учёт новой отметки за today за O(1)."""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] != (user_data.get("timezone") or DEFAULT_TIMEZONE):
+            self.track(user_id, user_data)
+            return
+        timezone, day, total, done = entry
+        if day != today.toordinal():
+            day, done = today.toordinal(), 0
+        self._entries[user_id] = (timezone, day, total, min(done + 1, total))
+
+    def discard(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def status(self, user_id: int) -> Optional[Tuple[int, int]]:
+        """(всего привычек, не отмечено сегодня) или None, если пользователя нет в индексе."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        timezone, day, total, done = entry
+        if self._clock.today(timezone).toordinal() != day:
+            return total, total
+        return total, total - done
+
+    def __len__(self) -> int:
+        return len(self._entries)
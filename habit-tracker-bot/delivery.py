@@ -0,0 +1,249 @@
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from datetime import timedelta
+from typing import Dict, Any, Callable, Coroutine, List, Optional, Tuple
+
+from telegram.error import BadRequest, RetryAfter, NetworkError, TimedOut
+from telegram.ext import BaseRateLimiter
+
+# Очереди исходящих сообщений: ответы на команды идут раньше рассылок
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+LANE_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk"}
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    value = error.retry_after
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+class _PriorityTokenBucket:
+    """
+    Общий лимит Telegram: rate запросов в секунду с запасом burst.
+    Ожидающие получают токены по приоритету, внутри приоритета — по очереди.
+    pause() останавливает выдачу (после RetryAfter).
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def waiting(self, priority: int) -> int:
+        return sum(1 for p, _, future in self._waiters if p == priority and not future.done())
+
+    async def acquire(self, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._wakeup.set()
+        await future
+
+    def _refill(self, now: float):
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def run(self):
+        """Выдача токенов ожидающим (фоновая задача)."""
+        while True:
+            # Отменённые ожидающие токен не получают
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            self._refill(now)
+            delay = max(self._paused_until - now, (1 - self._tokens) / self._rate)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            self._tokens -= 1
+            heapq.heappop(self._waiters)[2].set_result(None)
+
+
+class _ChatState:
+    __slots__ = ("lock", "next_allowed", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.next_allowed = 0.0
+        self.users = 0
+
+
+class OutboundQueue(BaseRateLimiter):
+    """
+    Ограничитель исходящих запросов к Bot API (подключается через
+    Application.builder().rate_limiter(...), поэтому через него проходят и
+    ответы на команды, и рассылки).
+
+    - общий токен-бакет global_rate запросов/с с приоритетами: ответы
+      пользователям (PRIORITY_INTERACTIVE, по умолчанию) обгоняют
+      напоминания (rate_limit_args=PRIORITY_BULK);
+    - не чаще chat_rate сообщений в секунду в один чат, порядок сообщений
+      в чате сохраняется;
+    - RetryAfter приостанавливает все отправки на указанное Telegram время,
+      после чего запрос повторяется; сетевые ошибки повторяются с
+      экспоненциальной задержкой (не более max_retries раз);
+    - в каждой очереди не больше max_pending запросов: следующие ждут места,
+      так что рассылка не накапливает в памяти сотни тысяч сообщений;
+    - stats() — глубина очередей и задержка доставки.
+
+    Запросы без chat_id (answerCallbackQuery, getMe и т. п.) идут без очереди.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1,
+                 max_pending: int = 10000, max_retries: int = 3,
+                 backoff_base: float = 0.5):
+        self._global_rate = global_rate
+        self._chat_interval = 1 / chat_rate
+        self._max_pending = max_pending
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+
+        self._bucket: Optional[_PriorityTokenBucket] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lanes: Dict[int, asyncio.Semaphore] = {}
+        self._chats: Dict[Any, _ChatState] = {}
+
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.retry_after = 0
+        self._pending = {priority: 0 for priority in LANE_NAMES}
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._latencies = deque(maxlen=1000)
+
+    async def initialize(self):
+        # PTB вызывает initialize и из Application, и из Updater
+        if self._task:
+            return
+        self._bucket = _PriorityTokenBucket(self._global_rate, max(1, int(self._global_rate)))
+        self._lanes = {priority: asyncio.Semaphore(self._max_pending) for priority in LANE_NAMES}
+        self._task = asyncio.create_task(self._bucket.run())
+
+    async def shutdown(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _forget_chat(self, chat_id):
+        state = self._chats.get(chat_id)
+        if state is not None and state.users == 0:
+            del self._chats[chat_id]
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ):
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        priority = PRIORITY_BULK if rate_limit_args == PRIORITY_BULK else PRIORITY_INTERACTIVE
+        started = time.monotonic()
+        self._pending[priority] += 1
+        try:
+            async with self._lanes[priority]:
+                state = self._chats.get(chat_id)
+                if state is None:
+                    state = self._chats[chat_id] = _ChatState()
+                state.users += 1
+                try:
+                    async with state.lock:
+                        delay = state.next_allowed - time.monotonic()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                        try:
+                            result = await self._send(callback, args, kwargs, priority)
+                        finally:
+                            state.next_allowed = time.monotonic() + self._chat_interval
+                finally:
+                    state.users -= 1
+                    if state.users == 0:
+                        # Состояние чата нужно только до конца интервала между сообщениями
+                        asyncio.get_running_loop().call_later(
+                            self._chat_interval, self._forget_chat, chat_id
+                        )
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending[priority] -= 1
+
+        latency = time.monotonic() - started
+        self.sent += 1
+        self._latency_total += latency
+        self._latency_max = max(self._latency_max, latency)
+        self._latencies.append(latency)
+        return result
+
+    async def _send(self, callback, args, kwargs, priority: int):
+        """Отправка с повторами после RetryAfter и сетевых ошибок."""
+        attempt = 0
+        while True:
+            await self._bucket.acquire(priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.retry_after += 1
+                self._bucket.pause(_retry_seconds(e))
+                if attempt >= self._max_retries:
+                    raise
+            except TimedOut:
+                # Сообщение могло дойти: повтор дал бы дубликат
+                raise
+            except BadRequest:
+                # Наследник NetworkError, но ошибка постоянная: повтор ничего не даст
+                raise
+            except NetworkError:
+                if attempt >= self._max_retries:
+                    raise
+                await asyncio.sleep(self._backoff_base * 2 ** attempt)
+            attempt += 1
+            self.retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        recent = sorted(self._latencies)
+
+        def percentile(q: float) -> float:
+            return recent[min(len(recent) - 1, int(q * len(recent)))] if recent else 0.0
+
+        return {
+            "pending": {LANE_NAMES[p]: count for p, count in self._pending.items()},
+            "waiting_for_token": {
+                LANE_NAMES[p]: self._bucket.waiting(p) if self._bucket else 0 for p in LANE_NAMES
+            },
+            "active_chats": len(self._chats),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "retry_after": self.retry_after,
+            "latency_avg": self._latency_total / self.sent if self.sent else 0.0,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_max": self._latency_max
+        }
@@ -1,6 +1,6 @@
 import asyncio
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from datetime import timedelta
+from typing import List, Dict, Any, Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -8,19 +8,67 @@ from telegram.ext import (
     ContextTypes, JobQueue
 )
 from telegram.constants import ParseMode
+from telegram.request import BaseRequest
 
 import config
-from storage import AsyncJSONStorage
+from daily_index import DailyCompletionIndex
+from delivery import OutboundQueue, PRIORITY_BULK
+from history import HabitHistory, habit_history
+from reminders import OwnerLock, ReminderScheduler, parse_remind_time
+from storage import create_storage
+from timezones import clock, user_today
+from update_processor import PerUserUpdateProcessor
 from utils import (
-    format_progress_bar, get_week_calendar,
-    calculate_streak, get_timezone_time, format_habit_list
+    format_progress_bar, get_week_calendar, format_period_breakdown,
+    record_checkin, recompute_streak, rolling_count, get_timezone_time, format_habit_list
 )
 
 
+# С какого периода /stats добавляет разбивку по месяцам и дням недели
+BREAKDOWN_MIN_DAYS = 60
+# Самый длинный период /stats (10 лет): дальше разбивка не влезает в сообщение,
+# а очень большие значения выходят за пределы дат datetime
+STATS_MAX_DAYS = 3660
+
+
 class HabitTrackerBot:
     def __init__(self):
-        self.storage = AsyncJSONStorage()
+        self.storage = create_storage()
         self.application = None
+        self.reminders = ReminderScheduler(
+            self.daily_reminder, config.REMINDERS_FILE, config.REMINDER_TIME,
+            config.REMINDER_BATCH_SIZE, config.REMINDER_BATCH_INTERVAL
+        )
+        self._reminder_task = None
+        self._stats_task = None
+        self.completions = DailyCompletionIndex()
+        self.outbound = OutboundQueue(
+            config.OUTBOUND_GLOBAL_RATE, config.OUTBOUND_CHAT_RATE,
+            config.OUTBOUND_MAX_PENDING, config.OUTBOUND_MAX_RETRIES
+        )
+        self.updates = PerUserUpdateProcessor(config.CONCURRENT_UPDATES)
+
+    def _schedule_reminder(self, user_id: int, user_data: Dict[str, Any]) -> bool:
+        """Регистрация пользователя в расписании напоминаний (если он их не отключил)."""
+        remind_at = user_data.get("remind_at", config.REMINDER_TIME)
+        if remind_at:
+            self.reminders.schedule(user_id, user_data.get("timezone"), remind_at)
+        return bool(remind_at)
+
+    async def _schedule_stored_users(self) -> int:
+        """
+        Сверка расписания с хранилищем: пользователи, появившиеся до запуска
+        (или до появления планировщика), получают напоминания без /start,
+        а удалённые и отключившие напоминания снимаются с расписания.
+        Возвращает число пользователей в расписании.
+        """
+        scheduled = []
+        async for user_id, user_data in self.storage.iter_users():
+            self.completions.track(user_id, user_data)
+            if self._schedule_reminder(user_id, user_data):
+                scheduled.append(user_id)
+        self.reminders.retain(scheduled)
+        return len(scheduled)
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start."""
@@ -32,14 +80,18 @@ class HabitTrackerBot:
             "/add_habit [название] - добавить новую привычку\n"
             "/list_habits - список всех привычек\n"
             "/check [номер] - отметить выполнение привычки сегодня\n"
-            "/stats [дней] - статистика за N дней (по умолчанию 7)\n"
+            "/stats [дней] - статистика за N дней (по умолчанию 7, /stats 365 — за год)\n"
+            "/timezone [пояс] - часовой пояс, например Europe/Berlin\n"
+            "/remind [ЧЧ:ММ|off] - время ежедневного напоминания\n"
             "/reset - сбросить все привычки\n\n"
-            "⏰ Ежедневно в 9:00 я буду присылать напоминание!"
+            f"⏰ Ежедневно в {config.REMINDER_TIME} я буду присылать напоминание!"
         )
 
         # Создаем запись пользователя, если её нет
-        user_data = await self.storage.get_user_data(user.id)
-        await self.storage.save_user_data(user.id, user_data)
+        async with self.storage.user_transaction(user.id) as user_data:
+            await self.storage.save_user_data(user.id, user_data)
+            self.completions.track(user.id, user_data)
+        self._schedule_reminder(user.id, user_data)
 
         await update.message.reply_text(welcome_text, parse_mode=ParseMode.MARKDOWN)
 
@@ -56,23 +108,28 @@ class HabitTrackerBot:
         user_id = update.effective_user.id
 
         # Получаем данные пользователя
-        user_data = await self.storage.get_user_data(user_id)
-        habits = user_data.get("habits", [])
-
-        # Создаем новую привычку
-        new_habit = {
-            "id": len(habits) + 1,
-            "name": habit_name,
-            "created": datetime.now().strftime("%Y-%m-%d"),
-            "history": [],
-            "streak": 0
-        }
-
-        habits.append(new_habit)
-        user_data["habits"] = habits
-
-        # Сохраняем
-        await self.storage.save_user_data(user_id, user_data)
+        async with self.storage.user_transaction(user_id) as user_data:
+            habits = user_data.get("habits", [])
+            today = user_today(user_data)
+
+            # Создаем новую привычку
+            new_habit = {
+                "id": len(habits) + 1,
+                "name": habit_name,
+                "created": today.strftime("%Y-%m-%d"),
+                "history": HabitHistory.from_days([], today),
+                "streak": 0,
+                "longest_streak": 0,
+                "last_day": None
+            }
+
+            habits.append(new_habit)
+            user_data["habits"] = habits
+
+            # Сохраняем
+            await self.storage.save_user_data(user_id, user_data)
+            self.completions.track(user_id, user_data)
+        self._schedule_reminder(user_id, user_data)
 
         await update.message.reply_text(
             f"✅ Привычка **{habit_name}** добавлена!\n"
@@ -93,14 +150,14 @@ class HabitTrackerBot:
             return
 
         # Форматируем текст
-        message = format_habit_list(habits)
+        today = user_today(user_data)
+        message = format_habit_list(habits, today)
 
         # Создаем инлайн-клавиатуру для быстрой отметки
         # Показываем только непривычки, не отмеченные сегодня
-        today_str = datetime.now().strftime("%Y-%m-%d")
         unchecked_habits = [
             h for h in habits
-            if today_str not in h.get("history", [])
+            if today not in habit_history(h)
         ]
 
         keyboard = []
@@ -150,52 +207,55 @@ class HabitTrackerBot:
             return
 
         user_id = update.effective_user.id
-        user_data = await self.storage.get_user_data(user_id)
-        habits = user_data.get("habits", [])
+        already_checked = False
 
-        # Ищем привычку
-        habit_found = None
-        for habit in habits:
-            if habit["id"] == habit_id:
-                habit_found = habit
-                break
+        async with self.storage.user_transaction(user_id) as user_data:
+            habits = user_data.get("habits", [])
+            today = user_today(user_data)
+
+            # Ищем привычку
+            habit_found = None
+            for habit in habits:
+                if habit["id"] == habit_id:
+                    habit_found = habit
+                    break
+
+            if habit_found:
+                # Отмечаем выполнение
+                history = habit_history(habit_found)
+
+                if not record_checkin(habit_found, today):
+                    already_checked = True
+                else:
+                    # Сохраняем изменения
+                    await self.storage.save_user_data(user_id, user_data)
+                    self.completions.checked(user_id, user_data, today)
 
         if not habit_found:
             await update.message.reply_text("❌ Привычка с таким ID не найдена!")
             return
 
-        # Отмечаем выполнение
-        today_str = datetime.now().strftime("%Y-%m-%d")
-        history = habit_found.get("history", [])
-
-        if today_str in history:
+        if already_checked:
             await update.message.reply_text(
                 f"ℹ️ Привычка **{habit_found['name']}** уже отмечена сегодня!",
                 parse_mode=ParseMode.MARKDOWN
             )
             return
 
-        history.append(today_str)
-        habit_found["history"] = history
-        habit_found["streak"] = calculate_streak(history)
-
-        # Сохраняем изменения
-        await self.storage.save_user_data(user_id, user_data)
-
         # Формируем ответ
         total_days = len(history)
         streak = habit_found["streak"]
-        week_history = [d for d in history
-                        if (datetime.now().date() - datetime.strptime(d, "%Y-%m-%d").date()).days < 7]
+        week_done = rolling_count(habit_found, 7, today)
 
         response = (
             f"🎉 **Отлично!** Привычка **{habit_found['name']}** выполнена!\n\n"
             f"📊 **Прогресс:**\n"
             f"• 🔥 Текущая серия: {streak} дн.\n"
+            f"• 🏅 Лучшая серия: {habit_found['longest_streak']} дн.\n"
             f"• 📅 Всего выполнено: {total_days} дн.\n"
-            f"• 📈 За неделю: {len(week_history)}/7 дн.\n"
-            f"• {format_progress_bar(len(week_history), 7, 5)}\n\n"
-            f"{get_week_calendar(history)}"
+            f"• 📈 За неделю: {week_done}/7 дн.\n"
+            f"• {format_progress_bar(week_done, 7, 5)}\n\n"
+            f"{get_week_calendar(history, today=today)}"
         )
 
         await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
@@ -206,6 +266,7 @@ class HabitTrackerBot:
             days = int(context.args[0]) if context.args else 7
         except ValueError:
             days = 7
+        days = min(days, STATS_MAX_DAYS)
 
         user_id = update.effective_user.id
         user_data = await self.storage.get_user_data(user_id)
@@ -216,18 +277,13 @@ class HabitTrackerBot:
             return
 
         # Рассчитываем статистику
-        today = datetime.now().date()
-        period_start = today - timedelta(days=days - 1)
+        today = user_today(user_data)
 
         total_completions = 0
         habit_stats = []
 
         for habit in habits:
-            history = habit.get("history", [])
-            period_completions = sum(
-                1 for date_str in history
-                if period_start <= datetime.strptime(date_str, "%Y-%m-%d").date() <= today
-            )
+            period_completions = rolling_count(habit, days, today)
 
             total_completions += period_completions
 
@@ -261,8 +317,85 @@ class HabitTrackerBot:
             if worst and worst != best:
                 response.append(f"📉 **Нужно улучшить**: {worst['name']} ({worst['completions']}/{days} дн.)")
 
+        # Для длинных периодов — разбивка по месяцам (годам) и дням недели
+        if days >= BREAKDOWN_MIN_DAYS:
+            response.extend(format_period_breakdown(habits, today - timedelta(days=days - 1), today))
+
         await update.message.reply_text("\n".join(response), parse_mode=ParseMode.MARKDOWN)
 
+    async def set_timezone(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Смена часового пояса: /timezone Europe/Berlin."""
+        user_id = update.effective_user.id
+
+        if not context.args:
+            user_data = await self.storage.get_user_data(user_id)
+            timezone = user_data.get("timezone")
+            await update.message.reply_text(
+                f"🌍 Ваш часовой пояс: {timezone}\n"
+                f"Местное время: {clock.now(timezone).strftime('%H:%M')}\n"
+                "Сменить: /timezone Europe/Berlin"
+            )
+            return
+
+        timezone = context.args[0]
+        if not clock.is_valid(timezone):
+            await update.message.reply_text(
+                "❌ Неизвестный часовой пояс.\n"
+                "Пример: /timezone Europe/Moscow или /timezone Asia/Yekaterinburg"
+            )
+            return
+
+        async with self.storage.user_transaction(user_id) as user_data:
+            user_data["timezone"] = timezone
+            # Другая граница суток: серии и скользящие счётчики считаем заново
+            for habit in user_data.get("habits", []):
+                habit.pop("rolling", None)
+                recompute_streak(habit)
+            await self.storage.save_user_data(user_id, user_data)
+            self.completions.track(user_id, user_data)
+        self._schedule_reminder(user_id, user_data)
+
+        await update.message.reply_text(
+            f"✅ Часовой пояс изменён: {timezone}\n"
+            f"Местное время: {clock.now(timezone).strftime('%H:%M')}"
+        )
+
+    async def set_reminder(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Время ежедневного напоминания: /remind 08:30 или /remind off."""
+        user_id = update.effective_user.id
+
+        if not context.args:
+            user_data = await self.storage.get_user_data(user_id)
+            remind_at = user_data.get("remind_at", config.REMINDER_TIME)
+            status = f"в {remind_at}" if remind_at else "выключено"
+            await update.message.reply_text(
+                f"⏰ Напоминание: {status}\n"
+                "Изменить: /remind 08:30, выключить: /remind off"
+            )
+            return
+
+        if context.args[0].lower() == "off":
+            remind_at = None
+        else:
+            remind_at = parse_remind_time(context.args[0])
+            if remind_at is None:
+                await update.message.reply_text(
+                    "❌ Укажите время в формате ЧЧ:ММ.\n"
+                    "Пример: /remind 08:30 или /remind off"
+                )
+                return
+
+        async with self.storage.user_transaction(user_id) as user_data:
+            user_data["remind_at"] = remind_at
+            await self.storage.save_user_data(user_id, user_data)
+
+        if remind_at:
+            self._schedule_reminder(user_id, user_data)
+            await update.message.reply_text(f"✅ Буду напоминать ежедневно в {remind_at} (местное время)")
+        else:
+            self.reminders.unschedule(user_id)
+            await update.message.reply_text("🔕 Ежедневные напоминания выключены")
+
     async def reset_habits(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Сбросить все привычки (требует подтверждения)."""
         keyboard = [
@@ -292,19 +425,19 @@ class HabitTrackerBot:
             # Обработка отметки привычки через кнопку
             if data == "check_all":
                 # Отметить все непривычки сегодня
-                user_data = await self.storage.get_user_data(user_id)
-                habits = user_data.get("habits", [])
-                today_str = datetime.now().strftime("%Y-%m-%d")
                 updated_count = 0
 
-                for habit in habits:
-                    if today_str not in habit.get("history", []):
-                        habit["history"].append(today_str)
-                        habit["streak"] = calculate_streak(habit["history"])
-                        updated_count += 1
+                async with self.storage.user_transaction(user_id) as user_data:
+                    today = user_today(user_data)
+                    for habit in user_data.get("habits", []):
+                        if record_checkin(habit, today):
+                            updated_count += 1
+
+                    if updated_count > 0:
+                        await self.storage.save_user_data(user_id, user_data)
+                        self.completions.track(user_id, user_data)
 
                 if updated_count > 0:
-                    await self.storage.save_user_data(user_id, user_data)
                     await query.edit_message_text(
                         f"✅ Отмечено {updated_count} привычек за сегодня!\n"
                         f"Используйте /stats для просмотра прогресса.",
@@ -318,32 +451,38 @@ class HabitTrackerBot:
             else:
                 # Отметить конкретную привычку
                 habit_id = int(data.split("_")[1])
-                user_data = await self.storage.get_user_data(user_id)
-                habits = user_data.get("habits", [])
-
-                for habit in habits:
-                    if habit["id"] == habit_id:
-                        today_str = datetime.now().strftime("%Y-%m-%d")
-                        if today_str not in habit.get("history", []):
-                            habit["history"].append(today_str)
-                            habit["streak"] = calculate_streak(habit["history"])
-                            await self.storage.save_user_data(user_id, user_data)
-
-                            await query.edit_message_text(
-                                f"✅ Привычка **{habit['name']}** отмечена!\n"
-                                f"Текущая серия: {habit['streak']} дн.",
-                                parse_mode=ParseMode.MARKDOWN
-                            )
-                        else:
-                            await query.edit_message_text(
-                                f"ℹ️ Привычка **{habit['name']}** уже отмечена сегодня!",
-                                parse_mode=ParseMode.MARKDOWN
-                            )
-                        break
+                habit_found = None
+                checked = False
+
+                async with self.storage.user_transaction(user_id) as user_data:
+                    today = user_today(user_data)
+                    for habit in user_data.get("habits", []):
+                        if habit["id"] == habit_id:
+                            habit_found = habit
+                            if record_checkin(habit, today):
+                                await self.storage.save_user_data(user_id, user_data)
+                                self.completions.checked(user_id, user_data, today)
+                                checked = True
+                            break
+
+                if habit_found and checked:
+                    await query.edit_message_text(
+                        f"✅ Привычка **{habit_found['name']}** отмечена!\n"
+                        f"Текущая серия: {habit_found['streak']} дн.",
+                        parse_mode=ParseMode.MARKDOWN
+                    )
+                elif habit_found:
+                    await query.edit_message_text(
+                        f"ℹ️ Привычка **{habit_found['name']}** уже отмечена сегодня!",
+                        parse_mode=ParseMode.MARKDOWN
+                    )
 
         elif data == "confirm_reset":
             # Подтверждение сброса
-            await self.storage.delete_user_data(user_id)
+            async with self.storage.user_transaction(user_id):
+                await self.storage.delete_user_data(user_id)
+            self.reminders.unschedule(user_id)
+            self.completions.discard(user_id)
             await query.edit_message_text(
                 "🗑️ Все привычки сброшены!\n"
                 "Начните с чистого листа с помощью /add_habit"
@@ -353,23 +492,33 @@ class HabitTrackerBot:
             # Отмена сброса
             await query.edit_message_text("✅ Сброс отменен.")
 
-    async def daily_reminder(self, context: ContextTypes.DEFAULT_TYPE):
-        """Ежедневное напоминание в 9:00."""
-        job = context.job
-        user_id = job.user_id
+    async def daily_reminder(self, user_id: int):
+        """Ежедневное напоминание (вызывается планировщиком ReminderScheduler)."""
+        # Пользователи без привычек и выполнившие всё обходятся без чтения хранилища
+        status = self.completions.status(user_id)
+        if status is not None and status[1] == 0:
+            if status[0] > 0:
+                await self.application.bot.send_message(
+                    chat_id=user_id,
+                    text="🎉 **Все привычки выполнены сегодня!** Отличная работа! 🏆",
+                    parse_mode=ParseMode.MARKDOWN,
+                    rate_limit_args=PRIORITY_BULK
+                )
+            return
 
         # Получаем данные пользователя
         user_data = await self.storage.get_user_data(user_id)
         habits = user_data.get("habits", [])
+        self.completions.track(user_id, user_data)
 
         if not habits:
             return  # У пользователя нет привычек
 
         # Проверяем, какие привычки не выполнены сегодня
-        today_str = datetime.now().strftime("%Y-%m-%d")
+        today = user_today(user_data)
         unchecked_habits = [
             habit for habit in habits
-            if today_str not in habit.get("history", [])
+            if today not in habit_history(habit)
         ]
 
         if not unchecked_habits:
@@ -386,26 +535,119 @@ class HabitTrackerBot:
             )
 
         # Отправляем напоминание
-        await context.bot.send_message(
+        await self.application.bot.send_message(
             chat_id=user_id,
             text=message,
-            parse_mode=ParseMode.MARKDOWN
+            parse_mode=ParseMode.MARKDOWN,
+            rate_limit_args=PRIORITY_BULK
         )
 
     async def setup_jobs(self, application: Application):
-        """Настройка ежедневных напоминаний для всех пользователей."""
-        # Эта функция вызывается при запуске бота
-        # В реальном проекте нужно получать список пользователей из БД
-        # Для примера - просто добавляем задачу, которая будет проверяться
-
-        # Альтернативный подход: добавляем задачи при первом взаимодействии
-        # Для этого можно использовать ConversationHandler или сохранять задачи в БД
-        pass
+        """
+        Запуск ежедневных напоминаний. Вместо задачи JobQueue на каждого
+        пользователя один планировщик ведёт расписание по часовым поясам
+        и рассылает напоминания пачками (см. reminders.py).
+        """
+        if config.STORAGE_ENGINE == "shared":
+            # Несколько процессов на одних данных: рассылает только один
+            self._reminder_task = asyncio.create_task(self._run_shared_reminders())
+            return
+        self.reminders.load()
+        print(f"⏰ Напоминания: {await self._schedule_stored_users()} пользователей")
+        self._reminder_task = asyncio.create_task(self.reminders.run())
+
+    async def _run_shared_reminders(self):
+        """
+        Напоминания в режиме STORAGE_ENGINE=shared. Планировщик запускает
+        только владелец блокировки REMINDERS_FILE.lock, остальные процессы
+        раз в REMINDER_RESYNC_SECONDS пробуют её забрать. Изменения из других
+        процессов владелец получает, сверяясь с хранилищем с тем же периодом.
+        """
+        lock = OwnerLock(f"{config.REMINDERS_FILE}.lock")
+        while not lock.try_acquire():
+            await asyncio.sleep(config.REMINDER_RESYNC_SECONDS)
+        run_task = None
+        try:
+            self.reminders.load()
+            print(f"⏰ Напоминания рассылает этот процесс: "
+                  f"{await self._schedule_stored_users()} пользователей")
+            run_task = asyncio.create_task(self.reminders.run())
+            while True:
+                await asyncio.sleep(config.REMINDER_RESYNC_SECONDS)
+                try:
+                    await self._schedule_stored_users()
+                except Exception as e:
+                    print(f"Ошибка сверки расписания напоминаний: {e}")
+        finally:
+            if run_task:
+                run_task.cancel()
+                await asyncio.gather(run_task, return_exceptions=True)
+                # Сохраняем, пока блокировка ещё наша
+                await self.reminders.save()
+            lock.release()
+
+    def stats_line(self) -> str:
+        """Сводка очередей обработки и отправки для журнала."""
+        updates = self.updates.stats()
+        outbound = self.outbound.stats()
+        pending = outbound["pending"]
+        return (
+            f"📊 Обновления: в работе {updates['in_flight']} из {updates['max_pending']}, "
+            f"пользователей в очереди {updates['users_queued']}. "
+            f"Отправка: в очереди {pending['interactive']} ответов и "
+            f"{pending['bulk']} рассылок, отправлено {outbound['sent']}, "
+            f"ошибок {outbound['failed']}, повторов {outbound['retries']} "
+            f"(RetryAfter: {outbound['retry_after']}), задержка p50/p95/max "
+            f"{outbound['latency_p50']:.2f}/{outbound['latency_p95']:.2f}/"
+            f"{outbound['latency_max']:.2f} с"
+        )
 
-    def run(self):
-        """Запуск бота."""
+    async def _log_stats(self):
+        """Периодическая строка статистики (раз в STATS_LOG_INTERVAL секунд)."""
+        while True:
+            await asyncio.sleep(config.STATS_LOG_INTERVAL)
+            print(self.stats_line())
+
+    async def post_init(self, application: Application):
+        """Запуск напоминаний и журнала статистики."""
+        await self.setup_jobs(application)
+        if config.STATS_LOG_INTERVAL > 0:
+            self._stats_task = asyncio.create_task(self._log_stats())
+
+    async def shutdown(self, application: Application):
+        """Корректное завершение: сбрасываем несохранённые данные хранилища."""
+        if self._stats_task:
+            self._stats_task.cancel()
+            await asyncio.gather(self._stats_task, return_exceptions=True)
+        if self._reminder_task:
+            self._reminder_task.cancel()
+            # Дожидаемся отмены, иначе run_polling закроет цикл с незавершённой задачей
+            await asyncio.gather(self._reminder_task, return_exceptions=True)
+        await self.reminders.save()
+        await self.storage.close()
+
+    def build_application(self, receive_updates: bool = True,
+                          request: Optional[BaseRequest] = None) -> Application:
+        """
+        Создание Application с обработчиками. receive_updates=False — без
+        getUpdates/webhook: обновления передаёт диспетчер (см. workers.py).
+        request — свой HTTP-клиент Bot API (бенчмарки подставляют поддельный).
+        """
         # Создаем Application[citation:9]
-        self.application = Application.builder().token(config.BOT_TOKEN).build()
+        builder = (
+            Application.builder()
+            .token(config.BOT_TOKEN)
+            .base_url(config.TELEGRAM_API_URL)
+            .rate_limiter(self.outbound)
+            .concurrent_updates(self.updates)
+            .post_init(self.post_init)
+            .post_shutdown(self.shutdown)
+        )
+        if not receive_updates:
+            builder = builder.updater(None)
+        if request is not None:
+            builder = builder.request(request)
+        self.application = builder.build()
 
         # Добавляем обработчики команд
         self.application.add_handler(CommandHandler("start", self.start))
@@ -413,14 +655,34 @@ class HabitTrackerBot:
         self.application.add_handler(CommandHandler("list_habits", self.list_habits))
         self.application.add_handler(CommandHandler("check", self.check_habit))
         self.application.add_handler(CommandHandler("stats", self.show_stats))
+        self.application.add_handler(CommandHandler("timezone", self.set_timezone))
+        self.application.add_handler(CommandHandler("remind", self.set_reminder))
         self.application.add_handler(CommandHandler("reset", self.reset_habits))
 
         # Добавляем обработчик инлайн-кнопок
         self.application.add_handler(CallbackQueryHandler(self.button_callback))
+        return self.application
 
-        # Запускаем бота
+    def run(self):
+        """Запуск бота."""
+        serve(self.build_application())
+
+
+def serve(application: Application):
+    """Получение обновлений через webhook (если задан WEBHOOK_URL) или polling."""
+    if config.WEBHOOK_URL:
+        print(f"🤖 Бот запущен (webhook на {config.WEBHOOK_LISTEN}:{config.WEBHOOK_PORT})...")
+        application.run_webhook(
+            listen=config.WEBHOOK_LISTEN,
+            port=config.WEBHOOK_PORT,
+            url_path=config.WEBHOOK_PATH,
+            webhook_url=f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}",
+            secret_token=config.WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
         print("🤖 Бот запущен...")
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 async def main():
@@ -432,6 +694,11 @@ async def main():
 
 
 if __name__ == "__main__":
-    # Для простоты используем синхронный запуск
-    bot = HabitTrackerBot()
-    bot.run()
\ No newline at end of file
+    if config.WORKERS > 1:
+        # Несколько процессов: диспетчер + WORKERS обработчиков (см. workers.py)
+        from workers import run_cluster
+        run_cluster(config.WORKERS)
+    else:
+        # Для простоты используем синхронный запуск
+        bot = HabitTrackerBot()
+        bot.run()
\ No newline at end of file
@@ -0,0 +1,256 @@
+import base64
+import calendar
+from array import array
+from datetime import date
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+
+DATE_FORMAT = "%Y-%m-%d"
+
+Day = Union[str, date, int]
+
+
+def day_ordinal(day: Day) -> int:
+    """Номер дня (date.toordinal) из строки "YYYY-MM-DD", даты или самого номера."""
+    if isinstance(day, int):
+        return day
+    if isinstance(day, str):
+        return date.fromisoformat(day).toordinal()
+    return day.toordinal()
+
+
+def day_string(ordinal: int) -> str:
+    return date.fromordinal(ordinal).strftime(DATE_FORMAT)
+
+
+class HabitHistory:
+    """
+    История отметок привычки в виде битовой карты по дням.
+
+    Бит i означает отметку в день start + i (start — номер дня, обычно дата
+    создания привычки). Проверка и добавление дня — O(1), а в JSON история
+    занимает base64 битовой карты вместо списка строк-дат:
+
+        {"start": "2025-12-01", "bits": "BwE="}
+
+    Старый формат (список "YYYY-MM-DD") читается прозрачно, см. from_json.
+
+    Для отчётов за длинные периоды index() строит HistoryIndex; после этого
+    count_between работает за O(1), а add поддерживает индекс сам.
+    """
+    __slots__ = ("_start", "_bits", "_count", "_index", "__weakref__")
+
+    def __init__(self, start: int, bits: Optional[bytearray] = None):
+        self._start = start
+        self._bits = bits if bits is not None else bytearray()
+        self._count = sum(bin(byte).count("1") for byte in self._bits)
+        self._index: Optional[HistoryIndex] = None
+
+    @classmethod
+    def from_days(cls, days: Iterable[Day], start: Optional[Day] = None) -> "HabitHistory":
+        ordinals = {day_ordinal(day) for day in days}
+        anchor = day_ordinal(start) if start is not None else date.today().toordinal()
+        if ordinals:
+            anchor = min(anchor, min(ordinals))
+        bits = bytearray(((max(ordinals) - anchor) >> 3) + 1 if ordinals else 0)
+        for ordinal in ordinals:
+            index = ordinal - anchor
+            bits[index >> 3] |= 1 << (index & 7)
+        return cls(anchor, bits)
+
+    @classmethod
+    def from_json(cls, value: Any, start: Optional[Day] = None) -> "HabitHistory":
+        """
+        История из сохранённого значения: битовая карта {"start", "bits"},
+        старый список дат или уже готовый HabitHistory.
+        """
+        if isinstance(value, HabitHistory):
+            return value
+        if isinstance(value, dict):
+            return cls(day_ordinal(value["start"]), bytearray(base64.b64decode(value["bits"])))
+        return cls.from_days(value or [], start)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "start": day_string(self._start),
+            "bits": base64.b64encode(bytes(self._bits)).decode("ascii")
+        }
+
+    def __contains__(self, day: Day) -> bool:
+        index = day_ordinal(day) - self._start
+        if index < 0 or index >> 3 >= len(self._bits):
+            return False
+        return bool(self._bits[index >> 3] & (1 << (index & 7)))
+
+    def add(self, day: Day) -> bool:
+        """Отметка дня. Возвращает False, если день уже был отмечен."""
+        ordinal = day_ordinal(day)
+        if ordinal < self._start:
+            # Отметка раньше начала карты: сдвигаем начало (редкий случай)
+            shifted = HabitHistory.from_days(self.ordinals(), ordinal)
+            self._start, self._bits = shifted._start, shifted._bits
+            self._index = None
+        index = ordinal - self._start
+        if index >> 3 >= len(self._bits):
+            self._bits.extend(bytes((index >> 3) + 1 - len(self._bits)))
+        mask = 1 << (index & 7)
+        if self._bits[index >> 3] & mask:
+            return False
+        self._bits[index >> 3] |= mask
+        self._count += 1
+        if self._index is not None:
+            self._index.add(index)
+        return True
+
+    @property
+    def start(self) -> int:
+        """Номер дня, с которого начинается битовая карта."""
+        return self._start
+
+    def bitmap(self) -> bytes:
+        """Битовая карта: бит i (младший бит первым) — отметка в день start + i."""
+        return bytes(self._bits)
+
+    def index(self) -> "HistoryIndex":
+        """Индекс префиксных сумм (строится при первом обращении)."""
+        if self._index is None:
+            self._index = HistoryIndex(self)
+        return self._index
+
+    def mask_between(self, first: Day, last: Day) -> int:
+        """Отметки в отрезке [first, last] числом: бит k — день first + k."""
+        first, last = day_ordinal(first), day_ordinal(last)
+        lo = max(first - self._start, 0)
+        hi = min(last - self._start, len(self._bits) * 8 - 1)
+        if lo > hi:
+            return 0
+        value = int.from_bytes(self._bits[lo >> 3:(hi >> 3) + 1], "little") >> (lo & 7)
+        return (value & ((1 << (hi - lo + 1)) - 1)) << (self._start + lo - first)
+
+    def count_between(self, first: Day, last: Day) -> int:
+        """Число отмеченных дней в отрезке [first, last]."""
+        if self._index is not None:
+            return self._index.count_between(first, last)
+        return self.mask_between(first, last).bit_count()
+
+    def last_days(self, days: int, today: Optional[Day] = None) -> int:
+        """Число отметок за последние days дней, включая сегодня."""
+        end = day_ordinal(today) if today is not None else date.today().toordinal()
+        return self.count_between(end - days + 1, end)
+
+    def ordinals(self) -> Iterator[int]:
+        """Номера отмеченных дней по возрастанию."""
+        for byte_index, byte in enumerate(self._bits):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte & (1 << bit):
+                    yield self._start + (byte_index << 3) + bit
+
+    def __iter__(self) -> Iterator[str]:
+        """Отмеченные дни строками "YYYY-MM-DD" по возрастанию."""
+        return (day_string(ordinal) for ordinal in self.ordinals())
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __repr__(self) -> str:
+        return f"HabitHistory(start={day_string(self._start)!r}, days={self._count})"
+
+
+class HistoryIndex:
+    """
+    Индекс истории для отчётов за год и больше.
+
+    prefix[i] — число отметок среди первых i дней карты, поэтому отметки
+    за любой отрезок считаются за O(1). weekly[i] — отметки в дни i, i-7,
+    i-14, ... (тот же день недели), из них за O(1) получается разбивка
+    по дням недели. Итоги по месяцам кешируются.
+
+    Построение — один проход по истории; новая отметка в конце истории
+    обновляет индекс за O(1), отметка задним числом — за O(длины хвоста).
+    """
+    __slots__ = ("_start", "_prefix", "_weekly", "_months")
+
+    def __init__(self, history: HabitHistory):
+        self._start = history._start
+        self._prefix = array("I", [0])
+        self._weekly = array("I")
+        self._months: Dict[Tuple[int, int], int] = {}
+        bits = history._bits
+        for i in range(len(bits) * 8):
+            bit = (bits[i >> 3] >> (i & 7)) & 1
+            self._prefix.append(self._prefix[-1] + bit)
+            self._weekly.append(bit + (self._weekly[i - 7] if i >= 7 else 0))
+
+    def _grow(self, size: int):
+        """Продление индекса до size дней (новые дни без отметок)."""
+        while len(self._weekly) < size:
+            i = len(self._weekly)
+            self._prefix.append(self._prefix[-1])
+            self._weekly.append(self._weekly[i - 7] if i >= 7 else 0)
+
+    def add(self, index: int):
+        """Учёт новой отметки в день с номером index от начала карты."""
+        self._grow(index + 1)
+        for i in range(index + 1, len(self._prefix)):
+            self._prefix[i] += 1
+        for i in range(index, len(self._weekly), 7):
+            self._weekly[i] += 1
+        day = date.fromordinal(self._start + index)
+        if (day.year, day.month) in self._months:
+            self._months[(day.year, day.month)] += 1
+
+    def _clip(self, first: Day, last: Day) -> Tuple[int, int]:
+        lo = max(day_ordinal(first) - self._start, 0)
+        hi = min(day_ordinal(last) - self._start, len(self._weekly) - 1)
+        return lo, hi
+
+    def count_between(self, first: Day, last: Day) -> int:
+        """Число отметок в отрезке [first, last] за O(1)."""
+        lo, hi = self._clip(first, last)
+        if lo > hi:
+            return 0
+        return self._prefix[hi + 1] - self._prefix[lo]
+
+    def weekday_count(self, weekday: int, first: Day, last: Day) -> int:
+        """Число отметок в отрезке [first, last], пришедшихся на weekday (0 — понедельник)."""
+        lo, hi = self._clip(first, last)
+        # Номер дня карты i приходится на день недели (start + i - 1) % 7
+        residue = (weekday - self._start + 1) % 7
+        first_index = lo + (residue - lo) % 7
+        last_index = hi - (hi - residue) % 7
+        if first_index > last_index:
+            return 0
+        before = self._weekly[first_index - 7] if first_index >= 7 else 0
+        return self._weekly[last_index] - before
+
+    def month_count(self, year: int, month: int) -> int:
+        """Отметки за календарный месяц (с кешем)."""
+        key = (year, month)
+        if key not in self._months:
+            last_day = calendar.monthrange(year, month)[1]
+            self._months[key] = self.count_between(date(year, month, 1), date(year, month, last_day))
+        return self._months[key]
+
+    def year_count(self, year: int) -> int:
+        """Отметки за календарный год (сумма кешированных месяцев)."""
+        return sum(self.month_count(year, month) for month in range(1, 13))
+
+
+def habit_history(habit: Dict[str, Any]) -> HabitHistory:
+    """
+    История привычки как HabitHistory. Сохранённое значение (битовая карта
+    или старый список дат) преобразуется один раз и заменяется в habit.
+    """
+    history = habit.get("history")
+    if not isinstance(history, HabitHistory):
+        history = HabitHistory.from_json(history, habit.get("created"))
+        habit["history"] = history
+    return history
+
+
+def encode_default(obj: Any) -> Any:
+    """Хук json.dumps(default=...) для HabitHistory."""
+    if isinstance(obj, HabitHistory):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
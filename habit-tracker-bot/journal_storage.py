@@ -0,0 +1,269 @@
+import json
+import os
+import asyncio
+from typing import Dict, Any, Optional, AsyncIterator, Tuple
+
+import aiofiles
+
+import config
+from history import encode_default
+from storage import AsyncJSONStorage
+
+
+def _fsync_path(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class JournaledJSONStorage(AsyncJSONStorage):
+    """
+    Хранилище с журналом упреждающей записи (WAL).
+
+    Каждое изменение дописывается одной строкой в habits.json.wal,
+    поэтому стоимость записи не зависит от объёма всех данных.
+    Фоновая задача периодически сворачивает журнал в снимок habits.json.
+    При запуске загружается снимок и поверх него проигрывается журнал.
+    """
+    _instance = None
+
+    def _init_cache(self):
+        super()._init_cache()
+        self._wal_path = f"{self._file_path}.wal"
+        # Журнал, отложенный на время сворачивания в снимок
+        self._old_wal_path = f"{self._file_path}.wal.old"
+        self._data: Optional[Dict[str, Any]] = None
+        self._wal = None
+        self._wal_bytes = 0
+        self._compact_event = asyncio.Event()
+        # Отдельная блокировка загрузки: _ensure_loaded вызывается из-под _lock
+        self._load_lock = asyncio.Lock()
+        self._compact_task: Optional[asyncio.Task] = None
+        # Сворачивания идут по одному: снимок пишется в общий временный файл
+        self._compact_lock = asyncio.Lock()
+
+    async def _read_snapshot(self) -> Dict[str, Any]:
+        """
+        Чтение снимка. В отличие от _read_file, повреждённый снимок
+        не подменяется пустыми данными: бот не запустится поверх него.
+        """
+        try:
+            async with aiofiles.open(self._file_path, 'r', encoding='utf-8') as f:
+                content = await f.read()
+        except FileNotFoundError:
+            return {}
+        if not content.strip():
+            return {}
+        self._payload_bytes = len(content)
+        try:
+            # Большой снимок разбирается вне цикла событий
+            return await self._json.loads(content)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Снимок {self._file_path} повреждён: {e}") from e
+
+    async def _replay_wal(self, path: str) -> int:
+        """
+        Проигрывание журнала поверх загруженного снимка.
+        Оборванная последняя строка (сбой во время записи) отбрасывается
+        и обрезается; испорченная строка в середине журнала — ошибка.
+        Если сбой оборвал только перевод строки, он дописывается: иначе
+        следующая запись склеится с последней и при новом запуске обе пропадут.
+        """
+        try:
+            async with aiofiles.open(path, 'rb') as f:
+                content = await f.read()
+        except FileNotFoundError:
+            return 0
+
+        applied = 0
+        offset = 0
+        lines = content.split(b"\n")
+        last_number = max((n for n, line in enumerate(lines, 1) if line.strip()), default=0)
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                offset += len(line) + 1
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Последняя строка журнала — недописанная запись
+                if number == last_number:
+                    print(f"Журнал {path}: отброшена недописанная запись")
+                    async with aiofiles.open(path, 'r+b') as f:
+                        await f.truncate(offset)
+                    break
+                raise ValueError(f"Журнал {path} повреждён в строке {number}")
+
+            self._apply(record)
+            applied += 1
+            offset += len(line) + 1
+        else:
+            if content and not content.endswith(b"\n"):
+                async with aiofiles.open(path, 'ab') as f:
+                    await f.write(b"\n")
+        return applied
+
+    def _apply(self, record: Dict[str, Any]):
+        """Применение одной записи журнала к данным в памяти."""
+        if record["op"] == "put":
+            self._data[record["user"]] = record["data"]
+        elif record["op"] == "del":
+            self._data.pop(record["user"], None)
+
+    async def _ensure_loaded(self):
+        """Ленивая загрузка: снимок + журнал, затем запуск фонового сворачивания."""
+        if self._data is not None:
+            return
+
+        async with self._load_lock:
+            if self._data is not None:
+                return
+
+            self._data = await self._read_snapshot()
+            replayed = await self._replay_wal(self._old_wal_path)
+            replayed += await self._replay_wal(self._wal_path)
+            if replayed:
+                print(f"Из журнала восстановлено изменений: {replayed}")
+
+            if os.path.exists(self._old_wal_path):
+                # Предыдущее сворачивание прервалось — дописываем снимок сейчас
+                size_hint = self._payload_bytes + os.path.getsize(self._old_wal_path)
+                await self._write_snapshot(self._data, size_hint)
+                os.remove(self._old_wal_path)
+
+            self._wal = await aiofiles.open(self._wal_path, 'a', encoding='utf-8')
+            self._wal_bytes = os.path.getsize(self._wal_path)
+            self._compact_task = asyncio.create_task(self._compaction_loop())
+
+    async def _write_snapshot(self, data: Dict[str, Any], size_hint: int):
+        """
+        Атомарная запись снимка: временный файл, fsync, rename.
+        Сериализация идёт через JSONOffloader (поток или процесс по объёму);
+        size_hint — оценка объёма: прошлый снимок плюс журнал.
+        """
+        tmp_path = f"{self._file_path}.tmp"
+        self._payload_bytes = await self._json.write_file(tmp_path, data, size_hint)
+        await asyncio.to_thread(_fsync_path, tmp_path)
+        os.replace(tmp_path, self._file_path)
+
+    async def _append(self, *records: Dict[str, Any]):
+        """Дописывание записей в журнал одной операцией (и одним fsync)."""
+        lines = "".join(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":"),
+                       default=encode_default) + "\n"
+            for record in records
+        )
+        await self._wal.write(lines)
+        await self._wal.flush()
+        if config.JOURNAL_FSYNC:
+            await asyncio.to_thread(os.fsync, self._wal.fileno())
+
+        self._wal_bytes += len(lines.encode("utf-8"))
+        if self._wal_bytes >= config.JOURNAL_COMPACT_BYTES:
+            self._compact_event.set()
+
+    async def _load_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        await self._ensure_loaded()
+        return self._data.get(str(user_id))
+
+    async def _store_user(self, user_id: int, user_data: Dict[str, Any]):
+        await self._ensure_loaded()
+        await self._append({"op": "put", "user": str(user_id), "data": user_data})
+        self._data[str(user_id)] = user_data
+
+    async def _remove_user(self, user_id: int) -> bool:
+        await self._ensure_loaded()
+        if str(user_id) not in self._data:
+            return False
+        await self._append({"op": "del", "user": str(user_id)})
+        del self._data[str(user_id)]
+        return True
+
+    async def _store_batch(self, batch: Dict[int, Optional[Dict[str, Any]]]):
+        """Групповая запись: вся пачка уходит в журнал одной записью."""
+        await self._ensure_loaded()
+        records = [
+            {"op": "del", "user": str(user_id)} if user_data is None
+            else {"op": "put", "user": str(user_id), "data": user_data}
+            for user_id, user_data in batch.items()
+        ]
+        async with self._lock:
+            await self._append(*records)
+            for record in records:
+                self._apply(record)
+
+    async def iter_users(self) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        await self.flush()
+        await self._ensure_loaded()
+        for user_key, user_data in list(self._data.items()):
+            yield int(user_key), user_data
+
+    async def compact(self):
+        """
+        Сворачивание журнала в снимок.
+        Под блокировкой только фиксируем состояние (поверхностная копия словаря)
+        и переключаем журнал; сериализация и запись снимка идут без блокировки
+        и вне цикла событий, не задерживая новые изменения.
+        """
+        await self._ensure_loaded()
+        async with self._compact_lock:
+            async with self._lock:
+                if self._wal_bytes == 0:
+                    return
+                snapshot = dict(self._data)
+                size_hint = self._payload_bytes + self._wal_bytes
+                if os.path.exists(self._old_wal_path):
+                    # Прошлый снимок не записался: его журнал нельзя затирать
+                    await self._write_snapshot(snapshot, size_hint)
+                    os.remove(self._old_wal_path)
+                await self._wal.close()
+                os.replace(self._wal_path, self._old_wal_path)
+                self._wal = await aiofiles.open(self._wal_path, 'a', encoding='utf-8')
+                self._wal_bytes = 0
+                self._compact_event.clear()
+
+            await self._write_snapshot(snapshot, size_hint)
+            os.remove(self._old_wal_path)
+
+    async def _compaction_loop(self):
+        """Фоновое сворачивание: по размеру журнала или раз в интервал."""
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._compact_event.wait(), timeout=config.JOURNAL_COMPACT_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+            try:
+                # Отмена цикла (close) не прерывает начатый снимок: close его дождётся
+                await asyncio.shield(self.compact())
+            except (OSError, RuntimeError) as e:
+                # RuntimeError — запись пользователя изменилась во время сериализации;
+                # журнал .wal.old сохранён, следующее сворачивание повторит снимок
+                print(f"Ошибка сворачивания журнала: {e}")
+                self._compact_event.clear()
+
+    async def close(self):
+        """Остановка фоновой задачи, финальное сворачивание журнала, закрытие пулов JSON."""
+        await self.flush()
+        try:
+            if self._data is not None:
+                await self._close_journal()
+        finally:
+            # Процессы JSONOffloader останавливает базовый close
+            await super().close()
+
+    async def _close_journal(self):
+        if self._compact_task:
+            self._compact_task.cancel()
+            try:
+                await self._compact_task
+            except asyncio.CancelledError:
+                pass
+            self._compact_task = None
+        await self.compact()
+        await self._wal.close()
+        self._wal = None
+        self._data = None
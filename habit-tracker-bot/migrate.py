@@ -0,0 +1,42 @@
+"""
+Перенос данных между форматами хранилища.
+
+Запуск:
+    python migrate.py sharded                    # habits.json -> каталог шардов SHARDS_DIR
+    python migrate.py sqlite --db habits.db      # habits.json -> база SQLite
+    python migrate.py workers --workers 4        # habits.json (или шарды) -> habits.w0.json ... habits.w3.json
+"""
+import argparse
+
+import config
+from sharded_storage import migrate_json_to_shards
+from sqlite_storage import migrate_json_to_sqlite
+from workers import split_json_for_workers, worker_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграция данных бота привычек")
+    parser.add_argument("target", choices=["sharded", "sqlite", "workers"], help="целевой формат хранилища")
+    parser.add_argument("--source", default=config.DATA_FILE, help="исходный JSON-файл")
+    parser.add_argument("--db", default="habits.db", help="файл базы для формата sqlite")
+    parser.add_argument("--workers", type=int, default=config.WORKERS,
+                        help="число процессов-обработчиков для формата workers")
+    args = parser.parse_args()
+
+    if args.target == "sharded":
+        count = migrate_json_to_shards(args.source, config.SHARDS_DIR, config.SHARD_COUNT)
+        print(f"✅ Перенесено пользователей: {count} -> {config.SHARDS_DIR} "
+              f"({config.SHARD_COUNT} шардов)")
+    elif args.target == "sqlite":
+        count = migrate_json_to_sqlite(args.source, args.db)
+        print(f"✅ Перенесено пользователей: {count} -> {args.db}")
+        print(f"Укажите DATA_FILE={args.db} в .env, чтобы бот работал с базой")
+    elif args.target == "workers":
+        counts = split_json_for_workers(args.source, args.workers)
+        for index, count in enumerate(counts):
+            print(f"✅ {worker_path(args.source, index)}: {count} пользователей")
+        print(f"Укажите WORKERS={args.workers} в .env для многопроцессного режима")
+
+
+if __name__ == "__main__":
+    main()
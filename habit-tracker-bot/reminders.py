@@ -0,0 +1,247 @@
+import os
+import time
+import fcntl
+import heapq
+import bisect
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Dict, Callable, Awaitable, Iterable, List, Optional, Tuple
+
+from serialization import read_json_file, write_json_atomic
+from timezones import DEFAULT_TIMEZONE, DayClock, clock as default_clock
+
+# Слот — все пользователи с одинаковым часовым поясом и временем напоминания
+Slot = Tuple[str, str]
+
+SendCallback = Callable[[int], Awaitable[None]]
+
+
+def parse_remind_time(value: str) -> Optional[str]:
+    """Время "H:MM"/"HH:MM" в виде "HH:MM" или None, если формат неверный."""
+    try:
+        parsed = datetime.strptime(value.strip(), "%H:%M")
+    except ValueError:
+        return None
+    return parsed.strftime("%H:%M")
+
+
+class OwnerLock:
+    """
+    Межпроцессная блокировка владельца расписания (fcntl-блокировка файла).
+    Её держит процесс, а не корутина; ОС снимает её, когда процесс
+    завершается, поэтому после падения владельца блокировку забирает другой.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._fd: Optional[int] = None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class ReminderScheduler:
+    """
+    Ежедневные напоминания без отдельной задачи JobQueue на пользователя.
+
+    Пользователи сгруппированы в слоты (часовой пояс, время "HH:MM").
+    Одна куча хранит ближайшее срабатывание каждого слота в UTC; цикл run()
+    спит до вершины кучи и рассылает слот пачками по batch_size.
+
+    Состояние хранится в двух файлах:
+      state_path          — кто, в каком поясе и во сколько получает напоминание;
+      state_path.progress — для каждого слота последний местный день рассылки
+                            и user_id последнего обработанного получателя.
+    Источник истины — хранилище: при запуске бот заново регистрирует всех
+    пользователей из него и убирает лишних (retain), файл только ускоряет старт.
+    После перезапуска пропущенная сегодня рассылка догоняется, начатая —
+    продолжается со следующего по порядку user_id (даже если состав слота
+    изменился), а завершённая не повторяется.
+    """
+
+    def __init__(self, send: SendCallback, state_path: str, default_time: str,
+                 batch_size: int, batch_interval: float,
+                 day_clock: Optional[DayClock] = None):
+        self._send = send
+        self._state_path = state_path
+        self._progress_path = f"{state_path}.progress"
+        self._default_time = default_time
+        self._batch_size = batch_size
+        self._batch_interval = batch_interval
+        self._clock = day_clock or default_clock
+
+        self._users: Dict[int, Slot] = {}
+        self._slots: Dict[Slot, set] = {}
+        # Слот -> [местная дата рассылки, user_id последнего обработанного, завершена ли]
+        self._progress: Dict[str, list] = {}
+        self._heap: List[Tuple[float, Slot]] = []
+        self._next_fire: Dict[Slot, float] = {}
+        self._wakeup = asyncio.Event()
+        self._dirty = False
+        self._loaded = False
+
+    @staticmethod
+    def _slot_key(slot: Slot) -> str:
+        return f"{slot[0]} {slot[1]}"
+
+    def load(self):
+        """Чтение сохранённого расписания (вызывается один раз при запуске)."""
+        state = read_json_file(self._state_path)
+        for user_key, (timezone, remind_at) in state.get("users", {}).items():
+            self._add(int(user_key), (timezone, remind_at))
+        self._progress = read_json_file(self._progress_path)
+        for slot in self._slots:
+            self._push(slot, catch_up=True)
+        self._loaded = True
+
+    def _local_fire_time(self, slot: Slot, day: date) -> float:
+        tz = self._clock.zone(slot[0])
+        hour, minute = map(int, slot[1].split(":"))
+        local = tz.localize(datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute))
+        return local.timestamp()
+
+    def _push(self, slot: Slot, catch_up: bool = False):
+        """
+        Планирование ближайшего срабатывания слота. С catch_up слот, время
+        которого сегодня прошло, а рассылка не завершена, срабатывает сразу
+        (пропущенная из-за перезапуска рассылка догоняется).
+        """
+        today = self._clock.today(slot[0])
+        day, _, done = self._progress.get(self._slot_key(slot), [None, None, False])
+        fire_at = self._local_fire_time(slot, today)
+        if (day == today.isoformat() and done) or (not catch_up and fire_at <= time.time()):
+            fire_at = self._local_fire_time(slot, today + timedelta(days=1))
+        self._next_fire[slot] = fire_at
+        heapq.heappush(self._heap, (fire_at, slot))
+        self._wakeup.set()
+
+    def _add(self, user_id: int, slot: Slot):
+        self._users[user_id] = slot
+        if slot not in self._slots:
+            self._slots[slot] = set()
+            if self._loaded:
+                self._push(slot)
+        self._slots[slot].add(user_id)
+
+    def _remove(self, user_id: int):
+        slot = self._users.pop(user_id, None)
+        if slot is None:
+            return
+        members = self._slots[slot]
+        members.discard(user_id)
+        if not members:
+            del self._slots[slot]
+            self._next_fire.pop(slot, None)
+
+    def schedule(self, user_id: int, timezone: str, remind_at: Optional[str] = None):
+        """Напоминание пользователю в remind_at ("HH:MM") по его часовому поясу."""
+        slot = (timezone or DEFAULT_TIMEZONE, remind_at or self._default_time)
+        if self._users.get(user_id) == slot:
+            return
+        self._remove(user_id)
+        self._add(user_id, slot)
+        self._dirty = True
+
+    def unschedule(self, user_id: int):
+        if user_id in self._users:
+            self._remove(user_id)
+            self._dirty = True
+
+    def retain(self, user_ids: Iterable[int]):
+        """Снятие с расписания всех, кого нет в user_ids (после сверки с хранилищем)."""
+        keep = set(user_ids)
+        for user_id in [user_id for user_id in self._users if user_id not in keep]:
+            self.unschedule(user_id)
+
+    def is_scheduled(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    async def save(self):
+        """
+        Запись списка пользователей, если он менялся. Расписание, которое
+        не загружалось (процесс не владелец, см. OwnerLock), не пишется,
+        чтобы не затереть файл владельца.
+        """
+        if not self._dirty or not self._loaded:
+            return
+        self._dirty = False
+        users = {str(user_id): list(slot) for user_id, slot in self._users.items()}
+        await asyncio.to_thread(write_json_atomic, self._state_path, {"users": users}, True)
+
+    async def _save_progress(self):
+        await asyncio.to_thread(write_json_atomic, self._progress_path, dict(self._progress), True)
+
+    async def _fire(self, slot: Slot):
+        """Рассылка слоту пачками с сохранением прогресса после каждой пачки."""
+        key = self._slot_key(slot)
+        today = self._clock.today(slot[0]).isoformat()
+        progress = self._progress.get(key)
+        if not progress or progress[0] != today:
+            progress = [today, None, False]
+            self._progress[key] = progress
+        elif progress[2]:
+            return
+
+        # Рассылка идёт по возрастанию user_id: после перезапуска продолжаем
+        # со следующего за последним обработанным, кто бы ни вошёл в слот
+        recipients = sorted(self._slots.get(slot, ()))
+        position = 0 if progress[1] is None else bisect.bisect_right(recipients, progress[1])
+        while position < len(recipients):
+            batch = recipients[position:position + self._batch_size]
+            results = await asyncio.gather(*(self._send(user_id) for user_id in batch),
+                                           return_exceptions=True)
+            for user_id, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    print(f"Напоминание пользователю {user_id} не отправлено: {result}")
+            position += len(batch)
+            progress[1] = batch[-1]
+            await self._save_progress()
+            if position < len(recipients):
+                await asyncio.sleep(self._batch_interval)
+        progress[2] = True
+        await self._save_progress()
+
+    async def run(self):
+        """Основной цикл: ждёт ближайший слот, рассылает и планирует на завтра."""
+        if not self._loaded:
+            self.load()
+        while True:
+            await self.save()
+            self._wakeup.clear()
+            # Пропускаем устаревшие записи кучи (слот удалён или перепланирован)
+            while self._heap and self._next_fire.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            fire_at, slot = self._heap[0]
+            delay = fire_at - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, 60))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            del self._next_fire[slot]
+            await self._fire(slot)
+            if slot in self._slots:
+                self._push(slot)
@@ -0,0 +1,102 @@
+import os
+import json
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+from history import encode_default
+
+
+def dumps_json(data: Any, compact: bool = False) -> str:
+    """JSON с отступами для чтения человеком или компактный (без пробелов)."""
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=encode_default)
+    return json.dumps(data, indent=2, ensure_ascii=False, default=encode_default)
+
+
+def _write_text(path: str, payload: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(payload)
+
+
+def write_json_file(path: str, data: Any, compact: bool = False) -> int:
+    """
+    Сериализация и запись в файл одним вызовом (выполняется в потоке
+    или дочернем процессе). Возвращает размер записанного текста.
+    """
+    payload = dumps_json(data, compact)
+    _write_text(path, payload)
+    return len(payload)
+
+
+def write_json_atomic(path: str, data: Any, compact: bool = False):
+    """Запись через временный файл и os.replace: сбой не оставит полуфайл."""
+    tmp_path = f"{path}.tmp"
+    write_json_file(tmp_path, data, compact)
+    os.replace(tmp_path, path)
+
+
+def read_json_file(path: str) -> Any:
+    """Содержимое JSON-файла; пустой словарь, если файла нет или он пуст."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return {}
+    return json.loads(content) if content.strip() else {}
+
+
+class JSONOffloader:
+    """
+    Разбор и сериализация JSON вне цикла событий.
+
+    Выбор исполнителя зависит от объёма данных:
+    меньше thread_kb — прямо в цикле (дешевле, чем передача в поток),
+    до process_kb — в пуле потоков, больше — в отдельном процессе,
+    где сериализация не держит GIL основного процесса.
+    process_kb = 0 отключает процесс.
+    """
+
+    def __init__(self, thread_kb: int, process_kb: int, compact: bool = False):
+        self.compact = compact
+        self._thread_bytes = thread_kb * 1024
+        self._process_bytes = process_kb * 1024
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    def _use_process(self, size: int) -> bool:
+        return bool(self._process_bytes) and size >= self._process_bytes
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=1)
+        return self._process_pool
+
+    async def loads(self, content: str) -> Any:
+        """
+        Разбор JSON. Результат разбора всё равно нужен в этом процессе,
+        поэтому большие файлы разбираются в потоке, а не в процессе.
+        """
+        if len(content) < self._thread_bytes:
+            return json.loads(content)
+        return await asyncio.to_thread(json.loads, content)
+
+    async def write_file(self, path: str, data: Any, size_hint: int) -> int:
+        """
+        Сериализация и запись data в path. size_hint — ожидаемый объём
+        (например, размер прошлой записи). Возвращает размер записанного.
+        """
+        if size_hint < self._thread_bytes:
+            payload = dumps_json(data, self.compact)
+            await asyncio.to_thread(_write_text, path, payload)
+            return len(payload)
+        if self._use_process(size_hint):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_process_pool(), write_json_file, path, data, self.compact
+            )
+        return await asyncio.to_thread(write_json_file, path, data, self.compact)
+
+    def shutdown(self):
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=True)
+            self._process_pool = None
@@ -0,0 +1,152 @@
+import os
+import asyncio
+from typing import Dict, Any, Optional, AsyncIterator, Tuple
+
+import config
+from serialization import read_json_file, write_json_atomic
+from storage import AsyncJSONStorage
+
+META_FILE = "meta.json"
+SHARDS_FORMAT = 1
+
+
+def shard_index(user_id: int, shard_count: int) -> int:
+    """Номер шарда пользователя."""
+    return int(user_id) % shard_count
+
+
+def shard_file_name(index: int) -> str:
+    return f"shard_{index:04d}.json"
+
+
+def migrate_json_to_shards(source: str, target_dir: str, shard_count: int) -> int:
+    """
+    Перенос данных из одного JSON-файла в шарды.
+    Исходный файл не изменяется. Файл meta.json пишется последним,
+    поэтому прерванная миграция просто повторится при следующем запуске.
+    Возвращает число перенесённых пользователей.
+    """
+    meta_path = os.path.join(target_dir, META_FILE)
+    if os.path.exists(meta_path):
+        raise ValueError(f"Каталог {target_dir} уже содержит шарды")
+
+    all_data = read_json_file(source)
+
+    buckets: Dict[int, Dict[str, Any]] = {}
+    for user_key, user_data in all_data.items():
+        buckets.setdefault(shard_index(int(user_key), shard_count), {})[user_key] = user_data
+
+    os.makedirs(target_dir, exist_ok=True)
+    for index, shard in buckets.items():
+        write_json_atomic(os.path.join(target_dir, shard_file_name(index)), shard)
+
+    write_json_atomic(meta_path, {"format": SHARDS_FORMAT, "shard_count": shard_count})
+    return len(all_data)
+
+
+def read_shards(shards_dir: str) -> Dict[str, Any]:
+    """Все пользователи из каталога шардов (для переноса в другой формат)."""
+    meta = read_json_file(os.path.join(shards_dir, META_FILE))
+    all_data: Dict[str, Any] = {}
+    for index in range(meta["shard_count"]):
+        all_data.update(read_json_file(os.path.join(shards_dir, shard_file_name(index))))
+    return all_data
+
+
+class ShardedJSONStorage(AsyncJSONStorage):
+    """
+    Хранилище, разбитое на шарды: пользователи распределены по
+    SHARD_COUNT файлам по остатку от деления user_id. Запись затрагивает
+    только файл своего шарда, а записи в разные шарды не ждут друг друга.
+    """
+    _instance = None
+
+    def _init_cache(self):
+        super()._init_cache()
+        self._shards_dir = config.SHARDS_DIR
+        self._shard_count = config.SHARD_COUNT
+        self._shard_locks = [asyncio.Lock() for _ in range(self._shard_count)]
+        self._layout_ready = False
+
+    async def _ensure_layout(self):
+        """Проверка каталога шардов; при первом запуске — миграция из DATA_FILE."""
+        if self._layout_ready:
+            return
+
+        async with self._lock:
+            if self._layout_ready:
+                return
+
+            meta_path = os.path.join(self._shards_dir, META_FILE)
+            if os.path.exists(meta_path):
+                meta = await self._read_file(meta_path)
+                if meta.get("shard_count") != self._shard_count:
+                    raise ValueError(
+                        f"Шарды в {self._shards_dir} созданы для shard_count="
+                        f"{meta.get('shard_count')}, а в настройках {self._shard_count}"
+                    )
+            else:
+                migrated = await asyncio.to_thread(
+                    migrate_json_to_shards,
+                    self._file_path, self._shards_dir, self._shard_count
+                )
+                if migrated:
+                    print(f"Перенесено пользователей в шарды: {migrated}")
+
+            self._layout_ready = True
+
+    def _shard_path(self, user_id: int) -> str:
+        index = shard_index(user_id, self._shard_count)
+        return os.path.join(self._shards_dir, shard_file_name(index))
+
+    def _write_lock(self, user_id: int) -> asyncio.Lock:
+        return self._shard_locks[shard_index(user_id, self._shard_count)]
+
+    async def _load_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        await self._ensure_layout()
+        shard = await self._read_file(self._shard_path(user_id))
+        return shard.get(str(user_id))
+
+    async def _store_user(self, user_id: int, user_data: Dict[str, Any]):
+        await self._ensure_layout()
+        path = self._shard_path(user_id)
+        shard = await self._read_file(path)
+        shard[str(user_id)] = user_data
+        await self._write_file(self._snapshot(shard, [str(user_id)]), path)
+
+    async def _remove_user(self, user_id: int) -> bool:
+        await self._ensure_layout()
+        path = self._shard_path(user_id)
+        shard = await self._read_file(path)
+        if str(user_id) not in shard:
+            return False
+        del shard[str(user_id)]
+        await self._write_file(shard, path)
+        return True
+
+    async def _store_batch(self, batch: Dict[int, Optional[Dict[str, Any]]]):
+        """Групповая запись: каждый затронутый шард перезаписывается один раз."""
+        await self._ensure_layout()
+        by_shard: Dict[int, Dict[int, Optional[Dict[str, Any]]]] = {}
+        for user_id, user_data in batch.items():
+            by_shard.setdefault(shard_index(user_id, self._shard_count), {})[user_id] = user_data
+
+        for index, changes in by_shard.items():
+            path = os.path.join(self._shards_dir, shard_file_name(index))
+            async with self._shard_locks[index]:
+                shard = await self._read_file(path)
+                for user_id, user_data in changes.items():
+                    if user_data is None:
+                        shard.pop(str(user_id), None)
+                    else:
+                        shard[str(user_id)] = user_data
+                await self._write_file(self._snapshot(shard, map(str, changes)), path)
+
+    async def iter_users(self) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Пользователи по шардам: в памяти одновременно только один шард."""
+        await self.flush()
+        await self._ensure_layout()
+        for index in range(self._shard_count):
+            shard = await self._read_file(os.path.join(self._shards_dir, shard_file_name(index)))
+            for user_key, user_data in shard.items():
+                yield int(user_key), user_data
@@ -0,0 +1,129 @@
+import os
+import fcntl
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, AsyncIterator, Tuple
+
+from storage import AsyncJSONStorage
+
+# Байт 0 файла блокировок — чтение-изменение-запись habits.json,
+# байт 1 + полоса — транзакции пользователей этой полосы
+FILE_LOCK_OFFSET = 0
+
+
+class SharedJSONStorage(AsyncJSONStorage):
+    """
+    Один файл habits.json для нескольких процессов бота на одной машине
+    (STORAGE_ENGINE=shared).
+
+    Межпроцессные блокировки — fcntl-блокировки байтов файла DATA_FILE.lock
+    (сам файл данных подменяется при каждой записи, поэтому блокировать
+    его нельзя). Перезапись файла идёт под блокировкой байта 0, транзакция
+    пользователя держит байт своей полосы StripedLocks, так что изменения
+    одного пользователя из разных процессов не затирают друг друга.
+
+    fcntl-блокировки принадлежат процессу, а не корутине, поэтому каждая
+    берётся только внутри соответствующей asyncio-блокировки этого процесса.
+
+    Кеш проверяется по поколению файла (inode, mtime, размер): пока другой
+    процесс не перезаписал файл, записи читаются из кеша; после чужой записи
+    кеш и резидентные данные сбрасываются и читаются заново.
+    Групповая запись в этом режиме отключена: другие процессы должны видеть
+    изменение сразу после конца транзакции.
+
+    Напоминания рассылает один процесс — владелец блокировки
+    REMINDERS_FILE.lock (см. HabitTrackerBot._run_shared_reminders).
+    """
+    _instance = None
+
+    def _init_cache(self):
+        super()._init_cache()
+        if self._group_window:
+            print("STORAGE_ENGINE=shared: групповая запись отключена")
+            self._group_window = 0
+        self._lock_path = f"{self._file_path}.lock"
+        self._lock_fd: Optional[int] = None
+        self._generation: Optional[Tuple[int, int, int]] = None
+        self.invalidations = 0
+
+    def _lock_file(self) -> int:
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._lock_fd
+
+    @asynccontextmanager
+    async def _range_lock(self, offset: int) -> AsyncIterator[None]:
+        """Межпроцессная блокировка одного байта файла блокировок."""
+        fd = self._lock_file()
+        delay = 0.001
+        while True:
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+                break
+            except OSError:
+                # Занято другим процессом: ждём, не занимая поток
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+        try:
+            yield
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset)
+
+    def _signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self._file_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _revalidate(self):
+        """Сброс кеша, если файл перезаписал другой процесс."""
+        signature = self._signature()
+        if signature == self._generation:
+            return
+        self._generation = signature
+        self._cache.clear()
+        self._resident = None
+        self._resident_sizes = {}
+        self._resident_bytes = 0
+        self.invalidations += 1
+
+    async def _read_file(self, path: Optional[str] = None) -> Dict[str, Any]:
+        if path is None or path == self._file_path:
+            # Поколение берём до чтения: если файл сменится во время чтения,
+            # следующая проверка это заметит
+            self._revalidate()
+        return await super()._read_file(path)
+
+    @asynccontextmanager
+    async def user_transaction(self, user_id: int) -> AsyncIterator[Dict[str, Any]]:
+        async with self._user_locks[user_id]:
+            async with self._range_lock(1 + self._user_locks.stripe(user_id)):
+                yield await self.get_user_data(user_id)
+
+    async def get_user_data(self, user_id: int) -> Dict[str, Any]:
+        self._revalidate()
+        return await super().get_user_data(user_id)
+
+    async def _store_user(self, user_id: int, user_data: Dict[str, Any]):
+        async with self._range_lock(FILE_LOCK_OFFSET):
+            # Резидентная копия могла устареть: изменение пишется поверх свежих данных
+            self._revalidate()
+            await super()._store_user(user_id, user_data)
+            self._generation = self._signature()
+
+    async def _remove_user(self, user_id: int) -> bool:
+        async with self._range_lock(FILE_LOCK_OFFSET):
+            self._revalidate()
+            removed = await super()._remove_user(user_id)
+            self._generation = self._signature()
+            return removed
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {**super().cache_stats(), "invalidations": self.invalidations}
+
+    async def close(self):
+        await super().close()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
@@ -0,0 +1,265 @@
+import json
+import queue
+import sqlite3
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Callable, AsyncIterator, List, Tuple
+
+import config
+from history import HabitHistory
+from serialization import read_json_file
+from storage import AsyncJSONStorage, StripedLocks, default_user_data
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+# Сколько пользователей iter_users собирает за одно обращение к пулу
+ITER_BATCH_USERS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id  INTEGER PRIMARY KEY,
+    timezone TEXT NOT NULL,
+    created  TEXT NOT NULL,
+    extra    TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS habits (
+    user_id  INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    habit_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name     TEXT NOT NULL,
+    created  TEXT NOT NULL,
+    streak   INTEGER NOT NULL DEFAULT 0,
+    extra    TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (user_id, habit_id)
+);
+CREATE TABLE IF NOT EXISTS checkins (
+    user_id  INTEGER NOT NULL,
+    habit_id INTEGER NOT NULL,
+    day      TEXT NOT NULL,
+    PRIMARY KEY (user_id, habit_id, day),
+    FOREIGN KEY (user_id, habit_id) REFERENCES habits(user_id, habit_id) ON DELETE CASCADE
+) WITHOUT ROWID;
+"""
+
+# Поля, которые хранятся в отдельных колонках; остальные уходят в extra
+USER_COLUMNS = ("habits", "timezone", "created")
+HABIT_COLUMNS = ("id", "name", "created", "history", "streak")
+
+
+def is_sqlite_path(path: str) -> bool:
+    return path.lower().endswith(SQLITE_SUFFIXES)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Соединение с базой в режиме WAL."""
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def load_user(conn: sqlite3.Connection, user_id: int) -> Optional[Dict[str, Any]]:
+    """Сборка записи пользователя в формате, который ждут обработчики бота."""
+    row = conn.execute(
+        "SELECT timezone, created, extra FROM users WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    if row is None:
+        return None
+
+    history: Dict[int, list] = {}
+    for habit_id, day in conn.execute(
+        "SELECT habit_id, day FROM checkins WHERE user_id = ? ORDER BY day", (user_id,)
+    ):
+        history.setdefault(habit_id, []).append(day)
+
+    habits = []
+    for habit_id, name, created, streak, extra in conn.execute(
+        "SELECT habit_id, name, created, streak, extra FROM habits "
+        "WHERE user_id = ? ORDER BY position", (user_id,)
+    ):
+        habit = {
+            "id": habit_id,
+            "name": name,
+            "created": created,
+            "history": HabitHistory.from_days(history.get(habit_id, []), created),
+            "streak": streak
+        }
+        habit.update(json.loads(extra))
+        habits.append(habit)
+
+    timezone, created, extra = row
+    user_data = {"habits": habits, "timezone": timezone, "created": created}
+    user_data.update(json.loads(extra))
+    return user_data
+
+
+def store_user(conn: sqlite3.Connection, user_id: int, user_data: Dict[str, Any]):
+    """
+    Запись пользователя точечными запросами: меняются только строки
+    этого пользователя, а отметки — только добавленные и удалённые дни.
+    Вызывается внутри транзакции.
+    """
+    defaults = default_user_data()
+    extra = {k: v for k, v in user_data.items() if k not in USER_COLUMNS}
+    conn.execute(
+        "INSERT INTO users (user_id, timezone, created, extra) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET "
+        "timezone = excluded.timezone, created = excluded.created, extra = excluded.extra",
+        (
+            user_id,
+            user_data.get("timezone", defaults["timezone"]),
+            user_data.get("created", defaults["created"]),
+            json.dumps(extra, ensure_ascii=False)
+        )
+    )
+
+    habits = user_data.get("habits", [])
+    habit_ids = {habit["id"] for habit in habits}
+    stored_ids = {
+        habit_id for (habit_id,) in
+        conn.execute("SELECT habit_id FROM habits WHERE user_id = ?", (user_id,))
+    }
+    conn.executemany(
+        "DELETE FROM habits WHERE user_id = ? AND habit_id = ?",
+        [(user_id, habit_id) for habit_id in stored_ids - habit_ids]
+    )
+
+    stored_days: Dict[int, set] = {}
+    for habit_id, day in conn.execute(
+        "SELECT habit_id, day FROM checkins WHERE user_id = ?", (user_id,)
+    ):
+        stored_days.setdefault(habit_id, set()).add(day)
+
+    for position, habit in enumerate(habits):
+        habit_extra = {k: v for k, v in habit.items() if k not in HABIT_COLUMNS}
+        conn.execute(
+            "INSERT INTO habits (user_id, habit_id, position, name, created, streak, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(user_id, habit_id) DO UPDATE SET "
+            "position = excluded.position, name = excluded.name, created = excluded.created, "
+            "streak = excluded.streak, extra = excluded.extra",
+            (
+                user_id, habit["id"], position, habit["name"],
+                habit.get("created", defaults["created"]), habit.get("streak", 0),
+                json.dumps(habit_extra, ensure_ascii=False)
+            )
+        )
+
+        days = set(HabitHistory.from_json(habit.get("history"), habit.get("created")))
+        old_days = stored_days.get(habit["id"], set())
+        conn.executemany(
+            "INSERT INTO checkins (user_id, habit_id, day) VALUES (?, ?, ?)",
+            [(user_id, habit["id"], day) for day in days - old_days]
+        )
+        conn.executemany(
+            "DELETE FROM checkins WHERE user_id = ? AND habit_id = ? AND day = ?",
+            [(user_id, habit["id"], day) for day in old_days - days]
+        )
+
+
+def migrate_json_to_sqlite(source: str, db_path: str) -> int:
+    """Перенос данных из JSON-файла в базу SQLite. Возвращает число пользователей."""
+    all_data = read_json_file(source)
+
+    conn = connect(db_path)
+    try:
+        with conn:
+            for user_key, user_data in all_data.items():
+                store_user(conn, int(user_key), user_data)
+    finally:
+        conn.close()
+    return len(all_data)
+
+
+class SQLiteStorage(AsyncJSONStorage):
+    """
+    Хранилище в SQLite (включается, если DATA_FILE оканчивается на .db/.sqlite).
+
+    Запросы выполняются в пуле потоков на небольшом пуле соединений,
+    поэтому цикл событий не блокируется на дисковых операциях.
+    """
+    _instance = None
+
+    def _init_cache(self):
+        super()._init_cache()
+        self._pool_size = config.SQLITE_POOL_SIZE
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._pool_size, thread_name_prefix="sqlite"
+        )
+        self._connections: Optional[queue.Queue] = None
+        self._pool_lock = threading.Lock()
+        # Каждая запись — отдельная транзакция, общий файловый _lock не нужен
+        self._row_locks = StripedLocks(config.USER_LOCK_STRIPES)
+
+    def _call(self, fn: Callable, *args):
+        """Выполнение fn(conn, *args) на свободном соединении (в потоке пула)."""
+        with self._pool_lock:
+            if self._connections is None:
+                # Первое обращение: заполняем пул (схема создаётся в connect)
+                pool = queue.Queue()
+                for _ in range(self._pool_size):
+                    pool.put(connect(self._file_path))
+                self._connections = pool
+
+        conn = self._connections.get()
+        try:
+            with conn:  # транзакция: commit при успехе, rollback при ошибке
+                return fn(conn, *args)
+        finally:
+            self._connections.put(conn)
+
+    async def _run(self, fn: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, *args)
+
+    def _write_lock(self, user_id: int) -> asyncio.Lock:
+        return self._row_locks[user_id]
+
+    async def _load_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return await self._run(load_user, user_id)
+
+    async def _store_user(self, user_id: int, user_data: Dict[str, Any]):
+        await self._run(store_user, user_id, user_data)
+
+    async def _remove_user(self, user_id: int) -> bool:
+        def remove(conn: sqlite3.Connection, uid: int) -> bool:
+            return conn.execute("DELETE FROM users WHERE user_id = ?", (uid,)).rowcount > 0
+
+        return await self._run(remove, user_id)
+
+    async def _store_batch(self, batch: Dict[int, Optional[Dict[str, Any]]]):
+        """Групповая запись: вся пачка — одна транзакция."""
+        def store_batch(conn: sqlite3.Connection, changes: Dict[int, Optional[Dict[str, Any]]]):
+            for uid, user_data in changes.items():
+                if user_data is None:
+                    conn.execute("DELETE FROM users WHERE user_id = ?", (uid,))
+                else:
+                    store_user(conn, uid, user_data)
+
+        await self._run(store_batch, batch)
+
+    async def iter_users(self) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Пользователи пачками по ITER_BATCH_USERS (одна транзакция на пачку)."""
+        def user_ids(conn: sqlite3.Connection) -> List[int]:
+            return [row[0] for row in conn.execute("SELECT user_id FROM users ORDER BY user_id")]
+
+        def load_users(conn: sqlite3.Connection, uids: List[int]):
+            return [(uid, load_user(conn, uid)) for uid in uids]
+
+        await self.flush()
+        uids = await self._run(user_ids)
+        for start in range(0, len(uids), ITER_BATCH_USERS):
+            for uid, user_data in await self._run(load_users, uids[start:start + ITER_BATCH_USERS]):
+                if user_data is not None:
+                    yield uid, user_data
+
+    async def close(self):
+        """Сброс групповой записи, закрытие соединений и пула потоков."""
+        await self.flush()
+        self._executor.shutdown(wait=True)
+        if self._connections is not None:
+            while not self._connections.empty():
+                self._connections.get().close()
+            self._connections = None
@@ -1,18 +1,66 @@
 import json
+import os
 import asyncio
-from typing import Dict, Any, Optional
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Set, AsyncIterator, Iterable, List, Tuple
 import aiofiles
 from datetime import datetime
-from cachetools import TTLCache
 import config
+from cache import make_cache, record_size
+from serialization import JSONOffloader
+
+
+def default_user_data() -> Dict[str, Any]:
+    """Запись нового пользователя по умолчанию."""
+    return {
+        "habits": [],
+        "timezone": "Europe/Moscow",
+        "created": datetime.now().strftime("%Y-%m-%d")
+    }
+
+
+class StripedLocks:
+    """
+    Фиксированный набор блокировок: пользователь попадает в полосу по хешу
+    user_id. Память не растёт с числом пользователей, а разные пользователи
+    почти всегда получают разные блокировки.
+    """
+
+    def __init__(self, stripes: int):
+        self._locks: List[asyncio.Lock] = [asyncio.Lock() for _ in range(stripes)]
+
+    def stripe(self, user_id: int) -> int:
+        """Номер полосы пользователя."""
+        return hash(user_id) % len(self._locks)
+
+    def __getitem__(self, user_id: int) -> asyncio.Lock:
+        return self._locks[self.stripe(user_id)]
+
 
 class AsyncJSONStorage:
     """
     Асинхронное хранилище с кешированием для работы с JSON-файлом.
     Обеспечивает блокировки для предотвращения конфликтов при записи[citation:6].
+
+    Наследники меняют только способ хранения, переопределяя
+    _load_user / _store_user / _remove_user / _store_batch;
+    кеш, блокировки и групповая запись общие.
+
+    Чтение-изменение-запись данных одного пользователя выполняется
+    внутри user_transaction(user_id): транзакции одного пользователя идут
+    по очереди, разных пользователей — параллельно.
+
+    Резидентный режим (RESIDENT_DATASET=1): файл читается один раз, данные
+    живут в памяти, а запись только сохраняет их на диск. Если данные
+    в памяти (оценка: размер JSON * RESIDENT_MEMORY_FACTOR) перерастают
+    RESIDENT_MAX_MB, хранилище возвращается к чтению с диска.
+
+    Групповая запись (GROUP_COMMIT_WINDOW_MS > 0): сохранения копятся в памяти
+    и сбрасываются одной записью раз в окно или по набору
+    GROUP_COMMIT_MAX_USERS пользователей.
     """
     _instance = None
-    _lock = asyncio.Lock()  # Блокировка на уровне класса для операций записи
+    _lock = asyncio.Lock()  # Блокировка файла данных (общая для всех пользователей)
 
     def __new__(cls):
         if cls._instance is None:
@@ -21,77 +69,384 @@ class AsyncJSONStorage:
         return cls._instance
 
     def _init_cache(self):
-        """Инициализация кеша в оперативной памяти (TTL 30 секунд)."""
-        # Кешируем данные пользователя на 30 секунд
-        self._cache = TTLCache(maxsize=100, ttl=30)
+        """Инициализация кеша в оперативной памяти (политика и объём из config)."""
+        # Кеш сквозной записи: save_user_data обновляет его после записи на диск
+        self._cache_policy = config.CACHE_POLICY
+        self._cache = make_cache(
+            config.CACHE_POLICY, config.CACHE_MAX_KB * 1024, config.CACHE_TTL
+        )
         self._file_path = config.DATA_FILE
+        # Разбор и сериализация больших файлов идут вне цикла событий
+        self._json = JSONOffloader(config.JSON_THREAD_KB, config.JSON_PROCESS_KB, config.JSON_COMPACT)
+        # Объём последнего прочитанного или записанного файла (для выбора исполнителя)
+        self._payload_bytes = 0
+        # Загрузки, идущие прямо сейчас: параллельные промахи ждут одну и ту же
+        self._loading: Dict[int, asyncio.Future] = {}
+        self._coalesced = 0
+        # Блокировки транзакций пользователей (см. user_transaction)
+        self._user_locks = StripedLocks(config.USER_LOCK_STRIPES)
+
+        # Групповая запись: изменения, ждущие сброса (None — удаление)
+        self._group_window = config.GROUP_COMMIT_WINDOW_MS / 1000
+        self._group_max_users = config.GROUP_COMMIT_MAX_USERS
+        self._pending: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._inflight: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._pending_future: Optional[asyncio.Future] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        # Сбросы идут строго по одному; сама запись берёт блокировки движка
+        self._flush_lock = asyncio.Lock()
 
-    async def _read_file(self) -> Dict[str, Any]:
+        # Резидентный режим: все данные файла в памяти и размер их JSON
+        # (_resident_bytes); предел памяти пересчитан в предел размера JSON
+        self._resident_enabled = config.RESIDENT_DATASET
+        self._resident_max_bytes = int(
+            config.RESIDENT_MAX_MB * 1024 * 1024 / config.RESIDENT_MEMORY_FACTOR
+        )
+        self._resident: Optional[Dict[str, Any]] = None
+        self._resident_sizes: Dict[str, int] = {}
+        self._resident_bytes = 0
+        self._resident_load_lock = asyncio.Lock()
+
+    async def _read_file(self, path: Optional[str] = None) -> Dict[str, Any]:
         """Чтение JSON-файла с обработкой ошибок[citation:2][citation:7]."""
+        path = path or self._file_path
         try:
-            async with aiofiles.open(self._file_path, 'r', encoding='utf-8') as f:
+            async with aiofiles.open(path, 'r', encoding='utf-8') as f:
                 content = await f.read()
+                self._payload_bytes = len(content)
                 if not content.strip():
                     return {}
-                return json.loads(content)
+                return await self._json.loads(content)
         except FileNotFoundError:
             return {}  # Файл создастся при первой записи
         except json.JSONDecodeError as e:
             print(f"Ошибка чтения JSON: {e}. Создаю новый файл.")
             return {}
 
-    async def _write_file(self, data: Dict[str, Any]):
-        """Асинхронная запись данных в JSON-файл с красивым форматированием."""
-        async with aiofiles.open(self._file_path, 'w', encoding='utf-8') as f:
-            # Используем json.dumps с отступами для читаемости[citation:7]
-            await f.write(json.dumps(data, indent=2, ensure_ascii=False))
+    async def _write_file(self, data: Dict[str, Any], path: Optional[str] = None):
+        """
+        Асинхронная запись данных в JSON-файл (с отступами или компактно, JSON_COMPACT).
+        Пишем во временный файл и атомарно подменяем им основной,
+        чтобы прерванная запись не оставила полуфайл.
+        """
+        path = path or self._file_path
+        tmp_path = f"{path}.tmp"
+        size_hint = self._resident_bytes if self._resident is not None else self._payload_bytes
+        self._payload_bytes = await self._json.write_file(tmp_path, data, size_hint)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _snapshot(data: Dict[str, Any], changed: Iterable[str]) -> Dict[str, Any]:
+        """
+        Копия данных для записи: сериализация идёт в потоке или процессе,
+        а обработчики тем временем меняют словари в цикле событий.
+        Копируются верхний уровень и записанные сейчас записи (с привычками) —
+        это объекты обработчиков, остальные записи менялись раньше.
+        """
+        snapshot = dict(data)
+        for user_key in changed:
+            record = snapshot.get(user_key)
+            if record is not None:
+                habits = [dict(habit) for habit in record.get("habits", [])]
+                snapshot[user_key] = {**record, "habits": habits}
+        return snapshot
+
+    def _write_lock(self, user_id: int) -> asyncio.Lock:
+        """Блокировка, под которой меняются данные пользователя."""
+        return self._lock
+
+    async def _load_all(self) -> Dict[str, Any]:
+        """
+        Все данные файла: в резидентном режиме — словарь в памяти
+        (файл читается только в первый раз), иначе — свежее чтение файла.
+        """
+        if not self._resident_enabled:
+            return await self._read_file()
+
+        if self._resident is None:
+            async with self._resident_load_lock:
+                if self._resident is None:
+                    all_data = await self._read_file()
+                    self._resident_sizes = {
+                        key: record_size(value) for key, value in all_data.items()
+                    }
+                    self._resident_bytes = sum(self._resident_sizes.values())
+                    self._resident = all_data
+                    self._check_resident_budget()
+                    return all_data
+        return self._resident
+
+    def _account(self, user_key: str, user_data: Optional[Dict[str, Any]]):
+        """Учёт объёма резидентных данных после изменения записи."""
+        if self._resident is None:
+            return
+        size = record_size(user_data) if user_data is not None else 0
+        self._resident_bytes += size - self._resident_sizes.pop(user_key, 0)
+        if user_data is not None:
+            self._resident_sizes[user_key] = size
+
+    def _check_resident_budget(self):
+        """Выход из резидентного режима, если данные не помещаются в RESIDENT_MAX_MB."""
+        if self._resident is None or self._resident_bytes <= self._resident_max_bytes:
+            return
+        memory_mb = self._resident_bytes * config.RESIDENT_MEMORY_FACTOR / (1024 * 1024)
+        print(f"Данные (~{memory_mb:.0f} МБ в памяти, {self._resident_bytes // (1024 * 1024)} МБ JSON) "
+              f"больше RESIDENT_MAX_MB, перехожу на чтение с диска")
+        self._resident_enabled = False
+        self._resident = None
+        self._resident_sizes = {}
+        self._resident_bytes = 0
+
+    async def _load_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Чтение записи пользователя из хранилища (None, если её нет)."""
+        all_data = await self._load_all()
+        return all_data.get(str(user_id))
+
+    async def _store_user(self, user_id: int, user_data: Dict[str, Any]):
+        """Запись данных пользователя в хранилище."""
+        # Получаем все данные
+        all_data = await self._load_all()
+        # Обновляем данные конкретного пользователя
+        all_data[str(user_id)] = user_data
+        self._account(str(user_id), user_data)
+        # Записываем обратно
+        await self._write_file(self._snapshot(all_data, [str(user_id)]))
+        self._check_resident_budget()
+
+    async def _remove_user(self, user_id: int) -> bool:
+        """Удаление записи пользователя. Возвращает True, если запись была."""
+        all_data = await self._load_all()
+        if str(user_id) not in all_data:
+            return False
+        del all_data[str(user_id)]
+        self._account(str(user_id), None)
+        await self._write_file(self._snapshot(all_data, []))
+        return True
+
+    async def _store_batch(self, batch: Dict[int, Optional[Dict[str, Any]]]):
+        """Запись пачки изменений за одно чтение и одну перезапись файла."""
+        async with self._lock:
+            all_data = await self._load_all()
+            for user_id, user_data in batch.items():
+                if user_data is None:
+                    all_data.pop(str(user_id), None)
+                else:
+                    all_data[str(user_id)] = user_data
+                self._account(str(user_id), user_data)
+            await self._write_file(self._snapshot(all_data, map(str, batch)))
+            self._check_resident_budget()
+
+    async def _enqueue(self, user_id: int, user_data: Optional[Dict[str, Any]], durable: bool):
+        """Постановка изменения в буфер групповой записи."""
+        self._pending[user_id] = user_data
+        if self._pending_future is None:
+            self._pending_future = asyncio.get_running_loop().create_future()
+            # Ошибку сброса получают только те, кто ждёт durable=True
+            self._pending_future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        future = self._pending_future
+
+        if len(self._pending) >= self._group_max_users:
+            self._schedule_flush(0)
+        elif not self._flush_tasks:
+            self._schedule_flush(self._group_window)
+
+        if durable:
+            await asyncio.shield(future)
+
+    def _schedule_flush(self, delay: float):
+        task = asyncio.create_task(self._flush_after(delay))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await self._flush_pending()
+        except Exception as e:
+            print(f"Ошибка групповой записи: {e}")
+
+    async def _flush_pending(self):
+        """Сброс накопленных изменений одной записью."""
+        try:
+            await self._flush_batch()
+        finally:
+            # Сохранения, пришедшие во время записи, и пачка, возвращённая
+            # после ошибки, ждут следующего сброса
+            if self._pending and not self._flush_tasks - {asyncio.current_task()}:
+                self._schedule_flush(self._group_window)
+
+    async def _flush_batch(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, future = self._pending, self._pending_future
+            self._pending, self._pending_future = {}, None
+            self._inflight = batch
+            try:
+                await self._store_batch(batch)
+            except Exception as e:
+                # Возвращаем в буфер всё, что не перезаписано более новыми сохранениями
+                for user_id, user_data in batch.items():
+                    self._pending.setdefault(user_id, user_data)
+                if future is not None:
+                    future.set_exception(e)
+                raise
+            else:
+                if future is not None:
+                    future.set_result(None)
+            finally:
+                self._inflight = {}
+
+    async def flush(self):
+        """Немедленный сброс буфера групповой записи."""
+        await self._flush_pending()
+
+    @asynccontextmanager
+    async def user_transaction(self, user_id: int) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Атомарное изменение данных пользователя:
+
+            async with storage.user_transaction(user_id) as user_data:
+                user_data["habits"].append(habit)
+                await storage.save_user_data(user_id, user_data)
+
+        Пока блок выполняется, другие транзакции того же пользователя ждут,
+        поэтому параллельные обновления не затирают друг друга.
+        """
+        async with self._user_locks[user_id]:
+            yield await self.get_user_data(user_id)
 
     async def get_user_data(self, user_id: int) -> Dict[str, Any]:
         """Получение данных пользователя с использованием кеша."""
         # Пробуем получить из кеша
         cache_key = f"user_{user_id}"
-        cached_data = self._cache.get(cache_key)
+        cached_data = self._cache.lookup(cache_key)
         if cached_data is not None:
             return cached_data
 
-        # Читаем из файла
-        all_data = await self._read_file()
-        user_data = all_data.get(str(user_id), {
-            "habits": [],
-            "timezone": "Europe/Moscow",
-            "created": datetime.now().strftime("%Y-%m-%d")
-        })
+        if user_id in self._pending:
+            # Изменение ещё в буфере групповой записи
+            user_data = self._pending[user_id]
+        elif user_id in self._inflight:
+            user_data = self._inflight[user_id]
+        elif user_id in self._loading:
+            # Этого пользователя уже читают — ждём ту же загрузку
+            self._coalesced += 1
+            return await asyncio.shield(self._loading[user_id])
+        else:
+            return await self._load_once(user_id)
+        if user_data is None:
+            user_data = default_user_data()
 
         # Сохраняем в кеш
         self._cache[cache_key] = user_data
         return user_data
 
-    async def save_user_data(self, user_id: int, user_data: Dict[str, Any]):
+    async def _load_once(self, user_id: int) -> Dict[str, Any]:
+        """Чтение пользователя из хранилища, общее для всех одновременных промахов."""
+        future = asyncio.get_running_loop().create_future()
+        # Ошибку загрузки получает каждый ожидающий; помечаем её полученной
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._loading[user_id] = future
+        try:
+            user_data = await self._load_user(user_id)
+            if user_data is None:
+                user_data = default_user_data()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._loading.get(user_id) is future:
+                del self._loading[user_id]
+                fresh = True
+            else:
+                # Пока шло чтение, данные сохранили заново — в кеш не кладём
+                fresh = False
+
+        if fresh:
+            self._cache[f"user_{user_id}"] = user_data
+        future.set_result(user_data)
+        return user_data
+
+    async def save_user_data(self, user_id: int, user_data: Dict[str, Any],
+                             durable: bool = False):
         """
         Сохранение данных пользователя с блокировкой для избежания конфликтов[citation:6].
+        При групповой записи durable=True дожидается сброса данных на диск.
         """
-        async with self._lock:  # Важно: одна запись в момент времени
-            # Получаем все данные
-            all_data = await self._read_file()
-            # Обновляем данные конкретного пользователя
-            all_data[str(user_id)] = user_data
+        self._loading.pop(user_id, None)
+        if self._group_window:
+            self._cache[f"user_{user_id}"] = user_data
+            await self._enqueue(user_id, user_data, durable)
+            return
 
-            # Записываем обратно
-            await self._write_file(all_data)
+        async with self._write_lock(user_id):  # Важно: одна запись в момент времени
+            await self._store_user(user_id, user_data)
 
             # Обновляем кеш
             cache_key = f"user_{user_id}"
             self._cache[cache_key] = user_data
 
-    async def delete_user_data(self, user_id: int):
+    async def delete_user_data(self, user_id: int, durable: bool = False):
         """Удаление всех данных пользователя."""
-        async with self._lock:
-            all_data = await self._read_file()
-            if str(user_id) in all_data:
-                del all_data[str(user_id)]
-                await self._write_file(all_data)
+        self._loading.pop(user_id, None)
+        if self._group_window:
+            self._cache.pop(f"user_{user_id}", None)
+            await self._enqueue(user_id, None, durable)
+            return
 
+        async with self._write_lock(user_id):
+            if await self._remove_user(user_id):
                 # Удаляем из кеша
                 cache_key = f"user_{user_id}"
                 if cache_key in self._cache:
-                    del self._cache[cache_key]
\ No newline at end of file
+                    del self._cache[cache_key]
+
+    async def iter_users(self) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Все пользователи хранилища (построение расписания при запуске, отчёты).
+        Буфер групповой записи сначала сбрасывается; записи не попадают в кеш.
+        """
+        await self.flush()
+        all_data = await self._load_all()
+        for user_key, user_data in list(all_data.items()):
+            yield int(user_key), user_data
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        Статистика кеша: записи, объём, попадания, промахи, вытеснения
+        и coalesced — промахи, дождавшиеся уже идущей загрузки.
+        """
+        return {"policy": self._cache_policy, **self._cache.stats(), "coalesced": self._coalesced}
+
+    async def close(self):
+        """Завершение работы хранилища (вызывается при остановке бота)."""
+        await self.flush()
+        self._json.shutdown()
+
+
+def create_storage() -> AsyncJSONStorage:
+    """
+    Создание хранилища: база SQLite, если DATA_FILE оканчивается на .db/.sqlite,
+    иначе JSON-движок из config.STORAGE_ENGINE.
+    """
+    from sqlite_storage import SQLiteStorage, is_sqlite_path
+    if is_sqlite_path(config.DATA_FILE):
+        return SQLiteStorage()
+
+    engine = config.STORAGE_ENGINE
+    if engine == "json":
+        return AsyncJSONStorage()
+    if engine == "sharded":
+        from sharded_storage import ShardedJSONStorage
+        return ShardedJSONStorage()
+    if engine == "journal":
+        from journal_storage import JournaledJSONStorage
+        return JournaledJSONStorage()
+    if engine == "shared":
+        from shared_storage import SharedJSONStorage
+        return SharedJSONStorage()
+    raise ValueError(f"Неизвестный движок хранилища: {engine}")
@@ -0,0 +1,31 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from storage import AsyncJSONStorage
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Отдельные файлы данных теста и свежие синглтоны хранилищ."""
+    monkeypatch.setattr(config, "DATA_FILE", str(tmp_path / "habits.json"))
+    monkeypatch.setattr(config, "SHARDS_DIR", str(tmp_path / "habits_shards"))
+    monkeypatch.setattr(config, "REMINDERS_FILE", str(tmp_path / "reminders.json"))
+    monkeypatch.setattr(config, "GROUP_COMMIT_WINDOW_MS", 0)
+    # Блокировка класса привязывается к циклу событий, а у каждого теста свой цикл
+    monkeypatch.setattr(AsyncJSONStorage, "_lock", asyncio.Lock())
+    yield tmp_path
+    for cls in _storage_classes(AsyncJSONStorage):
+        cls._instance = None
+
+
+def _storage_classes(cls):
+    yield cls
+    for subclass in cls.__subclasses__():
+        yield from _storage_classes(subclass)
@@ -0,0 +1,87 @@
+import asyncio
+import random
+from datetime import date, timedelta
+
+import config
+from analytics import HistoryMatrix, fleet_report, storage_report
+from history import HabitHistory
+from sharded_storage import ShardedJSONStorage
+from storage import create_storage
+from utils import current_streak, recompute_streak
+
+END = date(2026, 3, 15)
+
+
+def _habit(habit_id, days):
+    habit = {"id": habit_id, "name": f"h{habit_id}", "created": "2025-01-01",
+             "history": HabitHistory.from_days(days, "2025-01-01")}
+    recompute_streak(habit)
+    return habit
+
+
+def _random_users(rng, count, end=END):
+    users = []
+    for n in range(count):
+        habits = []
+        for habit_id in range(rng.randint(0, 4)):
+            rate = rng.random()
+            days = [end - timedelta(days=k) for k in range(120) if rng.random() < rate]
+            habits.append(_habit(habit_id, days))
+        users.append((1000 + n, {"habits": habits}))
+    return users
+
+
+def test_matrix_matches_histories():
+    rng = random.Random(3)
+    users = _random_users(rng, 40)
+    matrix = HistoryMatrix.from_users(users, 30, END)
+
+    window = [END - timedelta(days=29 - d) for d in range(30)]
+    row = 0
+    for u, (user_id, user_data) in enumerate(users):
+        assert matrix.user_ids[u] == user_id
+        for habit in user_data["habits"]:
+            assert matrix.row_users[row] == u
+            assert matrix.done[row].tolist() == [day in habit["history"] for day in window]
+            # Серия в отчёте — та же, что показывает бот (в пределах периода)
+            assert matrix.current_streaks()[row] == min(current_streak(habit, END), 30)
+            row += 1
+    assert row == len(matrix.names) == matrix.done.shape[0]
+
+
+def test_current_streak_counts_through_yesterday():
+    habit = _habit(1, [END - timedelta(days=k) for k in (1, 2, 3)])
+    matrix = HistoryMatrix.from_users([(1, {"habits": [habit]})], 7, END)
+    assert matrix.current_streaks().tolist() == [3]
+    assert matrix.longest_streaks().tolist() == [3]
+
+
+def test_fleet_report_is_chunk_independent():
+    users = _random_users(random.Random(5), 50)
+    whole = fleet_report(users, 14, END, chunk_size=1000, top=3)
+    chunked = fleet_report(users, 14, END, chunk_size=7, top=3)
+    assert whole == chunked
+    assert whole["users"] == 50
+    assert whole["habits"] == sum(len(data["habits"]) for _, data in users)
+
+
+def test_storage_report_reads_configured_engine(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "STORAGE_ENGINE", "sharded")
+    users = _random_users(random.Random(7), 20, date.today())
+
+    async def fill():
+        storage = create_storage()
+        for user_id, user_data in users:
+            await storage.save_user_data(user_id, user_data)
+        await storage.close()
+
+    asyncio.run(fill())
+    ShardedJSONStorage._instance = None
+
+    report = asyncio.run(storage_report(14, chunk_size=6, top=3))
+    expected = fleet_report(users, 14, date.today(), top=3)
+    # Шарды отдают пользователей в другом порядке: равные доли в топе могут поменяться местами
+    for key in ("best_habits", "worst_habits"):
+        del report[key], expected[key]
+    assert report == expected
+    assert report["users"] == 20 and report["completions"] > 0
@@ -0,0 +1,42 @@
+import pytest
+
+from cache import make_cache, record_size
+
+
+def _record(n, size=100):
+    return {"habits": [], "note": "x" * size, "n": n}
+
+
+@pytest.mark.parametrize("policy", ["lru", "lfu", "ttl"])
+def test_cache_is_bounded_by_record_bytes(policy):
+    one = record_size(_record(0))
+    cache = make_cache(policy, one * 3, ttl=60)
+    for n in range(5):
+        cache[f"user_{n}"] = _record(n)
+
+    assert len(cache) == 3 and cache.currsize <= one * 3
+    assert cache.stats()["evictions"] == 2
+
+    # Запись больше всего кеша не кешируется, а её старая версия удаляется
+    cache["user_4"] = _record(4, size=one * 4)
+    assert "user_4" not in cache
+    assert cache.stats()["rejected"] == 1
+
+
+def test_lru_keeps_recently_read_records_and_counts_hits():
+    one = record_size(_record(0))
+    cache = make_cache("lru", one * 2, ttl=60)
+    cache["user_1"] = _record(1)
+    cache["user_2"] = _record(2)
+    assert cache.lookup("user_1")["n"] == 1
+    cache["user_3"] = _record(3)
+
+    assert cache.lookup("user_2") is None
+    assert cache.lookup("user_1")["n"] == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 1, 2 / 3)
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError, match="fifo"):
+        make_cache("fifo", 1024, ttl=60)
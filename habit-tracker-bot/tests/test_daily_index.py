@@ -0,0 +1,79 @@
+import asyncio
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+from daily_index import DailyCompletionIndex
+from habit_bot import HabitTrackerBot
+from history import HabitHistory
+from timezones import DayClock, clock
+
+# 2024-05-01 20:00 UTC — в Москве уже 23:00, в Нью-Йорке 16:00
+NOW = datetime(2024, 5, 1, 20, tzinfo=timezone.utc).timestamp()
+
+
+class FakeTimer:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _user(zone, *checked):
+    habits = [{"id": n, "name": f"h{n}", "created": "2024-01-01",
+               "history": HabitHistory.from_days(days, "2024-01-01")}
+              for n, days in enumerate(checked, 1)]
+    return {"habits": habits, "timezone": zone}
+
+
+def test_status_counts_unchecked_habits_per_local_day():
+    timer = FakeTimer(NOW)
+    index = DailyCompletionIndex(DayClock(timer))
+    moscow = _user("Europe/Moscow", ["2024-05-01"], [], [])
+    index.track(1, moscow)
+    index.track(2, _user("America/New_York", ["2024-05-01"]))
+    assert index.status(1) == (3, 2)
+    assert index.status(2) == (1, 0)
+    assert index.status(3) is None
+
+    index.checked(1, moscow, date(2024, 5, 1))
+    assert index.status(1) == (3, 1)
+
+    # Полночь в Москве: вчерашние отметки больше не считаются, Нью-Йорк ещё в 1 мае
+    timer.now += 3600
+    assert index.status(1) == (3, 3)
+    assert index.status(2) == (1, 0)
+    index.checked(1, moscow, date(2024, 5, 2))
+    assert index.status(1) == (3, 2)
+
+    # Смена пояса — запись пересчитывается по данным пользователя
+    index.checked(2, _user("Europe/Moscow", ["2024-05-01"], ["2024-05-02"]), date(2024, 5, 2))
+    assert index.status(2) == (2, 1)
+
+    index.discard(1)
+    assert index.status(1) is None and len(index) == 1
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.messages.append((chat_id, text))
+
+
+def test_reminder_for_finished_user_skips_storage(data_dir):
+    bot = HabitTrackerBot()
+    bot.application = SimpleNamespace(bot=FakeBot())
+    today = clock.today("UTC").isoformat()
+    bot.completions.track(1, _user("UTC", [today], [today]))
+    bot.completions.track(2, _user("UTC"))
+
+    async def no_reads(user_id):
+        raise AssertionError(f"хранилище прочитано для {user_id}")
+
+    bot.storage.get_user_data = no_reads
+    asyncio.run(bot.daily_reminder(1))
+    asyncio.run(bot.daily_reminder(2))
+    [(chat_id, text)] = bot.application.bot.messages
+    assert chat_id == 1 and "Все привычки выполнены" in text
@@ -0,0 +1,26 @@
+import json
+from datetime import date
+
+from benchmarks.dataset import generate_dataset, write_dataset
+from history import HabitHistory
+
+
+def test_written_dataset_matches_generated_one(tmp_path):
+    path = tmp_path / "habits.json"
+    size = write_dataset(str(path), 50, habits=4, days=200, seed=3)
+    assert size == path.stat().st_size
+    assert json.loads(path.read_text(encoding="utf-8")) == generate_dataset(50, 4, 200, seed=3)
+
+
+def test_histories_fit_the_requested_shape():
+    today = date.today().toordinal()
+    varied = generate_dataset(200, habits=5, days=100, seed=1)
+    uniform = generate_dataset(20, habits=3, days=100, seed=1, uniform=True)
+
+    assert list(varied)[:2] == ["100000", "100001"]
+    assert {len(user["habits"]) for user in varied.values()} == {1, 2, 3, 4, 5}
+    assert {len(user["habits"]) for user in uniform.values()} == {3}
+    for user in list(varied.values()) + list(uniform.values()):
+        for habit in user["habits"]:
+            history = HabitHistory.from_json(habit["history"])
+            assert all(today - 100 < day <= today for day in history.ordinals())
@@ -0,0 +1,123 @@
+import time
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from delivery import PRIORITY_BULK, OutboundQueue
+
+
+def _send_with(error):
+    calls = []
+
+    async def callback():
+        calls.append(1)
+        if len(calls) == 1:
+            raise error
+        return "ok"
+
+    async def scenario():
+        queue = OutboundQueue(global_rate=1000, chat_rate=1000, backoff_base=0.01)
+        await queue.initialize()
+        try:
+            return await queue.process_request(callback, (), {}, "sendMessage",
+                                               {"chat_id": 1}, None)
+        finally:
+            await queue.shutdown()
+
+    return calls, scenario
+
+
+def test_bad_request_is_not_retried():
+    calls, scenario = _send_with(BadRequest("Can't parse entities"))
+    with pytest.raises(BadRequest):
+        asyncio.run(scenario())
+    assert len(calls) == 1
+
+
+def test_network_error_is_retried():
+    calls, scenario = _send_with(NetworkError("connection reset"))
+    assert asyncio.run(scenario()) == "ok"
+    assert len(calls) == 2
+
+
+def _recorder(order):
+    def make(label):
+        async def callback():
+            order.append(label)
+            return label
+        return callback
+    return make
+
+
+def test_replies_overtake_queued_reminders():
+    order = []
+    make = _recorder(order)
+
+    async def scenario():
+        queue = OutboundQueue(global_rate=50, chat_rate=1000)
+        await queue.initialize()
+        try:
+            bulk = [asyncio.create_task(queue.process_request(
+                make(f"bulk{n}"), (), {}, "sendMessage", {"chat_id": n}, PRIORITY_BULK))
+                for n in range(80)]
+            await asyncio.sleep(0.1)
+            await queue.process_request(make("reply"), (), {}, "sendMessage",
+                                        {"chat_id": 1000}, None)
+            await asyncio.gather(*bulk)
+        finally:
+            await queue.shutdown()
+
+    asyncio.run(scenario())
+    # Запас токенов и то, что успело уйти за 0.1 с, — рассылка; дальше ответ без очереди
+    assert order.index("reply") < 70
+    assert len(order) == 81
+
+
+def test_messages_to_one_chat_keep_order_and_interval():
+    order = []
+    make = _recorder(order)
+    sent_at = []
+
+    async def scenario():
+        queue = OutboundQueue(global_rate=1000, chat_rate=20)
+        await queue.initialize()
+        try:
+            async def send(n):
+                await queue.process_request(make(n), (), {}, "sendMessage", {"chat_id": 7}, None)
+                sent_at.append(time.monotonic())
+
+            await asyncio.gather(*(send(n) for n in range(5)))
+            return queue.stats()
+        finally:
+            await queue.shutdown()
+
+    stats = asyncio.run(scenario())
+    assert order == [0, 1, 2, 3, 4]
+    assert all(b - a >= 0.04 for a, b in zip(sent_at, sent_at[1:]))
+    assert stats["sent"] == 5 and stats["pending"] == {"interactive": 0, "bulk": 0}
+
+
+def test_retry_after_pauses_and_repeats():
+    calls = []
+
+    async def callback():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RetryAfter(0.2)
+        return "ok"
+
+    async def scenario():
+        queue = OutboundQueue(global_rate=1000, chat_rate=1000)
+        await queue.initialize()
+        try:
+            result = await queue.process_request(callback, (), {}, "sendMessage",
+                                                 {"chat_id": 1}, None)
+            return result, queue.stats()
+        finally:
+            await queue.shutdown()
+
+    result, stats = asyncio.run(scenario())
+    assert result == "ok"
+    assert calls[1] - calls[0] >= 0.2
+    assert (stats["retry_after"], stats["retries"]) == (1, 1)
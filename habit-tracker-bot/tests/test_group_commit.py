@@ -0,0 +1,62 @@
+import json
+import asyncio
+
+import config
+from storage import AsyncJSONStorage
+
+
+def _user(name):
+    return {"habits": [], "timezone": "UTC", "name": name}
+
+
+def _on_disk():
+    with open(config.DATA_FILE, encoding="utf-8") as f:
+        return {int(key): value["name"] for key, value in json.load(f).items()}
+
+
+def test_saves_during_flush_get_their_own_flush(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "GROUP_COMMIT_WINDOW_MS", 50)
+    storage = AsyncJSONStorage()
+    store_batch = storage._store_batch
+
+    async def slow_store_batch(batch):
+        await asyncio.sleep(0.2)
+        await store_batch(batch)
+    storage._store_batch = slow_store_batch
+
+    async def scenario():
+        await storage.save_user_data(1, _user("one"))
+        # Первый сброс начался и пишет медленно
+        await asyncio.sleep(0.1)
+        await storage.save_user_data(2, _user("two"))
+        await asyncio.wait_for(storage.save_user_data(3, _user("three"), durable=True), 2)
+        return dict(storage._pending)
+
+    assert asyncio.run(scenario()) == {}
+    assert _on_disk() == {1: "one", 2: "two", 3: "three"}
+
+
+def test_failed_flush_is_retried(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "GROUP_COMMIT_WINDOW_MS", 20)
+    storage = AsyncJSONStorage()
+    store_batch = storage._store_batch
+    failures = []
+
+    async def flaky_store_batch(batch):
+        if not failures:
+            failures.append(batch)
+            raise OSError("disk full")
+        await store_batch(batch)
+    storage._store_batch = flaky_store_batch
+
+    async def scenario():
+        await storage.save_user_data(1, _user("one"))
+        # Повторный сброс по таймеру, без новых сохранений
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            if not storage._pending and not storage._flush_tasks:
+                break
+        return dict(storage._pending)
+
+    assert asyncio.run(scenario()) == {}
+    assert failures and _on_disk() == {1: "one"}
@@ -0,0 +1,77 @@
+import asyncio
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import config
+from habit_bot import STATS_MAX_DAYS, HabitTrackerBot
+from history import HabitHistory
+
+USER_ID = 42
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def _update():
+    return SimpleNamespace(effective_user=SimpleNamespace(id=USER_ID, first_name="Test"),
+                           message=FakeMessage())
+
+
+def _habit(days):
+    today = date.today()
+    history = HabitHistory.from_days([today - timedelta(days=n) for n in range(days)])
+    return {"id": 1, "name": "Зарядка", "created": "2020-01-01", "history": history,
+            "streak": days, "longest_streak": days, "last_day": today.isoformat()}
+
+
+def _stats(bot, *args):
+    update = _update()
+    asyncio.run(bot.show_stats(update, SimpleNamespace(args=list(args))))
+    return update.message.replies
+
+
+def test_stats_with_huge_period_is_clamped(data_dir):
+    bot = HabitTrackerBot()
+    asyncio.run(bot.storage.save_user_data(USER_ID, {"habits": [_habit(3)], "timezone": "UTC"}))
+
+    [reply] = _stats(bot, "800000")
+    assert f"за последние {STATS_MAX_DAYS} дней" in reply
+    assert f"3/{STATS_MAX_DAYS} дн." in reply
+    assert "По годам" in reply
+
+
+def test_stats_default_period(data_dir):
+    bot = HabitTrackerBot()
+    asyncio.run(bot.storage.save_user_data(USER_ID, {"habits": [_habit(10)], "timezone": "UTC"}))
+
+    [reply] = _stats(bot)
+    assert "за последние 7 дней" in reply
+    assert "7/7 дн." in reply
+    assert "По месяцам" not in reply
+
+
+def test_stats_line_reports_queues(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "CONCURRENT_UPDATES", 64)
+    bot = HabitTrackerBot()
+
+    async def send():
+        async def callback():
+            return "ok"
+
+        await bot.outbound.initialize()
+        try:
+            await bot.outbound.process_request(callback, (), {}, "sendMessage",
+                                               {"chat_id": USER_ID}, None)
+        finally:
+            await bot.outbound.shutdown()
+
+    asyncio.run(send())
+    line = bot.stats_line()
+    assert "в работе 0 из 256" in line
+    assert "в очереди 0 ответов и 0 рассылок" in line
+    assert "отправлено 1, ошибок 0" in line
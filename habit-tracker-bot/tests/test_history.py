@@ -0,0 +1,127 @@
+import json
+import random
+from datetime import date
+
+from history import HabitHistory, day_string, encode_default
+from utils import current_streak, record_checkin, rolling_count
+
+BASE = date(2024, 1, 1).toordinal()
+
+
+def _random_days(rng, span=400, rate=None):
+    rate = rng.random() if rate is None else rate
+    return {BASE + offset for offset in range(span) if rng.random() < rate}
+
+
+def test_bitmap_matches_set_of_days():
+    rng = random.Random(10)
+    for _ in range(200):
+        expected = _random_days(rng)
+        history = HabitHistory.from_days(expected, BASE + rng.randrange(-30, 30))
+        # Отметки в случайном порядке, в том числе раньше начала карты и повторные
+        for _ in range(rng.randrange(20)):
+            ordinal = BASE + rng.randrange(-60, 460)
+            assert history.add(ordinal) == (ordinal not in expected)
+            expected.add(ordinal)
+
+        assert list(history.ordinals()) == sorted(expected)
+        assert len(history) == len(expected)
+        for ordinal in range(BASE - 70, BASE + 470):
+            assert (ordinal in history) == (ordinal in expected)
+
+        first = BASE + rng.randrange(-80, 480)
+        last = first + rng.randrange(-5, 200)
+        mask = history.mask_between(first, last)
+        assert mask == sum(1 << (day - first) for day in expected if first <= day <= last)
+
+        # JSON: битовая карта и старый список дат дают ту же историю
+        restored = HabitHistory.from_json(json.loads(json.dumps(history, default=encode_default)))
+        legacy = HabitHistory.from_json([day_string(day) for day in expected])
+        assert list(restored.ordinals()) == list(legacy.ordinals()) == sorted(expected)
+
+
+def _runs(days):
+    """Серии подряд идущих дней: (последняя серия, самая длинная)."""
+    run = longest = 0
+    for day in sorted(days):
+        run = run + 1 if day - 1 in days else 1
+        longest = max(longest, run)
+    return run, longest
+
+
+def test_incremental_streaks_match_full_recount():
+    rng = random.Random(11)
+    for _ in range(200):
+        habit = {"id": 1, "name": "x", "created": day_string(BASE), "history": []}
+        days = set()
+        day = BASE
+        for _ in range(rng.randrange(1, 60)):
+            if rng.random() < 0.15:
+                # Отметка задним числом
+                ordinal = day - rng.randrange(1, 20)
+            else:
+                day += rng.choice((0, 1, 1, 1, 2, 5))
+                ordinal = day
+            assert record_checkin(habit, ordinal) == (ordinal not in days)
+            days.add(ordinal)
+
+            streak, longest = _runs(days)
+            assert (habit["streak"], habit["longest_streak"]) == (streak, longest)
+            assert habit["last_day"] == day_string(max(days))
+            assert current_streak(habit, max(days) + 1) == streak
+            assert current_streak(habit, max(days) + 2) == 0
+
+
+def test_rolling_counts_follow_checkins_and_days():
+    rng = random.Random(12)
+    for _ in range(100):
+        habit = {"id": 1, "name": "x", "created": day_string(BASE), "history": []}
+        days = set()
+        today = BASE
+        for _ in range(rng.randrange(1, 80)):
+            today += rng.choice((0, 0, 1, 1, 3, 8, 40, 400))
+            if rng.random() < 0.7:
+                # Отметка сегодня или в пределах окна задним числом
+                ordinal = today - rng.choice((0, 0, 0, 1, 6, 29, 200))
+                record_checkin(habit, ordinal)
+                days.add(ordinal)
+            for window in (7, 30, 365, 90):
+                expected = sum(1 for day in days if today - window < day <= today)
+                assert rolling_count(habit, window, today) == expected
+
+
+def test_index_counts_match_brute_force():
+    rng = random.Random(13)
+    for _ in range(60):
+        expected = _random_days(rng, span=900)
+        history = HabitHistory.from_days(expected, BASE)
+        index = history.index()
+        # Отметки после построения индекса: в конце, задним числом и после конца карты
+        for _ in range(rng.randrange(10)):
+            ordinal = BASE + rng.randrange(0, 1000)
+            history.add(ordinal)
+            expected.add(ordinal)
+
+        for _ in range(30):
+            first = BASE + rng.randrange(-40, 1040)
+            last = first + rng.randrange(-3, 500)
+            in_range = [day for day in expected if first <= day <= last]
+            assert history.count_between(first, last) == len(in_range)
+            weekday = rng.randrange(7)
+            assert index.weekday_count(weekday, first, last) == sum(
+                1 for day in in_range if date.fromordinal(day).weekday() == weekday
+            )
+
+        for year in (2023, 2024, 2025, 2026):
+            months = [sum(1 for day in expected if (date.fromordinal(day).year,
+                                                    date.fromordinal(day).month) == (year, month))
+                      for month in range(1, 13)]
+            assert [index.month_count(year, month) for month in range(1, 13)] == months
+            assert index.year_count(year) == sum(months)
+
+        # Кеш месяцев обновляется новой отметкой
+        ordinal = BASE + rng.randrange(0, 1000)
+        day = date.fromordinal(ordinal)
+        before = index.month_count(day.year, day.month)
+        added = history.add(ordinal)
+        assert index.month_count(day.year, day.month) == before + added
@@ -0,0 +1,106 @@
+import json
+import asyncio
+
+import config
+from journal_storage import JournaledJSONStorage
+
+
+def _record(user_id, name):
+    return json.dumps({"op": "put", "user": str(user_id),
+                       "data": {"habits": [], "timezone": "UTC", "name": name}})
+
+
+async def _crash(storage):
+    """Остановка без финального сворачивания журнала — как при сбое процесса."""
+    storage._compact_task.cancel()
+    await asyncio.gather(storage._compact_task, return_exceptions=True)
+    await storage._wal.close()
+    JournaledJSONStorage._instance = None
+
+
+def test_replay_restores_record_without_trailing_newline(data_dir):
+    wal_path = f"{config.DATA_FILE}.wal"
+    # Сбой оборвал только перевод строки после последней записи
+    with open(wal_path, "w", encoding="utf-8") as f:
+        f.write(_record(1, "first") + "\n" + _record(2, "second"))
+
+    async def restart_and_write():
+        storage = JournaledJSONStorage()
+        assert (await storage.get_user_data(2))["name"] == "second"
+        await storage.save_user_data(3, {"habits": [], "timezone": "UTC", "name": "third"})
+        await _crash(storage)
+
+    async def restart_and_read():
+        storage = JournaledJSONStorage()
+        names = [(await storage.get_user_data(user_id)).get("name") for user_id in (1, 2, 3)]
+        await storage.close()
+        return names
+
+    asyncio.run(restart_and_write())
+    assert asyncio.run(restart_and_read()) == ["first", "second", "third"]
+
+
+def test_replay_truncates_torn_last_record(data_dir):
+    wal_path = f"{config.DATA_FILE}.wal"
+    with open(wal_path, "w", encoding="utf-8") as f:
+        f.write(_record(1, "first") + "\n" + _record(2, "second")[:20])
+
+    async def restart():
+        storage = JournaledJSONStorage()
+        first = await storage.get_user_data(1)
+        second = await storage.get_user_data(2)
+        await storage.close()
+        return first.get("name"), second.get("name")
+
+    assert asyncio.run(restart()) == ("first", None)
+
+
+def test_compaction_serializes_off_loop_and_survives_restart(data_dir, monkeypatch):
+    # Любой объём — в пул потоков
+    monkeypatch.setattr(config, "JSON_THREAD_KB", 0)
+    offloaded = []
+
+    async def write_and_compact():
+        storage = JournaledJSONStorage()
+        write_file = storage._json.write_file
+
+        async def tracked_write_file(path, data, size_hint):
+            offloaded.append(path)
+            return await write_file(path, data, size_hint)
+        storage._json.write_file = tracked_write_file
+
+        for user_id in range(1, 6):
+            await storage.save_user_data(user_id, {"habits": [], "timezone": "UTC",
+                                                   "name": str(user_id)})
+        await storage.compact()
+        await storage.save_user_data(6, {"habits": [], "timezone": "UTC", "name": "6"})
+        await _crash(storage)
+
+    async def restart_and_read():
+        storage = JournaledJSONStorage()
+        names = [(await storage.get_user_data(user_id)).get("name") for user_id in range(1, 7)]
+        await storage.close()
+        return names
+
+    asyncio.run(write_and_compact())
+    assert offloaded == [f"{config.DATA_FILE}.tmp"]
+    with open(config.DATA_FILE, encoding="utf-8") as f:
+        assert sorted(json.load(f)) == ["1", "2", "3", "4", "5"]
+    assert asyncio.run(restart_and_read()) == ["1", "2", "3", "4", "5", "6"]
+
+
+def test_close_shuts_down_json_process_pool(data_dir, monkeypatch):
+    # Любой снимок пишется через процесс
+    monkeypatch.setattr(config, "JSON_THREAD_KB", 0)
+    monkeypatch.setattr(config, "JSON_PROCESS_KB", 0.001)
+
+    async def scenario():
+        storage = JournaledJSONStorage()
+        await storage.save_user_data(1, {"habits": [], "timezone": "UTC", "name": "one"})
+        await storage.close()
+        return storage
+
+    storage = asyncio.run(scenario())
+    assert storage._json._process_pool is None
+    with open(config.DATA_FILE, encoding="utf-8") as f:
+        assert json.load(f)["1"]["name"] == "one"
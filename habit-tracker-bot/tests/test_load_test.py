@@ -0,0 +1,18 @@
+import asyncio
+
+import pytest
+
+import config
+from benchmarks.load_test import run
+
+
+@pytest.mark.parametrize("engine,days", [("json", 30), ("journal", 0), ("sqlite", 30)])
+def test_load_test_replays_scripts_without_errors(data_dir, monkeypatch, engine, days):
+    # run() сам направляет данные во временный каталог; monkeypatch вернёт настройки
+    monkeypatch.setattr(config, "STORAGE_ENGINE", config.STORAGE_ENGINE)
+
+    report = asyncio.run(run(6, 2, 2, days, 3, engine, False))
+    assert report["errors"] == {}
+    assert report["updates"] == sum(summary["count"] for summary in report["handlers"].values())
+    assert report["handlers"]["check"]["count"] == 6 * 2
+    assert report["bot_api_calls"]["sendMessage"] > 0
@@ -0,0 +1,207 @@
+import os
+import time
+import asyncio
+import multiprocessing
+from datetime import datetime, timezone
+
+import pytz
+
+import config
+from habit_bot import HabitTrackerBot
+from reminders import OwnerLock, ReminderScheduler
+
+SLOT = ("UTC", "09:00")
+
+
+def _scheduler(sent, batch_size=2):
+    async def send(user_id):
+        sent.append(user_id)
+    return ReminderScheduler(send, config.REMINDERS_FILE, "09:00", batch_size, 0)
+
+
+def _today():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def test_fire_sends_in_batches_and_finishes(data_dir):
+    sent = []
+    scheduler = _scheduler(sent)
+    for user_id in (5, 3, 1, 4, 2):
+        scheduler.schedule(user_id, *SLOT)
+
+    asyncio.run(scheduler._fire(SLOT))
+    assert sent == [1, 2, 3, 4, 5]
+    assert scheduler._progress["UTC 09:00"] == [_today(), 5, True]
+
+    # Завершённая сегодня рассылка не повторяется
+    asyncio.run(scheduler._fire(SLOT))
+    assert sent == [1, 2, 3, 4, 5]
+
+
+def test_interrupted_fire_resumes_after_last_user_when_slot_changes(data_dir):
+    sent = []
+    scheduler = _scheduler(sent)
+    for user_id in (10, 20, 30, 40):
+        scheduler.schedule(user_id, *SLOT)
+    # До перезапуска обработаны 10 и 20
+    scheduler._progress["UTC 09:00"] = [_today(), 20, False]
+    # Состав слота изменился: 10 ушёл, пришли 15 (до позиции) и 35
+    scheduler.unschedule(10)
+    scheduler.schedule(15, *SLOT)
+    scheduler.schedule(35, *SLOT)
+
+    asyncio.run(scheduler._fire(SLOT))
+    assert sent == [30, 35, 40]
+
+
+def test_progress_survives_restart(data_dir):
+    sent = []
+    scheduler = _scheduler(sent, batch_size=1)
+    scheduler.load()
+    for user_id in (1, 2, 3):
+        scheduler.schedule(user_id, *SLOT)
+
+    hanging = []
+
+    async def hang_on_second(user_id):
+        if user_id == 2:
+            hanging.append(user_id)
+            await asyncio.Event().wait()
+        sent.append(user_id)
+    scheduler._send = hang_on_second
+
+    async def scenario():
+        await scheduler.save()
+        # Процесс останавливается посреди рассылки второй пачки
+        task = asyncio.create_task(scheduler._fire(SLOT))
+        while not hanging:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    asyncio.run(scenario())
+    assert sent == [1]
+
+    restarted = _scheduler(sent, batch_size=1)
+    restarted.load()
+    asyncio.run(restarted._fire(SLOT))
+    assert sent == [1, 2, 3]
+
+
+def test_bot_schedules_stored_users_at_startup(data_dir):
+    bot = HabitTrackerBot()
+
+    async def scenario():
+        await bot.storage.save_user_data(1, {"habits": [], "timezone": "UTC"})
+        await bot.storage.save_user_data(2, {"habits": [], "timezone": "UTC", "remind_at": None})
+        await bot.storage.save_user_data(3, {"habits": [], "timezone": "Asia/Tokyo",
+                                             "remind_at": "07:30"})
+        # Остался в файле расписания, но в хранилище его уже нет
+        bot.reminders.schedule(4, "UTC")
+        await bot._schedule_stored_users()
+    asyncio.run(scenario())
+
+    assert bot.reminders._users == {1: ("UTC", config.REMINDER_TIME), 3: ("Asia/Tokyo", "07:30")}
+    assert bot.completions.status(1) == (0, 0)
+
+
+def _hold_lock(path, result, release):
+    lock = OwnerLock(path)
+    acquired = lock.try_acquire()
+    result.put(acquired)
+    if acquired:
+        release.wait(30)
+
+
+def _start_holder(path):
+    context = multiprocessing.get_context("spawn")
+    result, release = context.Queue(), context.Event()
+    process = context.Process(target=_hold_lock, args=(path, result, release))
+    process.start()
+    return process, result.get(timeout=30), release
+
+
+def _lock_is_free(path):
+    process, acquired, release = _start_holder(path)
+    release.set()
+    process.join(30)
+    return acquired
+
+
+def test_owner_lock_admits_one_process(data_dir):
+    path = str(data_dir / "reminders.json.lock")
+    holder, acquired, release = _start_holder(path)
+    try:
+        assert acquired
+        assert not OwnerLock(path).try_acquire()
+    finally:
+        release.set()
+        holder.join(30)
+    # Владелец завершился — блокировка свободна
+    lock = OwnerLock(path)
+    assert lock.try_acquire()
+    lock.release()
+
+
+def test_unloaded_scheduler_does_not_overwrite_state(data_dir):
+    scheduler = _scheduler([])
+    scheduler.schedule(1, *SLOT)
+    asyncio.run(scheduler.save())
+    assert not os.path.exists(config.REMINDERS_FILE)
+
+
+def test_shared_engine_owner_runs_scheduler_and_resyncs(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "STORAGE_ENGINE", "shared")
+    monkeypatch.setattr(config, "REMINDER_RESYNC_SECONDS", 0.05)
+    bot = HabitTrackerBot()
+    lock_path = f"{config.REMINDERS_FILE}.lock"
+
+    async def scenario():
+        await bot.storage.save_user_data(1, {"habits": [], "timezone": "UTC"})
+        await bot.setup_jobs(None)
+        while not bot.reminders._loaded:
+            await asyncio.sleep(0.01)
+        held = not await asyncio.to_thread(_lock_is_free, lock_path)
+        # Пользователь, появившийся через другой процесс, попадает в расписание при сверке
+        await bot.storage.save_user_data(2, {"habits": [], "timezone": "UTC"})
+        for _ in range(100):
+            if bot.reminders.is_scheduled(2):
+                break
+            await asyncio.sleep(0.01)
+        await bot.shutdown(None)
+        return held
+
+    assert asyncio.run(scenario())
+    assert bot.reminders.is_scheduled(1) and bot.reminders.is_scheduled(2)
+    assert _lock_is_free(lock_path)
+
+
+def test_slots_fire_at_next_local_time(data_dir):
+    scheduler = _scheduler([])
+    scheduler.load()
+    scheduler.schedule(1, "Asia/Tokyo", "07:30")
+    scheduler.schedule(2, "America/New_York", "21:05")
+    scheduler.schedule(3, "America/New_York", "21:05")
+
+    assert len(scheduler._next_fire) == 2
+    now = time.time()
+    for (zone, remind_at), fire_at in scheduler._next_fire.items():
+        local = datetime.fromtimestamp(fire_at, pytz.timezone(zone))
+        assert local.strftime("%H:%M") == remind_at
+        assert now < fire_at <= now + 25 * 3600
+
+
+def test_failed_send_does_not_stop_the_slot(data_dir):
+    sent = []
+
+    async def send(user_id):
+        if user_id == 2:
+            raise RuntimeError("Forbidden: bot was blocked by the user")
+        sent.append(user_id)
+
+    scheduler = ReminderScheduler(send, config.REMINDERS_FILE, "09:00", 2, 0)
+    for user_id in (1, 2, 3):
+        scheduler.schedule(user_id, *SLOT)
+
+    asyncio.run(scheduler._fire(SLOT))
+    assert sent == [1, 3]
+    assert scheduler._progress["UTC 09:00"] == [_today(), 3, True]
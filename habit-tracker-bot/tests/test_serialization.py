@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from history import HabitHistory
+from serialization import JSONOffloader, read_json_file
+
+DATA = {
+    str(user_id): {"habits": [{"id": 1, "name": "Зарядка",
+                               "history": HabitHistory.from_days(["2024-01-02"], "2024-01-01")}],
+                   "timezone": "UTC"}
+    for user_id in range(50)
+}
+
+# (thread_kb, process_kb): в цикле событий, в потоке, в отдельном процессе
+MODES = {"inline": (1 << 20, 0), "thread": (0, 0), "process": (0, 1)}
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_every_executor_writes_the_same_file(tmp_path, mode):
+    offloader = JSONOffloader(*MODES[mode], compact=True)
+    path = str(tmp_path / f"{mode}.json")
+
+    async def scenario():
+        written = await offloader.write_file(path, DATA, size_hint=4096)
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        return written, content, await offloader.loads(content)
+
+    try:
+        written, content, loaded = asyncio.run(scenario())
+        assert (offloader._process_pool is not None) == (mode == "process")
+    finally:
+        offloader.shutdown()
+
+    assert written == len(content)
+    assert loaded == read_json_file(path)
+    assert loaded["7"]["habits"][0] == {"id": 1, "name": "Зарядка",
+                                        "history": {"start": "2024-01-01", "bits": "Ag=="}}
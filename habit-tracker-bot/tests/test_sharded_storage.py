@@ -0,0 +1,85 @@
+import os
+import json
+import asyncio
+
+import pytest
+
+import config
+from sharded_storage import (
+    META_FILE, ShardedJSONStorage, migrate_json_to_shards, shard_file_name
+)
+
+
+def _user(name):
+    return {"habits": [], "timezone": "UTC", "name": name}
+
+
+def _shard(index):
+    with open(os.path.join(config.SHARDS_DIR, shard_file_name(index)), encoding="utf-8") as f:
+        return {int(key): value["name"] for key, value in json.load(f).items()}
+
+
+@pytest.fixture
+def sharded(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "STORAGE_ENGINE", "sharded")
+    monkeypatch.setattr(config, "SHARD_COUNT", 4)
+    with open(config.DATA_FILE, "w", encoding="utf-8") as f:
+        json.dump({str(user_id): _user(f"u{user_id}") for user_id in (1, 2, 5, 8)}, f)
+    return data_dir
+
+
+def _names(*user_ids):
+    async def scenario():
+        storage = ShardedJSONStorage()
+        names = [(await storage.get_user_data(user_id)).get("name") for user_id in user_ids]
+        await storage.close()
+        ShardedJSONStorage._instance = None
+        return names
+    return asyncio.run(scenario())
+
+
+def test_first_start_migrates_habits_json(sharded):
+    assert _names(1, 2, 5, 8) == ["u1", "u2", "u5", "u8"]
+    assert _shard(0) == {8: "u8"}
+    assert _shard(1) == {1: "u1", 5: "u5"}
+    assert _shard(2) == {2: "u2"}
+    assert not os.path.exists(os.path.join(config.SHARDS_DIR, shard_file_name(3)))
+    # Исходный файл остаётся как был
+    with open(config.DATA_FILE, encoding="utf-8") as f:
+        assert len(json.load(f)) == 4
+
+
+def test_write_rewrites_only_own_shard(sharded):
+    _names(1)
+    before = os.path.getmtime(os.path.join(config.SHARDS_DIR, shard_file_name(0)))
+
+    async def save():
+        storage = ShardedJSONStorage()
+        await storage.save_user_data(9, _user("u9"))
+        await storage.delete_user_data(5)
+        await storage.close()
+        ShardedJSONStorage._instance = None
+
+    asyncio.run(save())
+    assert _shard(1) == {1: "u1", 9: "u9"}
+    assert os.path.getmtime(os.path.join(config.SHARDS_DIR, shard_file_name(0))) == before
+    assert _names(9, 5) == ["u9", None]
+
+
+def test_changed_shard_count_is_rejected(sharded, monkeypatch):
+    _names(1)
+    monkeypatch.setattr(config, "SHARD_COUNT", 3)
+    with pytest.raises(ValueError, match="shard_count=4"):
+        _names(1)
+
+
+def test_interrupted_migration_runs_again(sharded):
+    # Сбой до записи meta.json: шарды частично записаны
+    os.makedirs(config.SHARDS_DIR)
+    with open(os.path.join(config.SHARDS_DIR, shard_file_name(1)), "w", encoding="utf-8") as f:
+        json.dump({"1": _user("stale")}, f)
+
+    assert _names(1, 5) == ["u1", "u5"]
+    with pytest.raises(ValueError):
+        migrate_json_to_shards(config.DATA_FILE, config.SHARDS_DIR, 4)
+    assert os.path.exists(os.path.join(config.SHARDS_DIR, META_FILE))
@@ -0,0 +1,65 @@
+import asyncio
+import multiprocessing
+
+import config
+from shared_storage import SharedJSONStorage
+
+ROUNDS = 40
+
+
+def _increment(data_file, rounds):
+    """Процесс бота: rounds транзакций над одним и тем же пользователем."""
+    config.DATA_FILE = data_file
+    config.GROUP_COMMIT_WINDOW_MS = 0
+
+    async def scenario():
+        storage = SharedJSONStorage()
+        for _ in range(rounds):
+            async with storage.user_transaction(1) as user_data:
+                user_data["count"] = user_data.get("count", 0) + 1
+                await storage.save_user_data(1, user_data)
+        await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_transactions_from_several_processes_are_not_lost(data_dir):
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_increment, args=(config.DATA_FILE, ROUNDS))
+                 for _ in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    async def read():
+        storage = SharedJSONStorage()
+        user_data = await storage.get_user_data(1)
+        await storage.close()
+        return user_data
+
+    assert asyncio.run(read())["count"] == 3 * ROUNDS
+
+
+def test_write_from_another_process_invalidates_cache(data_dir):
+    async def scenario():
+        reader = SharedJSONStorage()
+        await reader.save_user_data(1, {"habits": [], "timezone": "UTC", "name": "old"})
+        assert (await reader.get_user_data(1))["name"] == "old"
+
+        # Второй экземпляр — как другой процесс со своим кешем
+        SharedJSONStorage._instance = None
+        writer = SharedJSONStorage()
+        await writer.save_user_data(1, {"habits": [], "timezone": "UTC", "name": "new"})
+        await writer.close()
+
+        name = (await reader.get_user_data(1))["name"]
+        invalidations = reader.cache_stats()["invalidations"]
+        # Без чужих записей кеш больше не сбрасывается
+        await reader.get_user_data(1)
+        assert reader.cache_stats()["invalidations"] == invalidations
+        await reader.close()
+        return name
+
+    assert asyncio.run(scenario()) == "new"
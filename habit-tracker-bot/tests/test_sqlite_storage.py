@@ -0,0 +1,93 @@
+import json
+import asyncio
+
+import pytest
+
+import config
+from history import HabitHistory
+from sqlite_storage import SQLiteStorage, connect, load_user, migrate_json_to_sqlite, store_user
+from storage import create_storage
+
+
+def _habit(habit_id, name, days, **extra):
+    return {"id": habit_id, "name": name, "created": "2024-01-01",
+            "history": HabitHistory.from_days(days, "2024-01-01"), "streak": 0, **extra}
+
+
+def _days(habit):
+    return list(HabitHistory.from_json(habit["history"]))
+
+
+@pytest.fixture
+def db_path(data_dir, monkeypatch):
+    path = str(data_dir / "habits.db")
+    monkeypatch.setattr(config, "DATA_FILE", path)
+    return path
+
+
+def test_migration_keeps_histories_and_extra_fields(data_dir, db_path):
+    source = data_dir / "habits.json"
+    source.write_text(json.dumps({
+        # Старый формат истории — список дат
+        "1": {"habits": [{"id": 1, "name": "Бег", "created": "2024-01-01",
+                          "history": ["2024-01-03", "2024-01-02"], "streak": 2,
+                          "longest_streak": 2}],
+              "timezone": "Europe/Moscow", "created": "2024-01-01", "remind_at": "08:30"},
+        "2": {"habits": [], "timezone": "UTC", "created": "2024-02-01"}
+    }), encoding="utf-8")
+
+    assert migrate_json_to_sqlite(str(source), db_path) == 2
+
+    conn = connect(db_path)
+    try:
+        first, second = load_user(conn, 1), load_user(conn, 2)
+        assert load_user(conn, 3) is None
+    finally:
+        conn.close()
+    assert first["timezone"] == "Europe/Moscow" and first["remind_at"] == "08:30"
+    [habit] = first["habits"]
+    assert habit["name"] == "Бег" and habit["longest_streak"] == 2
+    assert _days(habit) == ["2024-01-02", "2024-01-03"]
+    assert second["habits"] == [] and second["created"] == "2024-02-01"
+
+
+def test_store_user_applies_only_differences(db_path):
+    conn = connect(db_path)
+    try:
+        with conn:
+            store_user(conn, 7, {"habits": [_habit(1, "a", ["2024-01-02", "2024-01-03"]),
+                                            _habit(2, "b", ["2024-01-05"])],
+                                 "timezone": "UTC", "created": "2024-01-01"})
+        with conn:
+            store_user(conn, 7, {"habits": [_habit(2, "b2", ["2024-01-05", "2024-01-06"]),
+                                            _habit(3, "c", [])],
+                                 "timezone": "UTC", "created": "2024-01-01"})
+        user = load_user(conn, 7)
+        rows = conn.execute("SELECT habit_id, day FROM checkins ORDER BY habit_id, day").fetchall()
+    finally:
+        conn.close()
+
+    assert [(habit["id"], habit["name"]) for habit in user["habits"]] == [(2, "b2"), (3, "c")]
+    # Отметки удалённой привычки ушли каскадом
+    assert rows == [(2, "2024-01-05"), (2, "2024-01-06")]
+
+
+def test_engine_is_chosen_by_extension_and_persists(db_path):
+    async def write():
+        storage = create_storage()
+        assert isinstance(storage, SQLiteStorage)
+        async with storage.user_transaction(5) as user_data:
+            user_data["habits"].append(_habit(1, "read", ["2024-03-01"]))
+            await storage.save_user_data(5, user_data)
+        await storage.close()
+        SQLiteStorage._instance = None
+
+    async def read():
+        storage = create_storage()
+        user_data = await storage.get_user_data(5)
+        await storage.close()
+        return user_data
+
+    asyncio.run(write())
+    user_data = asyncio.run(read())
+    assert [_days(habit) for habit in user_data["habits"]] == [["2024-03-01"]]
@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import config
+from storage import AsyncJSONStorage
+
+
+def _user(n):
+    return {"habits": [{"id": 1, "name": "x" * 400}], "timezone": "UTC", "n": n}
+
+
+def _resident_after_saves(monkeypatch, factor):
+    monkeypatch.setattr(config, "RESIDENT_DATASET", True)
+    monkeypatch.setattr(config, "RESIDENT_MAX_MB", 1)
+    monkeypatch.setattr(config, "RESIDENT_MEMORY_FACTOR", factor)
+    AsyncJSONStorage._instance = None
+    storage = AsyncJSONStorage()
+
+    async def scenario():
+        # ~50 КБ JSON
+        for user_id in range(100):
+            await storage.save_user_data(user_id, _user(user_id))
+        return storage._resident is not None, await storage.get_user_data(42)
+    return asyncio.run(scenario())
+
+
+def test_resident_budget_counts_memory_not_json(data_dir, monkeypatch):
+    resident, user = _resident_after_saves(monkeypatch, 5)
+    assert resident and user["n"] == 42
+
+    # Те же 50 КБ JSON при 50-кратном разрастании в памяти — больше 1 МБ
+    resident, user = _resident_after_saves(monkeypatch, 50)
+    assert not resident and user["n"] == 42
+
+
+def test_resident_save_writes_a_snapshot(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "RESIDENT_DATASET", True)
+    AsyncJSONStorage._instance = None
+    storage = AsyncJSONStorage()
+    write_file = storage._json.write_file
+
+    async def scenario():
+        await storage.save_user_data(1, _user(1))
+        user = await storage.get_user_data(1)
+
+        async def mutating_write(path, data, size_hint):
+            # Обработчики меняют данные, пока запись идёт вне цикла событий
+            user["late"] = True
+            user["habits"][0]["name"] = "changed"
+            storage._resident["2"] = _user(2)
+            return await write_file(path, data, size_hint)
+
+        monkeypatch.setattr(storage._json, "write_file", mutating_write)
+        user["n"] = 10
+        await storage.save_user_data(1, user)
+
+    asyncio.run(scenario())
+    with open(config.DATA_FILE, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert list(saved) == ["1"]
+    assert saved["1"]["n"] == 10
+    assert "late" not in saved["1"]
+    assert saved["1"]["habits"][0]["name"] == "x" * 400
+
+
+def test_transactions_of_one_user_are_serialized(data_dir):
+    async def scenario():
+        storage = AsyncJSONStorage()
+
+        async def increment():
+            async with storage.user_transaction(1) as user_data:
+                count = user_data.get("count", 0)
+                await asyncio.sleep(0)
+                user_data["count"] = count + 1
+                await storage.save_user_data(1, user_data)
+
+        await asyncio.gather(*(increment() for _ in range(30)))
+
+        # Транзакция другого пользователя не ждёт открытую транзакцию первого
+        other_done = asyncio.Event()
+
+        async def hold_first():
+            async with storage.user_transaction(1):
+                await asyncio.wait_for(other_done.wait(), timeout=5)
+
+        async def second():
+            async with storage.user_transaction(2):
+                other_done.set()
+
+        await asyncio.gather(hold_first(), second())
+        return (await storage.get_user_data(1))["count"]
+
+    assert asyncio.run(scenario()) == 30
+
+
+def test_concurrent_misses_share_one_load(data_dir):
+    storage = AsyncJSONStorage()
+    loads = []
+    load_user = storage._load_user
+
+    async def slow_load(user_id):
+        loads.append(user_id)
+        await asyncio.sleep(0.01)
+        return await load_user(user_id)
+
+    storage._load_user = slow_load
+
+    async def scenario():
+        await storage.save_user_data(1, _user(1))
+        storage._cache.clear()
+        results = await asyncio.gather(*(storage.get_user_data(1) for _ in range(10)))
+        return results
+
+    results = asyncio.run(scenario())
+    assert loads == [1]
+    assert all(user_data is results[0] for user_data in results)
+    assert storage.cache_stats()["coalesced"] == 9
+
+
+def test_save_during_load_is_not_overwritten_by_stale_read(data_dir):
+    storage = AsyncJSONStorage()
+    load_user = storage._load_user
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def slow_load(user_id):
+            user_data = await load_user(user_id)
+            started.set()
+            await asyncio.sleep(0.01)
+            return user_data
+
+        await storage.save_user_data(1, _user(1))
+        storage._cache.clear()
+        storage._load_user = slow_load
+        reader = asyncio.create_task(storage.get_user_data(1))
+        await started.wait()
+        await storage.save_user_data(1, _user(2))
+        await reader
+        return (await storage.get_user_data(1))["n"]
+
+    assert asyncio.run(scenario()) == 2
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+import config
+from history import HabitHistory
+from storage import create_storage
+
+ENGINES = ["json", "sharded", "journal", "shared", "sqlite"]
+
+
+@pytest.fixture(params=ENGINES)
+def engine(request, data_dir, monkeypatch):
+    if request.param == "sqlite":
+        monkeypatch.setattr(config, "DATA_FILE", str(data_dir / "habits.db"))
+    else:
+        monkeypatch.setattr(config, "STORAGE_ENGINE", request.param)
+    return request.param
+
+
+def _user(name, *days):
+    habit = {"id": 1, "name": name, "created": "2024-01-01",
+             "history": HabitHistory.from_days(days, "2024-01-01"), "streak": 0}
+    return {"habits": [habit], "timezone": "UTC", "created": "2024-01-01"}
+
+
+def _names(users):
+    return {user_id: user_data["habits"][0]["name"] for user_id, user_data in users}
+
+
+def test_iter_users_lists_every_stored_user(engine):
+    async def scenario():
+        storage = create_storage()
+        for user_id in (3, 1, 2):
+            await storage.save_user_data(user_id, _user(f"habit {user_id}", "2024-01-02"))
+        await storage.delete_user_data(2)
+        users = [item async for item in storage.iter_users()]
+        await storage.close()
+        return users
+
+    users = asyncio.run(scenario())
+    assert _names(users) == {1: "habit 1", 3: "habit 3"}
+    assert all("2024-01-02" in HabitHistory.from_json(data["habits"][0]["history"])
+               for _, data in users)
@@ -0,0 +1,61 @@
+import random
+from datetime import date, datetime, timezone
+
+import pytz
+
+from timezones import DayClock
+
+ZONES = ["Europe/Moscow", "UTC", "America/New_York", "Europe/London", "Asia/Kolkata",
+         "Australia/Lord_Howe", "Pacific/Kiritimati", "America/Santiago", "Asia/Beirut"]
+
+
+class FakeTimer:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _timestamp(*args) -> float:
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+def test_today_depends_on_user_timezone():
+    clock = DayClock(FakeTimer(_timestamp(2024, 3, 10, 22, 30)))
+    assert clock.today("Europe/Moscow") == date(2024, 3, 11)
+    assert clock.today("America/New_York") == date(2024, 3, 10)
+    assert clock.today("Pacific/Kiritimati") == date(2024, 3, 11)
+    # Неизвестный и пустой пояс — московское время
+    assert clock.today("Mars/Olympus") == clock.today(None) == date(2024, 3, 11)
+
+
+def test_cached_day_changes_exactly_at_local_midnight():
+    timer = FakeTimer(_timestamp(2024, 6, 1, 20, 59, 59))
+    clock = DayClock(timer)
+    assert clock.today("Europe/Moscow") == date(2024, 6, 1)
+    assert clock.next_midnight("Europe/Moscow") == _timestamp(2024, 6, 1, 21)
+    timer.now += 1
+    assert clock.today("Europe/Moscow") == date(2024, 6, 2)
+
+
+def test_today_matches_direct_conversion_across_dst():
+    rng = random.Random(16)
+    timer = FakeTimer(_timestamp(2023, 1, 1))
+    clock = DayClock(timer)
+    for _ in range(20000):
+        timer.now += rng.choice((1, 60, 3600, 4 * 3600, 86400 - 1, 86400 * 7))
+        name = rng.choice(ZONES)
+        expected = datetime.fromtimestamp(timer.now, pytz.timezone(name)).date()
+        assert clock.today(name) == expected, (name, timer.now)
+
+
+def test_midnight_skipped_or_repeated_by_dst():
+    # В Сантьяго переход на летнее и обратно происходит в полночь
+    tz = pytz.timezone("America/Santiago")
+    for start in (_timestamp(2023, 4, 1, 12), _timestamp(2023, 9, 2, 12)):
+        timer = FakeTimer(start)
+        clock = DayClock(timer)
+        for _ in range(24 * 60):
+            timer.now += 60
+            assert clock.today("America/Santiago") == datetime.fromtimestamp(timer.now, tz).date()
@@ -0,0 +1,63 @@
+import random
+import asyncio
+
+from telegram import Update
+
+from update_processor import PerUserUpdateProcessor, update_user_key
+
+
+def _update(update_id, user_id):
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 0,
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": user_id, "is_bot": False, "first_name": "U"}, "text": "/check 1"}
+    }, None)
+
+
+def test_user_order_is_kept_while_users_run_concurrently():
+    rng = random.Random(20)
+    started = {}
+    running = {"now": 0, "max": 0, "users": set()}
+    overlap = []
+
+    async def handler(user_id, n):
+        started.setdefault(user_id, []).append(n)
+        overlap.append(user_id in running["users"])
+        running["users"].add(user_id)
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(rng.random() / 100)
+        running["now"] -= 1
+        running["users"].discard(user_id)
+
+    async def scenario():
+        processor = PerUserUpdateProcessor(max_concurrent_updates=3)
+        await processor.initialize()
+        tasks = []
+        for n in range(8):
+            for user_id in (1, 2, 3, 4):
+                update = _update(n * 10 + user_id, user_id)
+                tasks.append(asyncio.create_task(
+                    processor.process_update(update, handler(user_id, n))))
+                await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return processor.stats()
+
+    stats = asyncio.run(scenario())
+    assert all(started[user_id] == list(range(8)) for user_id in (1, 2, 3, 4))
+    assert not any(overlap)
+    assert 1 < running["max"] <= 3
+    # Очереди пользователей удаляются, когда пустеют
+    assert stats["users_queued"] == 0 and stats["in_flight"] == 0
+
+
+def test_update_key_falls_back_to_chat():
+    assert update_user_key(_update(1, 42)) == 42
+    channel_post = Update.de_json({
+        "update_id": 2,
+        "channel_post": {"message_id": 1, "date": 0, "chat": {"id": -100, "type": "channel"},
+                         "text": "x"}
+    }, None)
+    assert update_user_key(channel_post) == -100
+    assert update_user_key(object()) is None
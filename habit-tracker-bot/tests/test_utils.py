@@ -0,0 +1,49 @@
+import random
+from datetime import date, timedelta
+
+import utils
+from history import HabitHistory
+from utils import _calendar_cell, format_habit_list, get_week_calendar, record_checkin
+
+TODAY = date(2024, 5, 15)
+
+
+def test_precomputed_week_calendar_matches_cell_by_cell_rendering():
+    rng = random.Random(15)
+    for _ in range(300):
+        today = TODAY + timedelta(days=rng.randrange(7))
+        days = [today - timedelta(days=k) for k in range(10) if rng.random() < 0.5]
+        history = HabitHistory.from_days(days, "2024-01-01")
+        expected = " ".join(
+            _calendar_cell(day.weekday(), day in history)
+            for day in (today - timedelta(days=6 - k) for k in range(7))
+        )
+        assert get_week_calendar(history, today=today) == expected
+
+
+def _fresh(habits, today):
+    utils._rendered_habits.clear()
+    return format_habit_list(habits, today)
+
+
+def test_cached_habit_list_follows_checkins_renames_and_days():
+    habits = [{"id": 1, "name": "Бег", "created": "2024-01-01", "history": []},
+              {"id": 2, "name": "Чтение", "created": "2024-01-01", "history": []}]
+    record_checkin(habits[0], TODAY - timedelta(days=1))
+    first = format_habit_list(habits, TODAY)
+    assert format_habit_list(habits, TODAY) == first == _fresh(habits, TODAY)
+
+    record_checkin(habits[0], TODAY)
+    after_checkin = format_habit_list(habits, TODAY)
+    assert after_checkin != first
+    assert "Серия: 2 дн." in after_checkin
+    assert after_checkin == _fresh(habits, TODAY)
+
+    habits[1]["name"] = "Книги"
+    assert "Книги" in format_habit_list(habits, TODAY)
+
+    # Новый день: серия ещё не прервана, неделя сдвинулась
+    tomorrow = TODAY + timedelta(days=1)
+    assert format_habit_list(habits, tomorrow) == _fresh(habits, tomorrow)
+    # Порядок изменился (привычку удалили) — номера перерисованы
+    assert format_habit_list(habits[1:], tomorrow).count("1. **Книги**") == 1
@@ -0,0 +1,110 @@
+import json
+import time
+import asyncio
+
+import pytest
+from telegram import Update
+
+import config
+import workers
+from sharded_storage import migrate_json_to_shards
+from workers import check_worker_data, split_json_for_workers, worker_path
+
+
+def _write_users(path, *user_ids):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({str(user_id): {"habits": [], "name": str(user_id)} for user_id in user_ids}, f)
+
+
+def test_cluster_refuses_unsplit_data(data_dir):
+    _write_users(config.DATA_FILE, 1, 2, 3)
+    with pytest.raises(ValueError, match="migrate.py workers"):
+        check_worker_data(2)
+
+    assert split_json_for_workers(config.DATA_FILE, 2) == [1, 2]
+    check_worker_data(2)
+    # Разделено на 2, а запускается 3 обработчика — и наоборот
+    with pytest.raises(ValueError):
+        check_worker_data(3)
+    with pytest.raises(ValueError):
+        check_worker_data(1)
+
+
+def test_cluster_starts_without_any_data(data_dir):
+    check_worker_data(4)
+
+
+def test_cluster_rejects_sqlite(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "DATA_FILE", str(data_dir / "habits.db"))
+    with pytest.raises(ValueError, match="SQLite"):
+        check_worker_data(2)
+
+
+def test_split_reads_shards(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "STORAGE_ENGINE", "sharded")
+    source = str(data_dir / "source.json")
+    _write_users(source, 1, 2, 3, 4)
+    migrate_json_to_shards(source, config.SHARDS_DIR, 8)
+    with pytest.raises(ValueError):
+        check_worker_data(2)
+
+    assert split_json_for_workers(config.DATA_FILE, 2) == [2, 2]
+    with open(worker_path(config.DATA_FILE, 1), encoding="utf-8") as f:
+        assert sorted(json.load(f)) == ["1", "3"]
+    check_worker_data(2)
+
+
+def test_split_refuses_uncompacted_journal(data_dir):
+    _write_users(config.DATA_FILE, 1)
+    with open(f"{config.DATA_FILE}.wal", "w", encoding="utf-8") as f:
+        f.write('{"op":"del","user":"1"}\n')
+    with pytest.raises(ValueError, match="не свёрнут"):
+        split_json_for_workers(config.DATA_FILE, 2)
+
+
+def _exit_at_once(index, worker_count, inbox):
+    pass
+
+
+def _never_read(index, worker_count, inbox):
+    time.sleep(60)
+
+
+def _update(user_id):
+    return Update.de_json({
+        "update_id": user_id,
+        "message": {"message_id": 1, "date": 0, "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": user_id, "is_bot": False, "first_name": "U"}, "text": "/start"}
+    }, None)
+
+
+def test_router_restarts_dead_worker(data_dir, monkeypatch):
+    monkeypatch.setattr(workers, "_worker_main", _exit_at_once)
+    router = workers.UpdateRouter(1)
+    router.start_workers()
+    first = router._processes[0]
+    first.join(30)
+
+    asyncio.run(router.route(_update(7), None))
+    assert router.restarts == [1] and router.routed == [1]
+    assert router._processes[0] is not first
+    router.stop_workers(timeout=5)
+    assert not router._processes[0].is_alive()
+
+
+def test_router_gives_up_on_stuck_worker(data_dir, monkeypatch):
+    monkeypatch.setattr(workers, "_worker_main", _never_read)
+    monkeypatch.setattr(config, "WORKER_QUEUE_SIZE", 1)
+    monkeypatch.setattr(config, "WORKER_PUT_TIMEOUT", 0.2)
+    router = workers.UpdateRouter(1)
+    router.start_workers()
+    try:
+        asyncio.run(router.route(_update(7), None))
+        with pytest.raises(RuntimeError, match="не принимает"):
+            asyncio.run(router.route(_update(8), None))
+        assert router.routed == [1]
+    finally:
+        started = time.monotonic()
+        router.stop_workers(timeout=0.5)
+    assert time.monotonic() - started < 10
+    assert not router._processes[0].is_alive()
@@ -0,0 +1,78 @@
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Callable, Optional
+
+import pytz
+
+DEFAULT_TIMEZONE = "Europe/Moscow"
+
+
+class DayClock:
+    """
+    Местная дата пользователей по их часовым поясам.
+
+    Объекты поясов создаются один раз. Для каждого пояса запоминается
+    текущая местная дата и момент следующей местной полуночи, поэтому
+    today() до полуночи — это сравнение с числом, без расчётов по часовому поясу.
+    Новая дата пояса вычисляется один раз после его полуночи. Данные, которые
+    зависят от дня (дневной индекс, скользящие счётчики привычек), хранят номер
+    своего дня и сверяют его с today(), поэтому обход пользователей в полночь не нужен.
+    """
+
+    def __init__(self, timer: Callable[[], float] = time.time):
+        self._timer = timer
+        self._zones: Dict[str, Any] = {}
+        # Пояс -> (местная дата, UNIX-время следующей местной полуночи)
+        self._days: Dict[str, tuple] = {}
+
+    def zone(self, name: Optional[str]):
+        """Объект часового пояса (неизвестный пояс заменяется на московский)."""
+        name = name or DEFAULT_TIMEZONE
+        tz = self._zones.get(name)
+        if tz is None:
+            try:
+                tz = pytz.timezone(name)
+            except pytz.exceptions.UnknownTimeZoneError:
+                tz = pytz.timezone(DEFAULT_TIMEZONE)
+            self._zones[name] = tz
+        return tz
+
+    @staticmethod
+    def is_valid(name: str) -> bool:
+        return name in pytz.all_timezones_set
+
+    def _compute(self, name: str, now: float) -> tuple:
+        tz = self.zone(name)
+        local_now = datetime.fromtimestamp(now, tz)
+        today = local_now.date()
+        midnight = tz.localize(datetime.combine(today + timedelta(days=1), datetime.min.time()))
+        entry = (today, midnight.timestamp())
+        self._days[name] = entry
+        return entry
+
+    def today(self, name: Optional[str] = None) -> date:
+        """Местная дата в поясе name."""
+        name = name or DEFAULT_TIMEZONE
+        now = self._timer()
+        entry = self._days.get(name)
+        if entry is None or now >= entry[1]:
+            entry = self._compute(name, now)
+        return entry[0]
+
+    def now(self, name: Optional[str] = None) -> datetime:
+        """Текущее местное время в поясе name."""
+        return datetime.fromtimestamp(self._timer(), self.zone(name))
+
+    def next_midnight(self, name: Optional[str] = None) -> float:
+        """UNIX-время следующей местной полуночи в поясе name."""
+        self.today(name)
+        return self._days[name or DEFAULT_TIMEZONE][1]
+
+
+# Общие часы бота
+clock = DayClock()
+
+
+def user_today(user_data: Dict[str, Any]) -> date:
+    """Местная дата пользователя по его полю timezone."""
+    return clock.today(user_data.get("timezone"))
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Dict, Any, Awaitable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def update_user_key(update: object) -> Optional[int]:
+    """Пользователь (или чат), к которому относится обновление."""
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+    return None
+
+
+class _UserQueue:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений разных пользователей с сохранением
+    порядка для одного пользователя.
+
+    Обновления одного пользователя выстраиваются в очередь (asyncio.Lock
+    будит ожидающих по порядку прихода), обновления разных пользователей
+    обрабатываются одновременно — не больше max_concurrent_updates сразу.
+    Принятых, но ещё не обработанных обновлений не больше max_pending:
+    остальные ждут в Application, и память не растёт без предела, если
+    один пользователь шлёт обновления быстрее, чем они обрабатываются.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending: Optional[int] = None):
+        super().__init__(max_pending or max_concurrent_updates * 4)
+        self._workers = max_concurrent_updates
+        self._running: Optional[asyncio.Semaphore] = None
+        self._queues: Dict[Any, _UserQueue] = {}
+
+    async def initialize(self):
+        self._running = asyncio.Semaphore(self._workers)
+
+    async def shutdown(self):
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        key = update_user_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _UserQueue()
+        queue.users += 1
+        try:
+            async with queue.lock:
+                async with self._running:
+                    await coroutine
+        finally:
+            queue.users -= 1
+            if queue.users == 0:
+                del self._queues[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.current_concurrent_updates,
+            "max_pending": self.max_concurrent_updates,
+            "workers": self._workers,
+            "users_queued": len(self._queues)
+        }
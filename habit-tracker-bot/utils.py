@@ -1,12 +1,23 @@
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
-import pytz
+import weakref
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import List, Dict, Any, Union, Optional
+import calendar
 
+from history import HabitHistory, Day, habit_history, day_ordinal, day_string
+from timezones import clock
 
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+MONTHS = ["Янв", "Фев", "Мар", "Апр", "Май", "Июн",
+          "Июл", "Авг", "Сен", "Окт", "Ноя", "Дек"]
+
+
+@lru_cache(maxsize=4096)
 def format_progress_bar(done: int, total: int, width: int = 5) -> str:
     """
     Создает текстовый прогресс-бар.
     Пример: ▰▰▰▱▱ 60%
+    Аргументы — небольшие целые, поэтому готовые строки кешируются.
     """
     if total == 0:
         return "▱" * width + " 0%"
@@ -17,38 +28,63 @@ def format_progress_bar(done: int, total: int, width: int = 5) -> str:
     return f"{bar} {percentage}%"
 
 
-def get_week_calendar(history: List[str], days: int = 7) -> str:
+def _calendar_cell(weekday: int, done: bool) -> str:
+    if done:
+        emoji = "✅"
+    elif weekday >= 5:  # Суббота и воскресенье
+        emoji = "🔘"
+    else:
+        emoji = "❌"
+    return f"{WEEKDAYS[weekday]}:{emoji}"
+
+
+def _build_calendar_table() -> List[List[str]]:
+    """
+    Все недельные календари заранее: строка зависит только от дня недели
+    сегодня и 7-битной маски отметок (бит k — день today - 6 + k).
+    """
+    table = []
+    for today_weekday in range(7):
+        row = []
+        for mask in range(1 << 7):
+            row.append(" ".join(
+                _calendar_cell((today_weekday - 6 + k) % 7, bool(mask & (1 << k)))
+                for k in range(7)
+            ))
+        table.append(row)
+    return table
+
+
+_WEEK_CALENDARS = _build_calendar_table()
+
+
+def get_week_calendar(history: Union[HabitHistory, List[str]], days: int = 7,
+                      today: Optional[date] = None) -> str:
     """
     Создает календарь выполнения за неделю.
     Пример: Пн:✅ Вт:❌ Ср:🔘 Чт:✅ Пт:🔘 Сб:🔘 Вс:🔘
     """
-    today = datetime.now().date()
-    weekdays = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
-    result = []
+    today = today or datetime.now().date()
+    if days == 7:
+        history = HabitHistory.from_json(history)
+        mask = history.mask_between(today - timedelta(days=6), today)
+        return _WEEK_CALENDARS[today.weekday()][mask]
 
+    result = []
     for i in range(days):
-        date = today - timedelta(days=i)
-        date_str = date.strftime("%Y-%m-%d")
-
-        if date_str in history:
-            emoji = "✅"
-        elif date.weekday() >= 5:  # Суббота и воскресенье
-            emoji = "🔘"
-        else:
-            emoji = "❌"
-
-        result.append(f"{weekdays[date.weekday()]}:{emoji}")
+        day = today - timedelta(days=i)
+        result.append(_calendar_cell(day.weekday(), day.strftime("%Y-%m-%d") in history))
 
     return " ".join(reversed(result))
 
 
-def calculate_streak(history: List[str]) -> int:
+def calculate_streak(history: Union[HabitHistory, List[str]]) -> int:
     """Рассчитывает текущую серию выполненных дней подряд."""
     if not history:
         return 0
 
     today = datetime.now().date()
-    dates = sorted([datetime.strptime(d, "%Y-%m-%d").date() for d in history])
+    dates = HabitHistory.from_json(history)
 
     streak = 0
     current_date = today
@@ -61,37 +97,202 @@ def calculate_streak(history: List[str]) -> int:
     return streak
 
 
+# Окна (в днях), для которых число отметок хранится в привычке готовым
+ROLLING_WINDOWS = (7, 30, 365)
+
+
+def _roll_forward(habit: Dict[str, Any], today: int) -> Dict[str, Any]:
+    """
+    Перенос скользящих счётчиков habit["rolling"] на день today.
+    Сдвиг на k дней стоит O(k): вычитаются выпавшие из окна дни и
+    добавляются вошедшие. Без счётчиков (или при сдвиге назад) — полный расчёт.
+    """
+    history = habit_history(habit)
+    rolling = habit.get("rolling")
+    as_of = day_ordinal(rolling["day"]) if rolling and rolling.get("day") else None
+
+    if as_of is None or as_of > today:
+        rolling = {"day": day_string(today)}
+        for window in ROLLING_WINDOWS:
+            rolling[str(window)] = history.count_between(today - window + 1, today)
+        habit["rolling"] = rolling
+    elif as_of < today:
+        entered = history.count_between(as_of + 1, today)
+        for window in ROLLING_WINDOWS:
+            if today - as_of >= window:
+                rolling[str(window)] = history.count_between(today - window + 1, today)
+            else:
+                left = history.count_between(as_of - window + 1, today - window)
+                rolling[str(window)] += entered - left
+        rolling["day"] = day_string(today)
+    return rolling
+
+
+def rolling_count(habit: Dict[str, Any], window: int, today: Optional[Day] = None) -> int:
+    """Число отметок за последние window дней (для окон из ROLLING_WINDOWS — O(1))."""
+    today_ordinal = day_ordinal(today) if today is not None else date.today().toordinal()
+    if window not in ROLLING_WINDOWS:
+        return habit_history(habit).last_days(window, today_ordinal)
+    return _roll_forward(habit, today_ordinal)[str(window)]
+
+
+def _count_in_rolling(habit: Dict[str, Any], ordinal: int):
+    """Учёт новой отметки в скользящих счётчиках (бит в истории уже выставлен)."""
+    rolling = habit.get("rolling")
+    if not rolling or not rolling.get("day") or ordinal > day_ordinal(rolling["day"]):
+        # Новый день: перенос окна сам посчитает вошедшую отметку
+        _roll_forward(habit, ordinal)
+        return
+    as_of = day_ordinal(rolling["day"])
+    for window in ROLLING_WINDOWS:
+        if ordinal > as_of - window:
+            rolling[str(window)] += 1
+
+
+def recompute_streak(habit: Dict[str, Any]):
+    """
+    Полный пересчёт серий привычки по истории за один проход.
+    Нужен только для старых записей, отметок задним числом и смены часового пояса.
+    """
+    habit["version"] = habit.get("version", 0) + 1
+    longest = run = 0
+    last = None
+    for ordinal in habit_history(habit).ordinals():
+        run = run + 1 if last is not None and ordinal == last + 1 else 1
+        longest = max(longest, run)
+        last = ordinal
+
+    habit["streak"] = run
+    habit["longest_streak"] = longest
+    habit["last_day"] = day_string(last) if last is not None else None
+
+
+def record_checkin(habit: Dict[str, Any], day: Optional[Day] = None) -> bool:
+    """
+    Отметка привычки за день (по умолчанию сегодня) с обновлением серий за O(1):
+    streak — серия, заканчивающаяся last_day, longest_streak — лучшая серия.
+    Возвращает False, если день уже был отмечен.
+    """
+    ordinal = day_ordinal(day) if day is not None else date.today().toordinal()
+    if not habit_history(habit).add(ordinal):
+        return False
+    habit["version"] = habit.get("version", 0) + 1
+    _count_in_rolling(habit, ordinal)
+
+    last_day = habit.get("last_day")
+    last = day_ordinal(last_day) if last_day else None
+    if "longest_streak" not in habit or (last is not None and ordinal < last):
+        # Запись старого формата или отметка задним числом
+        recompute_streak(habit)
+        return True
+
+    habit["streak"] = habit.get("streak", 0) + 1 if last is not None and ordinal == last + 1 else 1
+    habit["longest_streak"] = max(habit["longest_streak"], habit["streak"])
+    habit["last_day"] = day_string(ordinal)
+    return True
+
+
+def current_streak(habit: Dict[str, Any], today: Optional[Day] = None) -> int:
+    """Текущая серия: сохранённая, если она не прервалась (отметка сегодня или вчера)."""
+    if "longest_streak" not in habit:
+        # Запись старого формата: серии ещё не считались по истории
+        recompute_streak(habit)
+    last_day = habit.get("last_day")
+    if not last_day:
+        return 0
+    today_ordinal = day_ordinal(today) if today is not None else date.today().toordinal()
+    return habit.get("streak", 0) if day_ordinal(last_day) >= today_ordinal - 1 else 0
+
+
+def format_period_breakdown(habits: List[Dict[str, Any]], start: date, end: date) -> List[str]:
+    """
+    Разбивка отметок всех привычек за [start, end]: по месяцам (по годам,
+    если месяцев больше 24) и по дням недели. Считается по индексам
+    префиксных сумм, поэтому не зависит от длины истории.
+    """
+    indexes = [habit_history(habit).index() for habit in habits]
+
+    periods = []
+    if (end.year - start.year) * 12 + end.month - start.month >= 24:
+        title = "🗓 **По годам:**"
+        for year in range(start.year, end.year + 1):
+            periods.append((str(year), date(year, 1, 1), date(year, 12, 31), (year, None)))
+    else:
+        title = "🗓 **По месяцам:**"
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            last_day = calendar.monthrange(year, month)[1]
+            periods.append((f"{MONTHS[month - 1]} {year}", date(year, month, 1),
+                            date(year, month, last_day), (year, month)))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    lines = [f"\n{title}"]
+    for label, period_start, period_end, (year, month) in periods:
+        first, last = max(period_start, start), min(period_end, end)
+        if (first, last) == (period_start, period_end):
+            # Период целиком внутри отчёта — берём кешированный итог
+            done = sum(index.year_count(year) if month is None else index.month_count(year, month)
+                       for index in indexes)
+        else:
+            done = sum(index.count_between(first, last) for index in indexes)
+        possible = ((last - first).days + 1) * len(habits)
+        lines.append(f"• {label}: {done} | {format_progress_bar(done, possible, 5)}")
+
+    lines.append("\n📆 **По дням недели:**")
+    full_weeks, rest = divmod((end - start).days + 1, 7)
+    for weekday in range(7):
+        weekday_days = full_weeks + (1 if (weekday - start.weekday()) % 7 < rest else 0)
+        done = sum(index.weekday_count(weekday, start, end) for index in indexes)
+        lines.append(f"• {WEEKDAYS[weekday]}: {format_progress_bar(done, weekday_days * len(habits), 5)}")
+    return lines
+
+
 def get_timezone_time(user_timezone: str = "Europe/Moscow") -> datetime:
-    """Получение текущего времени в часовом поясе пользователя."""
-    try:
-        tz = pytz.timezone(user_timezone)
-        return datetime.now(tz)
-    except pytz.exceptions.UnknownTimeZoneError:
-        # Возвращаем время по умолчанию (Москва)
-        return datetime.now(pytz.timezone("Europe/Moscow"))
+    """
+    Получение текущего времени в часовом поясе пользователя.
+    Объекты поясов кешируются в timezones.clock; неизвестный пояс — Москва.
+    """
+    return clock.now(user_timezone)
+
 
+# Отрисованные блоки привычек: история привычки -> (ключ, текст).
+# Ключ включает version, которую меняет каждая отметка, и дату, поэтому
+# неизменная привычка перерисовывается не чаще раза в день.
+_rendered_habits: "weakref.WeakKeyDictionary[HabitHistory, tuple]" = weakref.WeakKeyDictionary()
 
-def format_habit_list(habits: List[Dict[str, Any]]) -> str:
+
+def _render_habit(position: int, habit: Dict[str, Any], today: date) -> str:
+    history = habit_history(habit)
+    key = (position, habit["name"], habit.get("version", 0), today)
+    cached = _rendered_habits.get(history)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    streak = current_streak(habit, today)
+    total_days = len(history)
+
+    # Прогресс за последние 7 дней
+    week_progress = rolling_count(habit, 7, today)
+
+    block = (
+        f"{position}. **{habit['name']}**\n"
+        f"   🔥 Серия: {streak} дн. | 📅 Всего: {total_days} дн.\n"
+        f"   📊 Неделя: {week_progress}/7 | {format_progress_bar(week_progress, 7, 5)}\n"
+        f"   {get_week_calendar(history, today=today)}"
+    )
+    _rendered_habits[history] = (key, block)
+    return block
+
+
+def format_habit_list(habits: List[Dict[str, Any]], today: Optional[date] = None) -> str:
     """Форматирует список привычек для красивого отображения."""
     if not habits:
         return "📭 У вас пока нет привычек. Добавьте первую с помощью /add_habit"
 
+    today = today or datetime.now().date()
     lines = ["📋 **Ваши привычки:**", ""]
 
     for i, habit in enumerate(habits, 1):
-        streak = habit.get("streak", 0)
-        total_days = len(habit.get("history", []))
-
-        # Прогресс за последние 7 дней
-        week_history = [d for d in habit.get("history", [])
-                        if (datetime.now().date() - datetime.strptime(d, "%Y-%m-%d").date()).days < 7]
-        week_progress = len(week_history)
-
-        lines.append(
-            f"{i}. **{habit['name']}**\n"
-            f"   🔥 Серия: {streak} дн. | 📅 Всего: {total_days} дн.\n"
-            f"   📊 Неделя: {week_progress}/7 | {format_progress_bar(week_progress, 7, 5)}\n"
-            f"   {get_week_calendar(habit.get('history', []))}"
-        )
-
-    return "\n".join(lines)
\ No newline at end of file
+        lines.append(_render_habit(i, habit, today))
+
+    return "\n".join(lines)
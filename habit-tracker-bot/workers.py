@@ -0,0 +1,281 @@
+"""
+Многопроцессный режим: диспетчер и WORKERS процессов-обработчиков.
+
+Диспетчер получает обновления (polling или webhook, как обычный бот) и по
+порядку кладёт каждое в очередь обработчика user_id % WORKERS. Все
+обновления пользователя попадают в один процесс, где PerUserUpdateProcessor
+сохраняет их порядок. Каждый обработчик — обычный HabitTrackerBot со своими
+файлами данных, кешем, напоминаниями и долей общего лимита отправки.
+Упавший обработчик перезапускается при следующем обновлении для него;
+если живой обработчик не разбирает очередь WORKER_PUT_TIMEOUT секунд,
+обновление отбрасывается с ошибкой.
+
+Перед первым запуском данные обычного режима делятся по обработчикам:
+    python migrate.py workers --workers 4
+(без этого диспетчер не запустится). Хранилище SQLite в этом режиме
+не поддерживается.
+
+Запуск:
+    WORKERS=4 python habit_bot.py
+"""
+import os
+import time
+import queue
+import signal
+import asyncio
+import importlib
+import threading
+import multiprocessing
+from typing import Dict, Any, List, Optional
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+import config
+from serialization import read_json_file, write_json_atomic
+from sharded_storage import META_FILE, read_shards
+from sqlite_storage import is_sqlite_path
+from update_processor import update_user_key
+
+
+def worker_index(user_id: int, worker_count: int) -> int:
+    """Номер процесса-обработчика пользователя."""
+    return int(user_id) % worker_count
+
+
+def worker_path(path: str, index: int) -> str:
+    """Путь к файлу обработчика: habits.json -> habits.w0.json."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.w{index}{ext}"
+
+
+def worker_environment(index: int, worker_count: int) -> Dict[str, str]:
+    """Настройки, которыми процесс-обработчик отличается от обычного бота."""
+    return {
+        "WORKERS": "1",
+        "DATA_FILE": worker_path(config.DATA_FILE, index),
+        "SHARDS_DIR": worker_path(config.SHARDS_DIR, index),
+        "REMINDERS_FILE": worker_path(config.REMINDERS_FILE, index),
+        "OUTBOUND_GLOBAL_RATE": str(config.OUTBOUND_GLOBAL_RATE / worker_count)
+    }
+
+
+def _sharded() -> bool:
+    return config.STORAGE_ENGINE == "sharded"
+
+
+def _data_exists(data_file: str, shards_dir: str) -> bool:
+    """Есть ли данные: файл (со снимком или журналом) или каталог шардов."""
+    if os.path.exists(data_file) or os.path.exists(f"{data_file}.wal"):
+        return True
+    return _sharded() and os.path.exists(os.path.join(shards_dir, META_FILE))
+
+
+def _worker_data_exists(index: int) -> bool:
+    return _data_exists(worker_path(config.DATA_FILE, index), worker_path(config.SHARDS_DIR, index))
+
+
+def check_worker_data(worker_count: int):
+    """
+    Проверка перед запуском обработчиков. Если данные обычного режима не
+    разделены, обработчики начали бы с пустых файлов (а движок sharded ещё
+    и записал бы пустые каталоги), и пользователи остались бы без привычек.
+    """
+    if is_sqlite_path(config.DATA_FILE):
+        raise ValueError(f"WORKERS > 1 не поддерживается для SQLite (DATA_FILE={config.DATA_FILE})")
+    if not _data_exists(config.DATA_FILE, config.SHARDS_DIR):
+        return
+    hint = f"выполните python migrate.py workers --workers {worker_count}"
+    if not all(_worker_data_exists(index) for index in range(worker_count)):
+        raise ValueError(f"Данные {config.DATA_FILE} не разделены на {worker_count} "
+                         f"обработчиков: {hint}")
+    if _worker_data_exists(worker_count):
+        raise ValueError(f"Данные разделены на большее число обработчиков, чем "
+                         f"WORKERS={worker_count}: удалите файлы обработчиков и {hint}")
+
+
+def load_unsplit_data(source: str) -> Dict[str, Any]:
+    """Данные обычного режима для разделения: из шардов или из JSON-файла."""
+    if is_sqlite_path(source):
+        raise ValueError(f"Разделение базы SQLite ({source}) не поддерживается")
+    if _sharded() and os.path.exists(os.path.join(config.SHARDS_DIR, META_FILE)):
+        return read_shards(config.SHARDS_DIR)
+    wal_path = f"{source}.wal"
+    if os.path.exists(wal_path) and os.path.getsize(wal_path):
+        # Изменения из журнала ещё не в снимке
+        raise ValueError(f"Журнал {wal_path} не свёрнут: запустите и остановите бота "
+                         f"с WORKERS=1, затем повторите разделение")
+    return read_json_file(source)
+
+
+def split_json_for_workers(source: str, worker_count: int) -> List[int]:
+    """
+    Разделение данных на файлы обработчиков habits.w0.json, ... (исходные
+    данные не изменяются; движок sharded переносит файл обработчика в его
+    каталог шардов при первом запуске). Возвращает число пользователей в каждом файле.
+    """
+    all_data = load_unsplit_data(source)
+
+    parts: List[Dict[str, Any]] = [{} for _ in range(worker_count)]
+    for user_key, user_data in all_data.items():
+        parts[worker_index(int(user_key), worker_count)][user_key] = user_data
+
+    for index, part in enumerate(parts):
+        target = worker_path(source, index)
+        if os.path.exists(target):
+            raise ValueError(f"Файл {target} уже существует")
+        write_json_atomic(target, part)
+    return [len(part) for part in parts]
+
+
+def _worker_main(index: int, worker_count: int, inbox):
+    """Точка входа процесса-обработчика."""
+    # Ctrl+C получает вся группа процессов; обработчик завершается по сигналу
+    # диспетчера (None в очереди), дописав данные, а не посреди записи
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Настройки читаются при импорте config: переопределяем и перечитываем
+    os.environ.update(worker_environment(index, worker_count))
+    importlib.reload(config)
+    from habit_bot import HabitTrackerBot
+
+    bot = HabitTrackerBot()
+    application = bot.build_application(receive_updates=False)
+    asyncio.run(_serve_worker(application, inbox))
+
+
+async def _serve_worker(application: Application, inbox):
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+
+    def enqueue(data: Optional[Dict[str, Any]]):
+        if data is None:
+            stopped.set()
+        else:
+            application.update_queue.put_nowait(Update.de_json(data, application.bot))
+
+    def read_inbox():
+        # Блокирующее чтение очереди процессов — в отдельном потоке
+        while True:
+            data = inbox.get()
+            loop.call_soon_threadsafe(enqueue, data)
+            if data is None:
+                return
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        threading.Thread(target=read_inbox, daemon=True).start()
+        await stopped.wait()
+        # stop() дорабатывает уже полученные обновления
+        await application.stop()
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+class UpdateRouter:
+    """Диспетчер: раздаёт обновления процессам-обработчикам по user_id."""
+
+    def __init__(self, worker_count: int):
+        self._worker_count = worker_count
+        self._context = multiprocessing.get_context("spawn")
+        self._inboxes: List[Any] = [None] * worker_count
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * worker_count
+        self.routed = [0] * worker_count
+        self.restarts = [0] * worker_count
+
+    def _start_worker(self, index: int):
+        # Очередь каждый раз новая: процесс, убитый во время inbox.get(),
+        # оставляет блокировку чтения старой очереди занятой навсегда
+        inbox = self._context.Queue(config.WORKER_QUEUE_SIZE)
+        process = self._context.Process(
+            target=_worker_main, args=(index, self._worker_count, inbox),
+            name=f"habit-worker-{index}", daemon=False
+        )
+        process.start()
+        self._inboxes[index] = inbox
+        self._processes[index] = process
+
+    def start_workers(self):
+        for index in range(self._worker_count):
+            self._start_worker(index)
+
+    def _ensure_worker(self, index: int) -> bool:
+        """Перезапуск упавшего обработчика. True, если он был перезапущен."""
+        process = self._processes[index]
+        if process.is_alive():
+            return False
+        print(f"Обработчик {process.name} завершился (код {process.exitcode}), перезапускаем; "
+              f"обновления из его очереди потеряны")
+        process.join()
+        self._start_worker(index)
+        self.restarts[index] += 1
+        return True
+
+    def stop_workers(self, timeout: float = 30):
+        deadline = time.monotonic() + timeout
+        for process, inbox in zip(self._processes, self._inboxes):
+            if process.is_alive():
+                try:
+                    inbox.put(None, timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Full:
+                    pass
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                print(f"Обработчик {process.name} не завершился, останавливаем принудительно")
+                process.terminate()
+                process.join()
+
+    async def route(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик диспетчера: передача обновления в очередь его процесса."""
+        key = update_user_key(update)
+        index = worker_index(key, self._worker_count) if key is not None else 0
+        data = update.to_dict()
+        self._ensure_worker(index)
+        try:
+            self._inboxes[index].put_nowait(data)
+        except queue.Full:
+            # Обработчик не успевает: ждём места, не блокируя цикл событий.
+            # Диспетчер обрабатывает обновления по одному, так что порядок сохраняется
+            inbox = self._inboxes[index]
+            try:
+                await asyncio.to_thread(inbox.put, data, True, config.WORKER_PUT_TIMEOUT)
+            except queue.Full:
+                # Обработчик мог упасть, пока мы ждали: тогда обновление идёт новому процессу
+                if not self._ensure_worker(index):
+                    raise RuntimeError(f"Обработчик {index} не принимает обновления "
+                                       f"{config.WORKER_PUT_TIMEOUT:g} с") from None
+                self._inboxes[index].put_nowait(data)
+        self.routed[index] += 1
+
+    def build_application(self) -> Application:
+        async def post_init(application: Application):
+            self.start_workers()
+
+        async def post_shutdown(application: Application):
+            await asyncio.to_thread(self.stop_workers)
+
+        application = (
+            Application.builder()
+            .token(config.BOT_TOKEN)
+            .base_url(config.TELEGRAM_API_URL)
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
+        application.add_handler(TypeHandler(Update, self.route))
+        return application
+
+
+def run_cluster(worker_count: int):
+    """Запуск диспетчера и worker_count процессов-обработчиков."""
+    from habit_bot import serve
+
+    check_worker_data(worker_count)
+    router = UpdateRouter(worker_count)
+    print(f"🧩 Обработчиков: {worker_count}")
+    serve(router.build_application())